@@ -10,60 +10,41 @@ Supports multiple models and pipeline strategies:
 - ollama_only: Ollama only (online)
 """
 
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, request, jsonify, send_file
 from flask_cors import CORS
 import sys
+import json
 import os
 import queue
 import threading
+import time
 import uuid
 from datetime import datetime, timedelta
 
 # Add parent directory to path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from config import QWEN_MODELS, PIPELINE_STRATEGIES, DEFAULT_PIPELINE, MAX_QUEUE_SIZE, JOB_TIMEOUT_SECONDS, JOB_CLEANUP_HOURS
-from llm.bartpho_model import correct_text as bartpho_correct, correct_text_chunked as bartpho_chunked
-from llm.qwen_model import correct_text as qwen_correct, get_available_models as get_qwen_models
-from protonx_layer.protonx_refine import refine_text_chunked
+from config import QWEN_MODELS, PIPELINE_STRATEGIES, DEFAULT_PIPELINE, MAX_QUEUE_SIZE, JOB_TIMEOUT_SECONDS, JOB_CLEANUP_HOURS, INCREMENTAL_CORRECTION, JOB_RESULT_BATCH_PARAGRAPHS
 from processor.diff_utils import generate_change_note, is_meaningful_text
+from processor.pipeline import DEFAULT_MODEL, correct_with_pipeline, describe_decoding, get_ollama, preload
+from processor import parallel, metrics
+from processor.incremental import correct_paragraphs_incremental
+from processor.log import get_logger, kv
 
-# Load Ollama model
-ollama_models_list = []
-try:
-    from llm.ollama_model import correct_text as ollama_correct, check_ollama_health, get_available_models as get_ollama_models
-    ollama_available = check_ollama_health()
-    if ollama_available:
-        print("✅ Ollama API is reachable")
-        ollama_models_list = get_ollama_models()
-    else:
-        print("⚠️ Ollama API không khả dụng")
-except Exception as e:
-    print(f"⚠️ Ollama module error: {e}")
-    ollama_available = False
-    ollama_correct = None
-
-# Load Vistral model (gated model, cần HF_TOKEN)
-vistral_available = False
-vistral_correct = None
-
-try:
-    from llm.vistral_model import correct_text as vistral_correct
-    vistral_available = True
-    print("✅ Vistral model loaded successfully")
-except Exception as e:
-    print(f"⚠️ Vistral model không khả dụng: {e}")
-    vistral_available = False
+log = get_logger("api")
+
+# Load models cho tất cả pipeline (+ Vistral) khi khởi động server
+preload(extra_backends=["vistral"])
+
+# Ollama models (fetched dynamically)
+ollama_available = get_ollama() is not None
+ollama_models_list = get_ollama().get_available_models() if ollama_available else []
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for web frontend
 
-# Cấu hình
-MAX_WORDS_PER_CHUNK = 100
-
 # Available models: base models + qwen variants (ollama models are fetched dynamically)
 AVAILABLE_MODELS = ["bartpho", "qwen", "vistral"] + [f"qwen-{k}" for k in QWEN_MODELS.keys()]
-DEFAULT_MODEL = "qwen"
 
 # ===== JOB QUEUE SYSTEM =====
 # Job statuses
@@ -78,6 +59,295 @@ job_queue = queue.Queue(maxsize=MAX_QUEUE_SIZE)
 job_store_lock = threading.Lock()
 
 
+# Loại job: "text" (cả văn bản 1 lần), "paragraphs" (kết quả trả về dần theo lô đoạn),
+# "docx" (file DOCX đã sửa được tải qua /api/job-result/<id>)
+JOB_KIND_TEXT = "text"
+JOB_KIND_PARAGRAPHS = "paragraphs"
+JOB_KIND_DOCX = "docx"
+
+DOCX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+
+
+def resolve_model(model: str, pipeline: str, qwen_variant: str = None) -> tuple:
+    """
+    Chuẩn hoá model / pipeline từ request ("ollama-<model>", "qwen-<variant>").
+    Returns: (model, pipeline, qwen_variant, ollama_model)
+    """
+    model = (model or DEFAULT_MODEL).lower()
+    ollama_model_name = None
+    
+    # Handle ollama-<model> format
+    if model.startswith("ollama-"):
+        ollama_model_name = model.replace("ollama-", "")
+        # Auto-switch to ollama pipeline if using ollama model
+        if pipeline not in ["ollama_only", "ollama_protonx"]:
+            pipeline = "ollama_protonx"  # Default to ollama + protonx
+        model = "ollama"
+    
+    # Handle qwen-<variant> format
+    elif model.startswith("qwen-"):
+        qwen_variant = model.replace("qwen-", "")
+        model = "qwen"
+    
+    # Validate pipeline
+    if pipeline not in PIPELINE_STRATEGIES:
+        pipeline = DEFAULT_PIPELINE
+    return model, pipeline, qwen_variant, ollama_model_name
+
+
+def paragraph_result(index: int, original: str, corrections) -> dict:
+    """
+    Kết quả 1 đoạn cho response. Đoạn có ý nghĩa lấy (corrected, explanation)
+    tiếp theo từ iterator corrections, đoạn không có ý nghĩa được giữ nguyên.
+    """
+    # Kiểm tra đoạn văn có ý nghĩa để xử lý hay không
+    if not is_meaningful_text(original):
+        # Bỏ qua đoạn không có ý nghĩa, giữ nguyên
+        return {
+            "index": index,
+            "original": original,
+            "corrected": original,
+            "explanation": "Đoạn văn không có nội dung ý nghĩa để xử lý",
+            "note": "",
+            "has_changes": False,
+            "skipped": True
+        }
+    
+    final_text, explanation = next(corrections)
+    note = generate_change_note(original, final_text)
+    return {
+        "index": index,
+        "original": original,
+        "corrected": final_text,
+        "explanation": explanation,
+        "note": note or "",
+        "has_changes": original != final_text
+    }
+
+
+def build_corrected_docx(source: bytes, pipeline: str, params: dict, stats: dict = None, on_progress=None) -> tuple:
+    """
+    Sửa lỗi file DOCX, thêm phần tổng kết các thay đổi ở cuối.
+    
+    Args:
+        source: Nội dung file DOCX gốc
+        params: kwargs cho parallel.correct_paragraphs (model, targeted, decoding...)
+        on_progress: on_progress(done, total) sau mỗi lô JOB_RESULT_BATCH_PARAGRAPHS
+            đoạn (job bất đồng bộ); None → sửa tất cả các đoạn 1 lần
+    
+    Returns: (bytes file DOCX đã sửa, số đoạn có thay đổi)
+    """
+    from docx import Document
+    from docx.shared import Pt, RGBColor
+    import io
+    
+    # Đọc file DOCX
+    doc = Document(io.BytesIO(source))
+    
+    # Tạo document mới với nội dung đã sửa
+    new_doc = Document()
+    changes_log = []
+    
+    # Sửa lỗi các đoạn có ý nghĩa (song song trên process pool nếu được bật)
+    meaningful = [p.text.strip() for p in doc.paragraphs if p.text.strip() and is_meaningful_text(p.text.strip())]
+    batch_size = JOB_RESULT_BATCH_PARAGRAPHS if on_progress else max(len(meaningful), 1)
+    corrected = []
+    for start in range(0, len(meaningful), batch_size):
+        corrected.extend(parallel.correct_paragraphs(meaningful[start:start + batch_size], pipeline, stats=stats, **params))
+        if on_progress:
+            on_progress(len(corrected), len(meaningful))
+    corrections = iter(corrected)
+    
+    for para_idx, para in enumerate(doc.paragraphs):
+        original_text = para.text.strip()
+        
+        if not original_text:
+            new_doc.add_paragraph()
+            continue
+        
+        # Kiểm tra đoạn văn có ý nghĩa để xử lý hay không
+        if not is_meaningful_text(original_text):
+            # Bỏ qua đoạn không có ý nghĩa, giữ nguyên
+            new_doc.add_paragraph(original_text)
+            continue
+        
+        final_text, explanation = next(corrections)
+        
+        # Thêm paragraph đã sửa
+        new_para = new_doc.add_paragraph(final_text)
+        
+        # Nếu có thay đổi, ghi chú
+        if original_text != final_text:
+            changes_log.append({
+                "paragraph": para_idx + 1,
+                "original": original_text,
+                "corrected": final_text,
+                "explanation": explanation
+            })
+    
+    # Thêm phần tổng kết thay đổi ở cuối
+    if changes_log:
+        new_doc.add_paragraph()
+        summary_para = new_doc.add_paragraph()
+        summary_run = summary_para.add_run("═══ TỔNG KẾT CÁC THAY ĐỔI ═══")
+        summary_run.bold = True
+        summary_run.font.size = Pt(14)
+        summary_run.font.color.rgb = RGBColor(0, 102, 204)
+        
+        for change in changes_log:
+            new_doc.add_paragraph()
+            
+            # Tiêu đề đoạn
+            title_para = new_doc.add_paragraph()
+            title_run = title_para.add_run(f"📍 Đoạn {change['paragraph']}:")
+            title_run.bold = True
+            
+            # Văn bản gốc
+            orig_para = new_doc.add_paragraph()
+            orig_run = orig_para.add_run("❌ Gốc: ")
+            orig_run.font.color.rgb = RGBColor(204, 0, 0)
+            orig_para.add_run(change['original'][:200] + "..." if len(change['original']) > 200 else change['original'])
+            
+            # Văn bản đã sửa
+            corr_para = new_doc.add_paragraph()
+            corr_run = corr_para.add_run("✅ Sửa: ")
+            corr_run.font.color.rgb = RGBColor(0, 153, 0)
+            corr_para.add_run(change['corrected'][:200] + "..." if len(change['corrected']) > 200 else change['corrected'])
+            
+            # Giải thích
+            if change['explanation']:
+                exp_para = new_doc.add_paragraph()
+                exp_run = exp_para.add_run("💬 Chú thích: ")
+                exp_run.italic = True
+                exp_para.add_run(change['explanation'])
+    
+    # Lưu vào buffer
+    buffer = io.BytesIO()
+    with metrics.timer("docx_save_seconds"):
+        new_doc.save(buffer)
+    return buffer.getvalue(), len(changes_log)
+
+
+def _docx_params(form) -> tuple:
+    """
+    Tham số sửa DOCX từ form data (/api/correct-docx, /api/submit-docx).
+    Returns: (pipeline, kwargs cho parallel.correct_paragraphs)
+    """
+    model = form.get('model', DEFAULT_MODEL).lower()
+    pipeline = form.get('pipeline', DEFAULT_PIPELINE)
+    targeted = form.get('targeted')
+    if targeted is not None:
+        targeted = targeted.lower() in ["1", "true", "yes"]
+    
+    if model not in AVAILABLE_MODELS:
+        model = DEFAULT_MODEL
+    if pipeline not in PIPELINE_STRATEGIES:
+        pipeline = DEFAULT_PIPELINE
+    
+    return pipeline, {
+        "model": model,
+        "qwen_variant": form.get('qwen_model', None),
+        "targeted": targeted,
+        "decoding": form.get('decoding'),
+        "output_mode": form.get('output_mode'),
+        # Ghi chú thay đổi được sinh từ diff → mặc định không cần LLM giải thích
+        "explain": form.get('explain', 'false').lower() in ["1", "true", "yes"],
+        "sampling": form.get('sampling')
+    }
+
+
+def _run_text_job(job: dict) -> dict:
+    """Job "text": sửa cả văn bản 1 lần"""
+    text = job["text"]
+    pipeline = job["pipeline"]
+    stats = {}
+    
+    # Execute correction
+    final_text, explanation = correct_with_pipeline(
+        text, 
+        pipeline=pipeline, 
+        qwen_variant=job.get("qwen_model"), 
+        ollama_model=job.get("ollama_model"),
+        targeted=job.get("targeted"),
+        stats=stats,
+        decoding=job.get("decoding"),
+        output_mode=job.get("output_mode"),
+        explain=job.get("explain"),
+        sampling=job.get("sampling")
+    )
+    
+    note = generate_change_note(text, final_text)
+    return {
+        "original": text,
+        "corrected": final_text,
+        "explanation": explanation,
+        "note": note or "",
+        "has_changes": text != final_text,
+        "tokens_avoided": stats.get("tokens_avoided", 0),
+        "decoding_params": describe_decoding(pipeline, job.get("decoding"), job.get("sampling"))
+    }
+
+
+def _run_paragraphs_job(job: dict) -> dict:
+    """
+    Job "paragraphs": sửa theo lô JOB_RESULT_BATCH_PARAGRAPHS đoạn, kết quả
+    mỗi lô được thêm vào job["results"] ngay (client lấy dần qua ?since=).
+    """
+    paragraphs = job["paragraphs"]
+    pipeline = job["pipeline"]
+    params = job["params"]
+    correct_func = correct_paragraphs_incremental if job.get("incremental") else parallel.correct_paragraphs
+    stats = {}
+    
+    for start in range(0, len(paragraphs), JOB_RESULT_BATCH_PARAGRAPHS):
+        batch = paragraphs[start:start + JOB_RESULT_BATCH_PARAGRAPHS]
+        meaningful = [p for p in batch if is_meaningful_text(p)]
+        corrections = iter(correct_func(meaningful, pipeline, stats=stats, **params) if meaningful else [])
+        results = [paragraph_result(start + i, original, corrections) for i, original in enumerate(batch)]
+        with job_store_lock:
+            job["results"].extend(results)
+            job["progress"]["done"] = len(job["results"])
+    
+    return {
+        "model_used": params["model"],
+        "pipeline_used": pipeline,
+        "qwen_model_used": params["qwen_variant"],
+        "ollama_model_used": params["ollama_model"],
+        "total_paragraphs": len(paragraphs),
+        "full_corrected": '\n\n'.join(r["corrected"] for r in job["results"]),
+        "tokens_avoided": stats.get("tokens_avoided", 0),
+        "paragraphs_reused": stats.get("paragraphs_reused", 0),
+        "decoding_params": describe_decoding(pipeline, params.get("decoding"), params.get("sampling"))
+    }
+
+
+def _run_docx_job(job: dict) -> dict:
+    """Job "docx": file đã sửa được giữ trong job["file"] đến khi job bị dọn"""
+    params = job["params"]
+    stats = {}
+    
+    def on_progress(done, total):
+        with job_store_lock:
+            job["progress"].update(done=done, total=total)
+    
+    data, changes = build_corrected_docx(job.pop("source"), job["pipeline"], params, stats=stats, on_progress=on_progress)
+    job["file"] = data
+    return {
+        "filename": job["filename"].replace('.docx', '_corrected.docx'),
+        "changes": changes,
+        "download_url": f"/api/job-result/{job['job_id']}",
+        "tokens_avoided": stats.get("tokens_avoided", 0),
+        "decoding_params": describe_decoding(job["pipeline"], params.get("decoding"), params.get("sampling"))
+    }
+
+
+JOB_RUNNERS = {
+    JOB_KIND_TEXT: _run_text_job,
+    JOB_KIND_PARAGRAPHS: _run_paragraphs_job,
+    JOB_KIND_DOCX: _run_docx_job,
+}
+
+
 def job_worker():
     """Background worker thread to process jobs from queue"""
     while True:
@@ -94,36 +364,24 @@ def job_worker():
                 job["status"] = JOB_STATUS_PROCESSING
                 job["started_at"] = datetime.now().isoformat()
             
-            # Process the job
-            text = job["text"]
-            pipeline = job.get("pipeline", DEFAULT_PIPELINE)
-            qwen_variant = job.get("qwen_model")
-            ollama_model = job.get("ollama_model")
+            queue_wait = (datetime.now() - datetime.fromisoformat(job["created_at"])).total_seconds()
+            metrics.observe("job_queue_wait_seconds", queue_wait)
+            job_start = time.perf_counter()
+            pipeline = job["pipeline"]
             
-            # Execute correction
-            final_text, explanation = correct_with_pipeline(
-                text, 
-                pipeline=pipeline, 
-                qwen_variant=qwen_variant, 
-                ollama_model=ollama_model
-            )
-            
-            note = generate_change_note(text, final_text)
+            # Process the job
+            result = JOB_RUNNERS[job["kind"]](job)
             
             with job_store_lock:
                 job_store[job_id].update({
                     "status": JOB_STATUS_COMPLETED,
                     "completed_at": datetime.now().isoformat(),
-                    "result": {
-                        "original": text,
-                        "corrected": final_text,
-                        "explanation": explanation,
-                        "note": note or "",
-                        "has_changes": text != final_text
-                    }
+                    "result": result
                 })
             
-            print(f"✅ Job {job_id[:8]}... completed")
+            metrics.observe("job_duration_seconds", time.perf_counter() - job_start, pipeline=pipeline)
+            metrics.increment("jobs_total", status=JOB_STATUS_COMPLETED)
+            log.info("✅ Job completed", extra=kv(job=job_id[:8], kind=job["kind"], pipeline=pipeline, queue_wait=round(queue_wait, 2)))
             
         except Exception as e:
             import traceback
@@ -135,7 +393,8 @@ def job_worker():
                         "error": str(e),
                         "traceback": traceback.format_exc()
                     })
-            print(f"❌ Job {job_id[:8]}... failed: {e}")
+            metrics.increment("jobs_total", status=JOB_STATUS_FAILED)
+            log.error("❌ Job failed", extra=kv(job=job_id[:8], error=str(e)))
         
         finally:
             job_queue.task_done()
@@ -154,144 +413,23 @@ def cleanup_old_jobs():
         for job_id in to_remove:
             del job_store[job_id]
         if to_remove:
-            print(f"🧹 Cleaned up {len(to_remove)} old jobs")
+            log.info("🧹 Cleaned up old jobs", extra=kv(count=len(to_remove)))
+
+
+@metrics.register_collector
+def _collect_queue_metrics():
+    """Độ dài hàng đợi và số job theo trạng thái (cập nhật khi render /metrics)"""
+    metrics.set_gauge("job_queue_depth", job_queue.qsize())
+    with job_store_lock:
+        statuses = [job["status"] for job in job_store.values()]
+    for status in [JOB_STATUS_PENDING, JOB_STATUS_PROCESSING, JOB_STATUS_COMPLETED, JOB_STATUS_FAILED]:
+        metrics.set_gauge("jobs_in_store", statuses.count(status), status=status)
 
 
 # Start worker thread
 worker_thread = threading.Thread(target=job_worker, daemon=True)
 worker_thread.start()
-print("🔄 Job worker thread started")
-
-
-def correct_with_model(text: str, model: str = DEFAULT_MODEL, qwen_variant: str = None) -> tuple:
-    """
-    Sửa lỗi văn bản với model được chọn.
-    Returns: (corrected_text, explanation)
-    
-    Args:
-        text: Văn bản cần sửa
-        model: Model chính (bartpho, qwen, vistral, hoặc qwen-<variant>)
-        qwen_variant: Variant của Qwen model (qwen2.5-7b, qwen3-8b)
-    """
-    word_count = len(text.split())
-    
-    # Handle qwen-<variant> format
-    if model.startswith("qwen-"):
-        qwen_variant = model.replace("qwen-", "")
-        model = "qwen"
-    
-    if model == "qwen":
-        # Qwen trả về tuple (text, explanation)
-        corrected, explanation = qwen_correct(text, model_key=qwen_variant)
-        return corrected, explanation
-    elif model == "vistral":
-        # Vistral model
-        if vistral_available and vistral_correct:
-            corrected, explanation = vistral_correct(text)
-            return corrected, explanation
-        else:
-            # Fallback to Qwen nếu Vistral không available
-            print("⚠️ Vistral không khả dụng, dùng Qwen thay thế")
-            corrected, explanation = qwen_correct(text)
-            explanation = "⚠️ Vistral không khả dụng (cần HF_TOKEN). Đã dùng Qwen."
-            return corrected, explanation
-    else:
-        # BartPho (default)
-        if word_count > MAX_WORDS_PER_CHUNK:
-            corrected = bartpho_chunked(text, MAX_WORDS_PER_CHUNK)
-        else:
-            corrected = bartpho_correct(text)
-        explanation = generate_explanation(text, corrected)
-        return corrected, explanation
-
-
-def correct_with_pipeline(text: str, model: str = DEFAULT_MODEL, pipeline: str = DEFAULT_PIPELINE, qwen_variant: str = None, ollama_model: str = None) -> tuple:
-    """
-    Sửa lỗi văn bản với pipeline được chọn.
-    Returns: (corrected_text, explanation)
-    
-    Pipeline strategies:
-    - qwen_protonx: Qwen → ProtonX refine
-    - qwen_only: Chỉ Qwen
-    - protonx_only: Chỉ ProtonX
-    - bartpho_protonx: BartPho → ProtonX refine
-    - ollama_protonx: Ollama → ProtonX refine (online)
-    - ollama_only: Chỉ Ollama (online)
-    """
-    word_count = len(text.split())
-    
-    if pipeline == "qwen_only":
-        # Chỉ dùng Qwen, không ProtonX
-        corrected, explanation = qwen_correct(text, model_key=qwen_variant)
-        return corrected, explanation
-    
-    elif pipeline == "protonx_only":
-        # Chỉ dùng ProtonX
-        corrected = refine_text_chunked(text, MAX_WORDS_PER_CHUNK)
-        explanation = "Đã refine với ProtonX (không qua LLM)"
-        return corrected, explanation
-    
-    elif pipeline == "bartpho_protonx":
-        # BartPho + ProtonX
-        if word_count > MAX_WORDS_PER_CHUNK:
-            model_fixed = bartpho_chunked(text, MAX_WORDS_PER_CHUNK)
-        else:
-            model_fixed = bartpho_correct(text)
-        # ProtonX refine
-        final_text = refine_text_chunked(model_fixed, MAX_WORDS_PER_CHUNK)
-        explanation = generate_explanation(text, final_text)
-        return final_text, explanation
-    
-    elif pipeline == "ollama_only":
-        # Chỉ dùng Ollama (online), không ProtonX
-        if ollama_available and ollama_correct:
-            corrected, explanation = ollama_correct(text, model_key=ollama_model)
-            return corrected, explanation
-        else:
-            # Fallback to Qwen
-            print("⚠️ Ollama không khả dụng, dùng Qwen thay thế")
-            corrected, explanation = qwen_correct(text, model_key=qwen_variant)
-            explanation = "⚠️ Ollama API không khả dụng. Đã dùng Qwen local."
-            return corrected, explanation
-    
-    elif pipeline == "ollama_protonx":
-        # Ollama (online) + ProtonX
-        if ollama_available and ollama_correct:
-            model_fixed, explanation = ollama_correct(text, model_key=ollama_model)
-        else:
-            print("⚠️ Ollama không khả dụng, dùng Qwen thay thế")
-            model_fixed, explanation = qwen_correct(text, model_key=qwen_variant)
-            explanation = "⚠️ Ollama API không khả dụng. Đã dùng Qwen local."
-        # ProtonX refine
-        final_text = refine_text_chunked(model_fixed, MAX_WORDS_PER_CHUNK)
-        return final_text, explanation
-    
-    else:  # qwen_protonx (default)
-        # Qwen + ProtonX
-        model_fixed, explanation = qwen_correct(text, model_key=qwen_variant)
-        # ProtonX refine
-        final_text = refine_text_chunked(model_fixed, MAX_WORDS_PER_CHUNK)
-        return final_text, explanation
-
-
-def generate_explanation(original: str, corrected: str) -> str:
-    """Tạo giải thích ngắn gọn về các thay đổi"""
-    if original.strip() == corrected.strip():
-        return "Không có thay đổi."
-    
-    original_words = set(original.lower().split())
-    corrected_words = set(corrected.lower().split())
-    
-    added = corrected_words - original_words
-    removed = original_words - corrected_words
-    
-    explanations = []
-    if removed:
-        explanations.append(f"Sửa: {', '.join(list(removed)[:5])}")
-    if added:
-        explanations.append(f"Thành: {', '.join(list(added)[:5])}")
-    
-    return " → ".join(explanations) if explanations else "Đã sửa dấu và định dạng."
+log.info("🔄 Job worker thread started")
 
 
 @app.route('/api/health', methods=['GET'])
@@ -310,6 +448,12 @@ def health_check():
     })
 
 
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Metrics theo format text của Prometheus (thời gian từng stage, token, hàng đợi, cache)"""
+    return Response(metrics.render_prometheus(), mimetype="text/plain; version=0.0.4; charset=utf-8")
+
+
 @app.route('/api/ollama-models', methods=['GET'])
 def get_ollama_models_endpoint():
     """
@@ -334,7 +478,7 @@ def get_ollama_models_endpoint():
     
     try:
         # Refresh models from API
-        models = get_ollama_models()
+        models = get_ollama().get_available_models()
         ollama_models_list = models
         
         return jsonify({
@@ -359,7 +503,12 @@ def correct_text():
     Request body:
     {
         "text": "văn bản cần sửa",
-        "pipeline": "qwen_protonx" (optional)
+        "pipeline": "qwen_protonx" (optional),
+        "targeted": true (optional, chỉ sửa các câu nghi ngờ),
+        "decoding": "adaptive" (optional: beam, greedy, adaptive),
+        "output_mode": "edits" (optional: rewrite, edits),
+        "explain": false (optional, không cần LLM giải thích → nhanh hơn),
+        "sampling": "greedy" (optional: greedy, seeded, sample)
     }
     """
     try:
@@ -383,9 +532,10 @@ def correct_text():
             pipeline = DEFAULT_PIPELINE
         
         qwen_variant = data.get('qwen_model', None)
+        stats = {}
         
         # Sửa lỗi với pipeline
-        final_text, explanation = correct_with_pipeline(original, pipeline=pipeline, qwen_variant=qwen_variant)
+        final_text, explanation = correct_with_pipeline(original, pipeline=pipeline, qwen_variant=qwen_variant, targeted=data.get('targeted'), stats=stats, decoding=data.get('decoding'), output_mode=data.get('output_mode'), explain=data.get('explain'), sampling=data.get('sampling'))
         
         # Tạo ghi chú thay đổi
         note = generate_change_note(original, final_text)
@@ -396,7 +546,9 @@ def correct_text():
             "corrected": final_text,
             "explanation": explanation,
             "pipeline_used": pipeline,
-            "note": note or ""
+            "note": note or "",
+            "tokens_avoided": stats.get("tokens_avoided", 0),
+            "decoding_params": describe_decoding(pipeline, data.get('decoding'), data.get('sampling'))
         })
         
     except Exception as e:
@@ -408,6 +560,44 @@ def correct_text():
         }), 500
 
 
+def enqueue_job(job: dict):
+    """
+    Đưa job vào hàng đợi (request trả về ngay, job_worker xử lý ở background).
+    Returns: Response JSON (503 nếu hàng đợi đầy)
+    """
+    # Check if queue is full
+    if job_queue.full():
+        return jsonify({
+            "success": False,
+            "error": "Queue is full. Please try again later.",
+            "queue_size": job_queue.qsize()
+        }), 503
+    
+    job.update({
+        "job_id": str(uuid.uuid4()),
+        "status": JOB_STATUS_PENDING,
+        "created_at": datetime.now().isoformat(),
+        "result": None,
+        "error": None
+    })
+    
+    with job_store_lock:
+        job_store[job["job_id"]] = job
+    
+    job_queue.put(job["job_id"])
+    
+    # Cleanup old jobs periodically
+    if len(job_store) > MAX_QUEUE_SIZE * 2:
+        cleanup_old_jobs()
+    
+    return jsonify({
+        "success": True,
+        "job_id": job["job_id"],
+        "queue_position": job_queue.qsize(),
+        "message": "Job submitted successfully"
+    })
+
+
 @app.route('/api/submit-job', methods=['POST'])
 def submit_job():
     """
@@ -417,9 +607,18 @@ def submit_job():
     Request body:
     {
         "text": "văn bản cần sửa",
+        "mode": "paragraphs" (optional: text, paragraphs — sửa từng đoạn (tách bằng
+                newline), kết quả trả về dần qua /api/job-status như /api/correct-paragraphs),
+        "model": "qwen-qwen3-8b" (optional, như /api/correct-paragraphs),
         "pipeline": "qwen_protonx" (optional),
         "qwen_model": "qwen3-8b" (optional),
-        "ollama_model": "qwen2.5:7b" (optional)
+        "ollama_model": "qwen2.5:7b" (optional),
+        "targeted": true (optional),
+        "decoding": "adaptive" (optional),
+        "output_mode": "edits" (optional),
+        "explain": false (optional),
+        "sampling": "greedy" (optional),
+        "incremental": true (optional, mode "paragraphs")
     }
     
     Response:
@@ -445,46 +644,85 @@ def submit_job():
                 "error": "Text cannot be empty"
             }), 400
         
-        # Check if queue is full
-        if job_queue.full():
-            return jsonify({
-                "success": False,
-                "error": "Queue is full. Please try again later.",
-                "queue_size": job_queue.qsize()
-            }), 503
-        
-        # Create job
-        job_id = str(uuid.uuid4())
-        pipeline = data.get('pipeline', DEFAULT_PIPELINE)
-        if pipeline not in PIPELINE_STRATEGIES:
-            pipeline = DEFAULT_PIPELINE
+        model, pipeline, qwen_variant, ollama_model_name = resolve_model(
+            data.get('model'), data.get('pipeline', DEFAULT_PIPELINE), data.get('qwen_model')
+        )
+        ollama_model_name = ollama_model_name or data.get('ollama_model')
         
-        job = {
-            "job_id": job_id,
-            "text": text,
-            "pipeline": pipeline,
-            "qwen_model": data.get('qwen_model'),
-            "ollama_model": data.get('ollama_model'),
-            "status": JOB_STATUS_PENDING,
-            "created_at": datetime.now().isoformat(),
-            "result": None,
-            "error": None
-        }
+        if data.get('mode') == JOB_KIND_PARAGRAPHS:
+            paragraphs = [p.strip() for p in text.split('\n') if p.strip()]
+            job = {
+                "kind": JOB_KIND_PARAGRAPHS,
+                "paragraphs": paragraphs,
+                "pipeline": pipeline,
+                "incremental": data.get('incremental', INCREMENTAL_CORRECTION),
+                "params": {
+                    "model": model,
+                    "qwen_variant": qwen_variant,
+                    "ollama_model": ollama_model_name,
+                    "targeted": data.get('targeted'),
+                    "decoding": data.get('decoding'),
+                    "output_mode": data.get('output_mode'),
+                    "explain": data.get('explain'),
+                    "sampling": data.get('sampling')
+                },
+                "results": [],
+                "progress": {"done": 0, "total": len(paragraphs)}
+            }
+        else:
+            job = {
+                "kind": JOB_KIND_TEXT,
+                "text": text,
+                "pipeline": pipeline,
+                "qwen_model": qwen_variant,
+                "ollama_model": ollama_model_name,
+                "targeted": data.get('targeted'),
+                "decoding": data.get('decoding'),
+                "output_mode": data.get('output_mode'),
+                "explain": data.get('explain'),
+                "sampling": data.get('sampling')
+            }
         
-        with job_store_lock:
-            job_store[job_id] = job
+        return enqueue_job(job)
         
-        job_queue.put(job_id)
+    except Exception as e:
+        import traceback
+        return jsonify({
+            "success": False,
+            "error": str(e),
+            "traceback": traceback.format_exc()
+        }), 500
+
+
+@app.route('/api/submit-docx', methods=['POST'])
+def submit_docx():
+    """
+    Như /api/correct-docx nhưng bất đồng bộ: trả về job ID ngay, theo dõi qua
+    /api/job-status/<id> (progress theo số đoạn), tải file qua /api/job-result/<id>.
+    Form data giống /api/correct-docx (file, model, pipeline, targeted, explain...).
+    """
+    try:
+        file = request.files.get('file')
+        if file is None or file.filename == '':
+            return jsonify({
+                "success": False,
+                "error": "No file uploaded"
+            }), 400
         
-        # Cleanup old jobs periodically
-        if len(job_store) > MAX_QUEUE_SIZE * 2:
-            cleanup_old_jobs()
+        if not file.filename.endswith('.docx'):
+            return jsonify({
+                "success": False,
+                "error": "Only .docx files are supported"
+            }), 400
         
-        return jsonify({
-            "success": True,
-            "job_id": job_id,
-            "queue_position": job_queue.qsize(),
-            "message": "Job submitted successfully"
+        pipeline, params = _docx_params(request.form)
+        return enqueue_job({
+            "kind": JOB_KIND_DOCX,
+            "source": file.read(),
+            "filename": file.filename,
+            "pipeline": pipeline,
+            "params": params,
+            "progress": {"done": 0, "total": None}
         })
         
     except Exception as e:
@@ -500,6 +738,8 @@ def submit_job():
 def get_job_status(job_id):
     """
     Get the status of a submitted job.
+    Job "paragraphs": ?since=<n> → chỉ trả về kết quả từ đoạn thứ n (client
+    truyền lại "next_since" của lần hỏi trước để nhận các đoạn mới xong).
     
     Response when pending:
     {
@@ -508,6 +748,15 @@ def get_job_status(job_id):
         "queue_position": 3
     }
     
+    Response when processing (job "paragraphs"):
+    {
+        "success": true,
+        "status": "processing",
+        "progress": {"done": 8, "total": 20},
+        "results": [{"index": 0, "original": "...", "corrected": "...", ...}, ...],
+        "next_since": 8
+    }
+    
     Response when completed:
     {
         "success": true,
@@ -520,6 +769,8 @@ def get_job_status(job_id):
         }
     }
     """
+    since = request.args.get('since', 0, type=int)
+    
     with job_store_lock:
         if job_id not in job_store:
             return jsonify({
@@ -527,27 +778,63 @@ def get_job_status(job_id):
                 "error": "Job not found"
             }), 404
         
-        job = job_store[job_id].copy()
+        job = job_store[job_id]
+        response = {
+            "success": True,
+            "job_id": job_id,
+            "kind": job["kind"],
+            "status": job["status"],
+            "created_at": job["created_at"]
+        }
+        if "progress" in job:
+            response["progress"] = dict(job["progress"])
+        if "results" in job:
+            response["results"] = job["results"][since:]
+            response["next_since"] = len(job["results"])
+        
+        if job["status"] == JOB_STATUS_PENDING:
+            response["queue_position"] = job_queue.qsize()
+        elif job["status"] == JOB_STATUS_PROCESSING:
+            response["started_at"] = job.get("started_at")
+        elif job["status"] == JOB_STATUS_COMPLETED:
+            response["completed_at"] = job.get("completed_at")
+            response["result"] = job.get("result")
+        elif job["status"] == JOB_STATUS_FAILED:
+            response["completed_at"] = job.get("completed_at")
+            response["error"] = job.get("error")
     
-    response = {
-        "success": True,
-        "job_id": job_id,
-        "status": job["status"],
-        "created_at": job["created_at"]
-    }
+    return jsonify(response)
+
+
+@app.route('/api/job-result/<job_id>', methods=['GET'])
+def get_job_result(job_id):
+    """Tải file DOCX đã sửa của job "docx" (sau khi job hoàn thành)"""
+    import io
     
-    if job["status"] == JOB_STATUS_PENDING:
-        response["queue_position"] = job_queue.qsize()
-    elif job["status"] == JOB_STATUS_PROCESSING:
-        response["started_at"] = job.get("started_at")
-    elif job["status"] == JOB_STATUS_COMPLETED:
-        response["completed_at"] = job.get("completed_at")
-        response["result"] = job.get("result")
-    elif job["status"] == JOB_STATUS_FAILED:
-        response["completed_at"] = job.get("completed_at")
-        response["error"] = job.get("error")
+    with job_store_lock:
+        job = job_store.get(job_id)
+        if job is None or job["kind"] != JOB_KIND_DOCX:
+            return jsonify({
+                "success": False,
+                "error": "Job not found"
+            }), 404
+        if job["status"] != JOB_STATUS_COMPLETED:
+            return jsonify({
+                "success": False,
+                "error": f"Job is {job['status']}",
+                "status": job["status"]
+            }), 409
+        data, result = job["file"], job["result"]
     
-    return jsonify(response)
+    response = send_file(
+        io.BytesIO(data),
+        as_attachment=True,
+        download_name=result["filename"],
+        mimetype=DOCX_MIMETYPE
+    )
+    response.headers['X-Tokens-Avoided'] = str(result["tokens_avoided"])
+    response.headers['X-Decoding-Params'] = json.dumps(result["decoding_params"])
+    return response
 
 
 @app.route('/api/queue-status', methods=['GET'])
@@ -593,8 +880,18 @@ def correct_paragraphs():
         "text": "đoạn 1\nđoạn 2\nđoạn 3",
         "model": "qwen" hoặc "bartpho" (mặc định: qwen),
         "pipeline": "qwen_protonx" hoặc "qwen_only" hoặc "protonx_only" hoặc "bartpho_protonx",
-        "qwen_model": "qwen2.5-7b" hoặc "qwen3-8b" (optional)
+        "qwen_model": "qwen2.5-7b" hoặc "qwen3-8b" (optional),
+        "targeted": true (optional, chỉ sửa các câu nghi ngờ),
+        "decoding": "adaptive" (optional: beam, greedy, adaptive),
+        "output_mode": "edits" (optional: rewrite, edits),
+        "explain": false (optional, không cần LLM giải thích → nhanh hơn),
+        "sampling": "greedy" (optional: greedy, seeded, sample),
+        "incremental": true (optional, dùng lại kết quả các đoạn không đổi từ lần sửa trước)
     }
+    
+    Pipeline LLM: khi không truyền "explain", các đoạn ngắn liên tiếp được gộp vào
+    1 prompt (chế độ rewrite, giải thích sinh từ diff). "explain": true hoặc
+    "output_mode": "edits" → mỗi đoạn được sửa riêng theo đúng chế độ yêu cầu.
     """
     try:
         data = request.get_json()
@@ -612,65 +909,22 @@ def correct_paragraphs():
             }), 400
         
         # Lấy model và pipeline
-        model = data.get('model', DEFAULT_MODEL).lower()
-        pipeline = data.get('pipeline', DEFAULT_PIPELINE)
-        qwen_variant = data.get('qwen_model', None)
-        ollama_model_name = None
-        
-        # Handle ollama-<model> format
-        if model.startswith("ollama-"):
-            ollama_model_name = model.replace("ollama-", "")
-            # Auto-switch to ollama pipeline if using ollama model
-            if pipeline not in ["ollama_only", "ollama_protonx"]:
-                pipeline = "ollama_protonx"  # Default to ollama + protonx
-            model = "ollama"
-        
-        # Handle qwen-<variant> format
-        elif model.startswith("qwen-"):
-            qwen_variant = model.replace("qwen-", "")
-            model = "qwen"
-        
-        # Validate pipeline
-        if pipeline not in PIPELINE_STRATEGIES:
-            pipeline = DEFAULT_PIPELINE
+        model, pipeline, qwen_variant, ollama_model_name = resolve_model(
+            data.get('model'), data.get('pipeline', DEFAULT_PIPELINE), data.get('qwen_model')
+        )
         
         # Chia thành các đoạn
         paragraphs = [p.strip() for p in text.split('\n') if p.strip()]
         
-        results = []
-        corrected_paragraphs = []
-        
-        for i, original in enumerate(paragraphs):
-            # Kiểm tra đoạn văn có ý nghĩa để xử lý hay không
-            if not is_meaningful_text(original):
-                # Bỏ qua đoạn không có ý nghĩa, giữ nguyên
-                results.append({
-                    "index": i,
-                    "original": original,
-                    "corrected": original,
-                    "explanation": "Đoạn văn không có nội dung ý nghĩa để xử lý",
-                    "note": "",
-                    "has_changes": False,
-                    "skipped": True
-                })
-                corrected_paragraphs.append(original)
-                continue
-            
-            # Sửa lỗi với pipeline
-            final_text, explanation = correct_with_pipeline(original, model=model, pipeline=pipeline, qwen_variant=qwen_variant, ollama_model=ollama_model_name)
-            
-            note = generate_change_note(original, final_text)
-            
-            results.append({
-                "index": i,
-                "original": original,
-                "corrected": final_text,
-                "explanation": explanation,
-                "note": note or "",
-                "has_changes": original != final_text
-            })
-            
-            corrected_paragraphs.append(final_text)
+        targeted = data.get('targeted')
+        stats = {}
+        
+        # Sửa lỗi các đoạn có ý nghĩa (song song trên process pool nếu được bật),
+        # incremental: chỉ chạy model cho các đoạn chưa có trong cache
+        meaningful = [p for p in paragraphs if is_meaningful_text(p)]
+        correct_func = correct_paragraphs_incremental if data.get('incremental', INCREMENTAL_CORRECTION) else parallel.correct_paragraphs
+        corrections = iter(correct_func(meaningful, pipeline, stats=stats, model=model, qwen_variant=qwen_variant, ollama_model=ollama_model_name, targeted=targeted, decoding=data.get('decoding'), output_mode=data.get('output_mode'), explain=data.get('explain'), sampling=data.get('sampling')))
+        results = [paragraph_result(i, original, corrections) for i, original in enumerate(paragraphs)]
         
         return jsonify({
             "success": True,
@@ -680,7 +934,10 @@ def correct_paragraphs():
             "ollama_model_used": ollama_model_name,
             "total_paragraphs": len(paragraphs),
             "results": results,
-            "full_corrected": '\n\n'.join(corrected_paragraphs)
+            "full_corrected": '\n\n'.join(r["corrected"] for r in results),
+            "tokens_avoided": stats.get("tokens_avoided", 0),
+            "paragraphs_reused": stats.get("paragraphs_reused", 0),
+            "decoding_params": describe_decoding(pipeline, data.get('decoding'), data.get('sampling'))
         })
         
     except Exception as e:
@@ -805,8 +1062,6 @@ def correct_docx():
     Upload DOCX, sửa lỗi, và trả về DOCX với comments ghi chú thay đổi.
     """
     try:
-        from docx import Document
-        from docx.shared import Pt, RGBColor
         import io
         
         if 'file' not in request.files:
@@ -829,100 +1084,26 @@ def correct_docx():
             }), 400
         
         # Lấy model và pipeline từ form data
-        model = request.form.get('model', DEFAULT_MODEL).lower()
-        pipeline = request.form.get('pipeline', DEFAULT_PIPELINE)
-        qwen_variant = request.form.get('qwen_model', None)
-        
-        if model not in AVAILABLE_MODELS:
-            model = DEFAULT_MODEL
-        if pipeline not in PIPELINE_STRATEGIES:
-            pipeline = DEFAULT_PIPELINE
-        
-        # Đọc file DOCX
-        doc = Document(io.BytesIO(file.read()))
-        
-        # Tạo document mới với nội dung đã sửa
-        new_doc = Document()
-        changes_log = []
-        
-        for para_idx, para in enumerate(doc.paragraphs):
-            original_text = para.text.strip()
-            
-            if not original_text:
-                new_doc.add_paragraph()
-                continue
-            
-            # Kiểm tra đoạn văn có ý nghĩa để xử lý hay không
-            if not is_meaningful_text(original_text):
-                # Bỏ qua đoạn không có ý nghĩa, giữ nguyên
-                new_doc.add_paragraph(original_text)
-                continue
-            
-            # Sửa lỗi với pipeline
-            final_text, explanation = correct_with_pipeline(original_text, model=model, pipeline=pipeline, qwen_variant=qwen_variant)
-            
-            # Thêm paragraph đã sửa
-            new_para = new_doc.add_paragraph(final_text)
-            
-            # Nếu có thay đổi, ghi chú
-            if original_text != final_text:
-                changes_log.append({
-                    "paragraph": para_idx + 1,
-                    "original": original_text,
-                    "corrected": final_text,
-                    "explanation": explanation
-                })
-        
-        # Thêm phần tổng kết thay đổi ở cuối
-        if changes_log:
-            new_doc.add_paragraph()
-            summary_para = new_doc.add_paragraph()
-            summary_run = summary_para.add_run("═══ TỔNG KẾT CÁC THAY ĐỔI ═══")
-            summary_run.bold = True
-            summary_run.font.size = Pt(14)
-            summary_run.font.color.rgb = RGBColor(0, 102, 204)
-            
-            for change in changes_log:
-                new_doc.add_paragraph()
-                
-                # Tiêu đề đoạn
-                title_para = new_doc.add_paragraph()
-                title_run = title_para.add_run(f"📍 Đoạn {change['paragraph']}:")
-                title_run.bold = True
-                
-                # Văn bản gốc
-                orig_para = new_doc.add_paragraph()
-                orig_run = orig_para.add_run("❌ Gốc: ")
-                orig_run.font.color.rgb = RGBColor(204, 0, 0)
-                orig_para.add_run(change['original'][:200] + "..." if len(change['original']) > 200 else change['original'])
-                
-                # Văn bản đã sửa
-                corr_para = new_doc.add_paragraph()
-                corr_run = corr_para.add_run("✅ Sửa: ")
-                corr_run.font.color.rgb = RGBColor(0, 153, 0)
-                corr_para.add_run(change['corrected'][:200] + "..." if len(change['corrected']) > 200 else change['corrected'])
-                
-                # Giải thích
-                if change['explanation']:
-                    exp_para = new_doc.add_paragraph()
-                    exp_run = exp_para.add_run("💬 Chú thích: ")
-                    exp_run.italic = True
-                    exp_para.add_run(change['explanation'])
-        
-        # Lưu vào buffer
-        buffer = io.BytesIO()
-        new_doc.save(buffer)
-        buffer.seek(0)
+        pipeline, params = _docx_params(request.form)
+        stats = {}
+        data, _ = build_corrected_docx(file.read(), pipeline, params, stats=stats)
         
         # Tạo tên file output
         output_filename = file.filename.replace('.docx', '_corrected.docx')
         
-        return send_file(
-            buffer,
+        tokens_avoided = stats.get("tokens_avoided", 0)
+        if tokens_avoided:
+            log.info("🎯 Span-targeted", extra=kv(file=file.filename, tokens_avoided=tokens_avoided))
+        
+        response = send_file(
+            io.BytesIO(data),
             as_attachment=True,
             download_name=output_filename,
-            mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+            mimetype=DOCX_MIMETYPE
         )
+        response.headers['X-Tokens-Avoided'] = str(tokens_avoided)
+        response.headers['X-Decoding-Params'] = json.dumps(describe_decoding(pipeline, params['decoding'], params['sampling']))
+        return response
         
     except Exception as e:
         import traceback
@@ -940,12 +1121,15 @@ if __name__ == '__main__':
     print("   GET  /api/health - Health check (shows available models & pipelines)")
     print("   POST /api/correct - Correct single text (sync)")
     print("   POST /api/correct-paragraphs - Correct multiple paragraphs (sync)")
-    print("   POST /api/submit-job - Submit job to queue (async)")
-    print("   GET  /api/job-status/<id> - Get job status/result")
+    print("   POST /api/submit-job - Submit job to queue (async, mode=paragraphs: results per paragraph)")
+    print("   POST /api/submit-docx - Submit DOCX correction job (async)")
+    print("   GET  /api/job-status/<id> - Get job status/result (?since=n: new paragraphs only)")
+    print("   GET  /api/job-result/<id> - Download corrected DOCX of a finished job")
     print("   GET  /api/queue-status - Get queue statistics")
     print("   POST /api/upload-docx - Upload DOCX file")
     print("   POST /api/download-docx - Download as DOCX")
     print("   POST /api/correct-docx - Upload & correct DOCX with comments")
+    print("   GET  /metrics - Prometheus metrics (stage latency, tokens, queue)")
     print("=" * 50)
     print(f"🤖 Available models: {AVAILABLE_MODELS}")
     print(f"🔧 Available pipelines: {PIPELINE_STRATEGIES}")
@@ -3,6 +3,11 @@
 Configuration for Vietnamese Text Corrector
 """
 
+import os
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(BASE_DIR, "data")
+
 # ===== QWEN MODELS (Local) =====
 QWEN_MODELS = {
     "qwen2.5-7b": "Qwen/Qwen2.5-7B-Instruct",
@@ -10,6 +15,18 @@ QWEN_MODELS = {
 }
 DEFAULT_QWEN_MODEL = "qwen2.5-7b"
 
+# Assisted decoding cho Qwen (output gần như copy đoạn văn gốc):
+# - "off": decode bình thường
+# - "prompt_lookup": đề xuất token bằng cách tìm n-gram khớp trong prompt (không cần model phụ)
+# - "draft": model nhỏ cùng tokenizer đề xuất token, Qwen kiểm tra lại
+QWEN_ASSISTED_DECODING = "prompt_lookup"
+QWEN_DRAFT_MODELS = {
+    "qwen2.5-7b": "Qwen/Qwen2.5-0.5B-Instruct",
+    "qwen3-8b": "Qwen/Qwen3-0.6B",
+}
+PROMPT_LOOKUP_NUM_TOKENS = 10   # Số token đề xuất mỗi bước (dùng chung cho input-copy decoding)
+PROMPT_LOOKUP_MAX_NGRAM = 3     # Độ dài n-gram tối đa dùng để tìm trong văn bản gốc
+
 # ===== OLLAMA ONLINE =====
 # Models are fetched dynamically from the API
 OLLAMA_API_URL = "https://api.devhunter9x.qzz.io"
@@ -20,6 +37,41 @@ MAX_NEW_TOKENS = 1024
 TEMPERATURE = 0.1
 TOP_P = 0.9
 
+# ===== DETERMINISTIC DECODING (LLM) =====
+# "greedy": do_sample=False → cùng input luôn cho cùng output (cache / benchmark được)
+# "seeded": sampling với seed cố định LLM_SEED trước mỗi lần generate
+# "sample": sampling ngẫu nhiên như trước (temperature / top_p)
+# Có thể chọn theo từng request bằng field "sampling"; tham số decode được trả về
+# trong kết quả ("decoding_params").
+LLM_SAMPLING_MODES = ["greedy", "seeded", "sample"]
+DEFAULT_LLM_SAMPLING = "greedy"
+LLM_SEED = 42
+
+# ===== LLM OUTPUT MODE =====
+# "rewrite": LLM viết lại toàn bộ đoạn văn + giải thích
+# "edits": LLM chỉ liệt kê các lỗi ("sai" => "đúng"), code áp dụng vào văn bản gốc;
+#          output ngắn hơn nhiều, tự fallback sang rewrite nếu edit không hợp lệ.
+# Có thể chọn theo từng request bằng field "output_mode".
+OUTPUT_MODES = ["rewrite", "edits"]
+DEFAULT_OUTPUT_MODE = "rewrite"
+# Chọn theo pipeline, vd: {"qwen_protonx": "edits"} (mặc định trống: tất cả dùng DEFAULT_OUTPUT_MODE)
+PIPELINE_OUTPUT_MODE = {}
+EDIT_MAX_NEW_TOKENS = 256       # Giới hạn token output ở chế độ edits
+EDIT_MAX_CHANGED_RATIO = 0.5    # Edit thay đổi quá tỉ lệ này → coi là không hợp lệ
+# False: prompt không yêu cầu phần [GIẢI THÍCH], generate dừng ngay sau văn bản đã sửa,
+# giải thích được sinh từ diff. Có thể chọn theo từng request bằng field "explain".
+LLM_EXPLAIN_DEFAULT = True
+
+# ===== PARAGRAPH PACKING (LLM) =====
+# Gộp các đoạn ngắn liên tiếp (tiêu đề, mục liệt kê, ô bảng...) vào 1 prompt có
+# đánh số [1], [2]... thay vì gọi LLM cho từng đoạn. Output sai số lượng / sai
+# format → tự fallback sang sửa từng đoạn.
+PACK_SHORT_PARAGRAPHS = True
+PACK_MAX_PARAGRAPH_CHARS = 120  # Đoạn dài hơn → sửa riêng
+PACK_MAX_PARAGRAPHS = 8         # Số đoạn tối đa trong 1 prompt
+PACK_MAX_CHARS = 600            # Tổng độ dài tối đa của 1 prompt gộp
+PACK_MAX_LENGTH_CHANGE = 0.5    # Đoạn trả về dài/ngắn hơn gốc quá tỉ lệ này → coi là không hợp lệ
+
 # ===== PIPELINE STRATEGIES =====
 # Local pipelines:
 # - qwen_protonx: Qwen (local) + ProtonX
@@ -39,6 +91,112 @@ PIPELINE_STRATEGIES = [
 ]
 DEFAULT_PIPELINE = "qwen_protonx"
 
+# ===== DIACRITIC RESTORATION =====
+# Đoạn văn không dấu được khôi phục dấu bằng mô hình n-gram (Viterbi)
+# huấn luyện từ corpus local, thay vì gửi đến LLM.
+# Corpus: file UTF-8, mỗi dòng 1 câu/đoạn văn tiếng Việt CÓ DẤU.
+DIACRITIC_RESTORE_ENABLED = True
+DIACRITIC_CORPUS_PATH = os.path.join(DATA_DIR, "vi_corpus.txt")
+UNACCENTED_MAX_RATIO = 0.1      # Tỉ lệ từ có dấu tối đa để coi là "không dấu"
+DIACRITIC_MIN_COVERAGE = 0.95   # Tỉ lệ âm tiết phải có trong corpus để tin kết quả
+
+# ===== LEXICON / SPELL CHECK =====
+# Từ điển âm tiết/từ tiếng Việt (tạo bằng: python -m processor.lexicon <corpus> <lexicon>)
+LEXICON_PATH = os.path.join(DATA_DIR, "vi_lexicon.txt")
+LEXICON_MAX_EDIT_DISTANCE = 2   # Khoảng cách sửa tối đa khi gợi ý
+
+# ===== SEQ2SEQ (ProtonX, BartPho) =====
+# Giới hạn token của model. Văn bản được chia chunk theo CHUNK_TOKENS
+# (đo bằng tokenizer của model), nhỏ hơn MAX_NEW_TOKENS để output không bị cắt.
+PROTONX_MAX_INPUT_TOKENS = 512
+PROTONX_MAX_NEW_TOKENS = 256
+PROTONX_CHUNK_TOKENS = 200
+BARTPHO_MAX_INPUT_TOKENS = 512
+BARTPHO_MAX_NEW_TOKENS = 512
+BARTPHO_CHUNK_TOKENS = 400
+TOKEN_COUNT_CACHE_SIZE = 4096   # Số câu được cache kết quả đếm token
+# Phát hiện chunk bị cắt cụt: output ngắn hơn tỉ lệ này so với input → tách đôi và chạy lại
+OVERFLOW_MIN_LENGTH_RATIO = 0.6
+OVERFLOW_MAX_RETRY_DEPTH = 3
+
+# ===== SPAN-TARGETED CORRECTION =====
+# Chỉ gửi các câu nghi ngờ có lỗi (theo từ điển / dấu) đến BartPho, ProtonX.
+# Có thể bật/tắt theo từng request bằng field "targeted".
+SPAN_TARGETED_MODE = False
+SEQ2SEQ_BATCH_SIZE = 8          # Số câu mỗi batch khi sửa theo batch
+
+# ===== CPU PROCESS POOL =====
+# Trên máy chỉ có CPU: chạy nhiều worker process song song, mỗi worker dùng ít
+# thread và load model 1 lần. 0 = tắt (xử lý tuần tự trong 1 process).
+CPU_POOL_WORKERS = 0
+CPU_THREADS_PER_WORKER = 2
+CPU_POOL_PIPELINES = ["bartpho_protonx", "protonx_only"]  # Pipeline chạy bằng pool
+MMAP_SHARED_WEIGHTS = True      # Mmap weight safetensors để các worker dùng chung RAM
+
+# ===== INCREMENTAL RE-CORRECTION =====
+# Kết quả từng đoạn được cache theo hash(nội dung + tham số pipeline): sửa lại
+# văn bản sau khi chỉnh 1 đoạn chỉ chạy model cho các đoạn đã thay đổi.
+# Áp dụng cho /api/correct-paragraphs (field "incremental") và app desktop.
+INCREMENTAL_CORRECTION = True
+INCREMENTAL_CACHE_SIZE = 20000  # Số đoạn tối đa trong cache (LRU)
+
+# ===== PIPELINED BARTPHO → PROTONX =====
+# Khi không dùng process pool, nhiều đoạn văn bartpho_protonx (API, DOCX, GUI)
+# được sửa theo lô: BartPho sửa lô kế tiếp trong khi ProtonX refine lô hiện tại.
+PIPELINED_SEQ2SEQ = True
+PIPELINE_BATCH_PARAGRAPHS = 8   # Số đoạn mỗi lô
+PIPELINE_QUEUE_DEPTH = 2        # Số lô BartPho được chạy trước ProtonX tối đa
+
+# ===== SEQ2SEQ BACKEND (CPU) =====
+# "eager" (PyTorch fp32), "int8" (dynamic quantization) hoặc "onnx" (onnxruntime,
+# cần `pip install optimum[onnxruntime]`). Kiểm tra độ lệch: python tests/run_parity.py
+SEQ2SEQ_BACKENDS = {
+    "protonx": "eager",
+    "bartpho": "eager",
+}
+ONNX_CACHE_DIR = os.path.join(DATA_DIR, "onnx")
+# Cache model đã chuyển sang safetensors (+ tokenizer, config) trong thư mục local:
+# lần đầu load từ HuggingFace rồi lưu lại, các lần sau load thẳng (mmap, không
+# tra cứu hub) → khởi động nhanh hơn. Xoá thư mục để tạo lại.
+LOCAL_MODEL_CACHE = True
+MODEL_CACHE_DIR = os.path.join(DATA_DIR, "models")
+
+# ===== DECODING POLICY (SEQ2SEQ) =====
+# "beam": beam search | "greedy": chỉ greedy | "adaptive": greedy trước, câu có
+# token xác suất < ADAPTIVE_MIN_TOKEN_PROB thì chạy lại bằng beam search.
+# Có thể chọn theo từng request bằng field "decoding".
+DECODING_POLICIES = ["beam", "greedy", "adaptive"]
+DEFAULT_DECODING_POLICY = "adaptive"
+PIPELINE_DECODING_POLICY = {
+    "protonx_only": "beam",     # ProtonX là model duy nhất → ưu tiên chất lượng
+}
+BEAM_WIDTH = 4
+ADAPTIVE_MIN_TOKEN_PROB = 0.5
+
+# Input-copy decoding: đề xuất token từ văn bản gốc, model kiểm tra nhiều token
+# trong 1 lượt forward (kết quả giống hệt greedy). Áp dụng cho bước greedy của
+# BartPho/ProtonX và cho Vistral; Qwen dùng QWEN_ASSISTED_DECODING = "prompt_lookup".
+# Kiểm tra: python tests/run_input_copy_parity.py
+INPUT_COPY_DECODING = True
+
+# ===== LOGGING =====
+# Log có cấu trúc (processor/log.py), ghi qua hàng đợi + thread riêng nên thread
+# xử lý request không bị chặn bởi I/O. Nội dung văn bản chỉ được log ở DEBUG.
+# Ghi đè bằng biến môi trường CORRECTOR_LOG_LEVEL / CORRECTOR_LOG_FORMAT.
+LOG_LEVEL = os.environ.get("CORRECTOR_LOG_LEVEL", "INFO")
+LOG_FORMAT = os.environ.get("CORRECTOR_LOG_FORMAT", "text")  # "text" | "json"
+LOG_MAX_CHARS = 100             # Độ dài tối đa của text / field trong 1 record
+LOG_SAMPLE_RATE = 0.1           # Tỉ lệ giữ lại các log lặp lại theo từng đoạn (INFO)
+LOG_QUEUE_SIZE = 10000          # Hàng đợi đầy → bỏ record (không chặn request)
+
+# ===== GUI LOG PANEL =====
+# Log được gom vào buffer và đẩy lên log panel theo lô mỗi GUI_LOG_FLUSH_MS,
+# panel chỉ giữ GUI_LOG_MAX_LINES dòng cuối (bộ nhớ không tăng theo phiên dài).
+GUI_LOG_FLUSH_MS = 200
+GUI_LOG_MAX_LINES = 2000
+GUI_LOG_MAX_PENDING = 5000      # Số dòng chờ tối đa giữa 2 lần flush (cũ nhất bị bỏ)
+GUI_LOG_ECHO_STDOUT = False     # True → ghi thêm ra console gốc (để debug)
+
 # ===== MISC =====
 AUTHOR_NAME = "AI Vietnamese Proofreader"
 
@@ -47,3 +205,4 @@ MAX_QUEUE_SIZE = 50          # Maximum pending jobs
 WORKER_THREADS = 1           # GPU can only process 1 at a time
 JOB_TIMEOUT_SECONDS = 300    # 5 minutes timeout per job
 JOB_CLEANUP_HOURS = 1        # Clean up completed jobs after 1 hour
+JOB_RESULT_BATCH_PARAGRAPHS = 8  # Job nhiều đoạn: số đoạn mỗi lô, kết quả từng lô được trả về qua /api/job-status
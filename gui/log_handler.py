@@ -1,52 +1,100 @@
 import sys
 import io
-from PyQt5.QtCore import QObject, pyqtSignal
+import threading
+from collections import deque
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+from config import GUI_LOG_FLUSH_MS, GUI_LOG_MAX_PENDING, GUI_LOG_ECHO_STDOUT
 
 
 class LogSignal(QObject):
-    """Signal để gửi log message từ bất kỳ thread nào đến GUI"""
+    """Signal để gửi log message (1 lô nhiều dòng) đến GUI"""
     message = pyqtSignal(str)
 
 
 class GuiLogHandler(io.TextIOBase):
     """
     Custom output stream để redirect print() vào GUI log panel.
-    Hoạt động như một proxy giữa stdout và Qt signal.
+
+    write() chỉ gom text vào buffer (thread-safe, không emit signal), QTimer
+    trên GUI thread gọi flush_to_gui() định kỳ để đẩy cả lô lên widget bằng
+    1 signal. Buffer là ring buffer: GUI không theo kịp thì bỏ dòng cũ nhất.
     """
-    
-    def __init__(self, signal: LogSignal, original_stdout):
+
+    def __init__(self, signal: LogSignal, original_stdout, max_pending: int = GUI_LOG_MAX_PENDING, echo: bool = GUI_LOG_ECHO_STDOUT):
         super().__init__()
         self.signal = signal
         self.original_stdout = original_stdout
-    
+        self.echo = echo
+        self._lines = deque(maxlen=max_pending)
+        self._partial = ""  # Phần dòng chưa kết thúc (print ghi text và "\n" riêng)
+        self._dropped = 0
+        self._lock = threading.Lock()
+
     def write(self, text: str):
-        if text.strip():  # Bỏ qua empty lines
-            self.signal.message.emit(text)
-        # Vẫn ghi ra console gốc để debug
-        if self.original_stdout:
+        with self._lock:
+            lines = (self._partial + text).split("\n")
+            self._partial = lines.pop()
+            for line in lines:
+                if line.strip():  # Bỏ qua empty lines
+                    if len(self._lines) == self._lines.maxlen:
+                        self._dropped += 1
+                    self._lines.append(line)
+        # Ghi ra console gốc ngay tại thread gọi (không phải GUI thread)
+        if self.echo and self.original_stdout:
             self.original_stdout.write(text)
         return len(text)
-    
+
     def flush(self):
-        if self.original_stdout:
+        if self.echo and self.original_stdout:
             self.original_stdout.flush()
 
+    def drain(self) -> str:
+        """Lấy toàn bộ dòng đang chờ (kèm thông báo số dòng bị bỏ), "" nếu không có"""
+        with self._lock:
+            if not self._lines:
+                return ""
+            lines = list(self._lines)
+            self._lines.clear()
+            dropped, self._dropped = self._dropped, 0
+        if dropped:
+            lines.insert(0, f"… (bỏ qua {dropped} dòng log)")
+        return "\n".join(lines)
+
+    def flush_to_gui(self):
+        """Gọi từ QTimer trên GUI thread: emit 1 signal cho cả lô"""
+        batch = self.drain()
+        if batch:
+            self.signal.message.emit(batch)
+
 
 # Global signal instance để sử dụng trong toàn app
 log_signal = LogSignal()
+_flush_timer = None
 
 
 def redirect_stdout_to_gui():
     """
     Redirect stdout để tất cả print() statements đều được gửi vào GUI.
+    Gọi trên GUI thread (tạo QTimer flush log theo GUI_LOG_FLUSH_MS).
     Trả về LogSignal để connect với GUI widget.
     """
+    global _flush_timer
     handler = GuiLogHandler(log_signal, sys.stdout)
     sys.stdout = handler
+
+    _flush_timer = QTimer()
+    _flush_timer.timeout.connect(handler.flush_to_gui)
+    _flush_timer.start(GUI_LOG_FLUSH_MS)
     return log_signal
 
 
 def restore_stdout():
-    """Khôi phục stdout gốc"""
+    """Khôi phục stdout gốc (đẩy nốt log còn trong buffer)"""
+    global _flush_timer
+    if _flush_timer is not None:
+        _flush_timer.stop()
+        _flush_timer = None
     if isinstance(sys.stdout, GuiLogHandler):
-        sys.stdout = sys.stdout.original_stdout
+        handler = sys.stdout
+        sys.stdout = handler.original_stdout
+        handler.flush_to_gui()
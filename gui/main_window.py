@@ -2,25 +2,30 @@ import sys
 import os
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
-    QPushButton, QTextEdit, QLabel, QFileDialog, QSplitter,
+    QPushButton, QTextEdit, QPlainTextEdit, QLabel, QFileDialog, QSplitter,
     QTableWidget, QTableWidgetItem, QHeaderView, QMessageBox,
     QProgressBar, QGroupBox
 )
 from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QFont, QColor
 from docx import Document
+from config import GUI_LOG_MAX_LINES
 
 from gui.log_handler import redirect_stdout_to_gui, restore_stdout
-from gui.worker_thread import CorrectionWorker
+from gui.worker_thread import CorrectionWorker, ModelLoader
+from processor.incremental import ResultCache
 
 
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
         self.worker = None
+        self.loader = None
         self.changes_list = []  # Lưu trữ các thay đổi
+        self.result_cache = ResultCache()  # Kết quả từng đoạn, giữ qua các lần "Sửa lỗi"
         self.init_ui()
         self.setup_log_redirect()
+        self.start_model_loading()
     
     def init_ui(self):
         self.setWindowTitle("📝 Vietnamese Text Corrector")
@@ -34,7 +39,7 @@ class MainWindow(QMainWindow):
                 font-size: 14px;
                 font-weight: bold;
             }
-            QTextEdit {
+            QTextEdit, QPlainTextEdit {
                 background-color: #313244;
                 color: #cdd6f4;
                 border: 2px solid #45475a;
@@ -106,6 +111,7 @@ class MainWindow(QMainWindow):
         
         self.btn_process = QPushButton("▶️ Sửa lỗi")
         self.btn_process.clicked.connect(self.start_processing)
+        self.btn_process.setEnabled(False)  # Bật khi model load xong
         btn_layout.addWidget(self.btn_process)
         
         self.btn_save = QPushButton("💾 Lưu kết quả")
@@ -126,6 +132,14 @@ class MainWindow(QMainWindow):
         btn_layout.addWidget(self.btn_clear)
         
         btn_layout.addStretch()
+        
+        # Trạng thái load model (ẩn khi model đã sẵn sàng)
+        self.load_label = QLabel("⏳ Đang khởi động...")
+        btn_layout.addWidget(self.load_label)
+        self.load_progress = QProgressBar()
+        self.load_progress.setFixedWidth(200)
+        self.load_progress.setRange(0, 0)  # Chạy liên tục cho tới khi biết số bước
+        btn_layout.addWidget(self.load_progress)
         main_layout.addLayout(btn_layout)
         
         # === MAIN SPLITTER ===
@@ -195,11 +209,13 @@ class MainWindow(QMainWindow):
         log_group = QGroupBox("📋 LOG")
         log_layout = QVBoxLayout(log_group)
         
-        self.log_text = QTextEdit()
+        # QPlainTextEdit + giới hạn số dòng: append nhanh, bộ nhớ không tăng mãi
+        self.log_text = QPlainTextEdit()
         self.log_text.setReadOnly(True)
+        self.log_text.setMaximumBlockCount(GUI_LOG_MAX_LINES)
         self.log_text.setMaximumHeight(150)
         self.log_text.setStyleSheet("""
-            QTextEdit {
+            QPlainTextEdit {
                 background-color: #11111b;
                 font-family: 'Consolas', 'Courier New', monospace;
                 font-size: 12px;
@@ -218,13 +234,42 @@ class MainWindow(QMainWindow):
         self.log_signal = redirect_stdout_to_gui()
         self.log_signal.message.connect(self.append_log)
     
+    def start_model_loading(self):
+        """Load model ở background, cửa sổ vẫn dùng được (mở file, nhập văn bản)"""
+        self.loader = ModelLoader()
+        self.loader.progress.connect(self.on_model_progress)
+        self.loader.ready.connect(self.on_models_ready)
+        self.loader.error.connect(self.on_models_error)
+        self.loader.start()
+    
+    def on_model_progress(self, step: int, total: int, message: str):
+        self.load_progress.setRange(0, total)
+        self.load_progress.setValue(step)
+        self.load_label.setText(message)
+        self.queue_log(message)
+    
+    def on_models_ready(self):
+        self.load_label.hide()
+        self.load_progress.hide()
+        self.btn_process.setEnabled(True)
+    
+    def on_models_error(self, error: str):
+        self.load_progress.hide()
+        self.load_label.setText("❌ Lỗi load model")
+        self.append_log(error)
+        QMessageBox.critical(self, "Lỗi", error)
+    
     def append_log(self, message: str):
-        """Thêm message vào log panel"""
-        self.log_text.append(message.rstrip())
+        """Thêm message (1 hoặc nhiều dòng) vào log panel"""
+        self.log_text.appendPlainText(message.rstrip())
         # Auto scroll to bottom
         scrollbar = self.log_text.verticalScrollBar()
         scrollbar.setValue(scrollbar.maximum())
     
+    def queue_log(self, message: str):
+        """Đưa message vào buffer log, hiển thị ở lần flush kế tiếp (theo lô)"""
+        print(message)
+    
     def open_file(self):
         """Mở file DOCX và đọc nội dung"""
         file_path, _ = QFileDialog.getOpenFileName(
@@ -257,8 +302,8 @@ class MainWindow(QMainWindow):
         self.changes_list.clear()
         
         # Start worker thread
-        self.worker = CorrectionWorker(text)
-        self.worker.progress.connect(self.append_log)
+        self.worker = CorrectionWorker(text, self.result_cache)
+        self.worker.progress.connect(self.queue_log)
         self.worker.paragraph_done.connect(self.on_paragraph_done)
         self.worker.finished.connect(self.on_processing_finished)
         self.worker.error.connect(self.on_processing_error)
@@ -354,6 +399,8 @@ class MainWindow(QMainWindow):
     def closeEvent(self, event):
         """Cleanup when closing"""
         restore_stdout()
+        if self.loader and self.loader.isRunning():
+            self.loader.wait()  # Không dừng được giữa chừng lúc đang load weight
         if self.worker and self.worker.isRunning():
             self.worker.cancel()
             self.worker.wait()
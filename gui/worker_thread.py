@@ -1,98 +1,117 @@
+import threading
 from PyQt5.QtCore import QThread, pyqtSignal
-from llm.bartpho_model import correct_text as bartpho_correct
-from protonx_layer.protonx_refine import refine_text_chunked
 from processor.diff_utils import generate_change_note
+from processor.incremental import ResultCache, paragraph_key, split_cached
+from config import PIPELINE_BATCH_PARAGRAPHS
+
+# processor.pipeline (torch, transformers) được import trong run() của các
+# worker → cửa sổ hiện ra ngay, không chờ import / load model
+WARMUP_TEXT = "Xin chào, đây là câu chạy thử."
+
+
+class ModelLoader(QThread):
+    """
+    Load model BartPho, ProtonX ở background khi mở app, rồi chạy thử 1 câu
+    (warm-up) để lần sửa đầu tiên không bị chậm.
+    """
+
+    progress = pyqtSignal(int, int, str)  # Bước hiện tại, tổng số bước, message
+    ready = pyqtSignal()
+    error = pyqtSignal(str)
+
+    def run(self):
+        try:
+            from processor.pipeline import get_bartpho, get_protonx, correct_paragraphs_pipelined
+
+            steps = [
+                ("📦 Đang load BartPho...", get_bartpho),
+                ("📦 Đang load ProtonX...", get_protonx),
+                ("🔥 Đang chạy thử...", lambda: correct_paragraphs_pipelined([WARMUP_TEXT])),
+            ]
+            for i, (message, step) in enumerate(steps):
+                self.progress.emit(i, len(steps), message)
+                step()
+            self.progress.emit(len(steps), len(steps), "✅ Model đã sẵn sàng")
+            self.ready.emit()
+
+        except Exception as e:
+            import traceback
+            self.error.emit(f"❌ Không load được model: {str(e)}\n{traceback.format_exc()}")
 
 
 class CorrectionWorker(QThread):
     """
     Worker thread để chạy quá trình sửa lỗi văn bản ở background.
-    Pipeline: BartPho (sửa chính tả) -> ProtonX (refine với chunking)
+    Pipeline: BartPho (sửa chính tả) -> ProtonX (refine với chunking), các
+    đoạn được sửa theo lô và 2 stage chạy gối nhau (correct_paragraphs_pipelined).
+    Có cache (ResultCache, giữ qua các lần chạy): đoạn không đổi dùng lại kết quả cũ.
     """
-    
+
     # Signals để communicate với main thread
     progress = pyqtSignal(str)           # Cập nhật progress message
     # index, original, bartpho_result, final, note, explanation
     paragraph_done = pyqtSignal(int, str, str, str, str, str)
     finished = pyqtSignal(str)            # Toàn bộ text đã sửa xong
     error = pyqtSignal(str)               # Nếu có lỗi
-    
-    # Cấu hình chunking
-    MAX_WORDS_PER_CHUNK = 100  # Số từ tối đa mỗi chunk cho ProtonX
-    
-    def __init__(self, text: str):
+
+    BATCH_SIZE = PIPELINE_BATCH_PARAGRAPHS  # Số đoạn mỗi lô
+
+    def __init__(self, text: str, cache=None):
         super().__init__()
         self.text = text
-        self._is_cancelled = False
-    
+        # {key đoạn: (bartpho, final, explanation)}, truyền cache của lần chạy trước để sửa tăng dần
+        self.cache = cache if cache is not None else ResultCache()
+        self._cancel = threading.Event()
+
     def run(self):
         try:
+            from processor.pipeline import correct_paragraphs_pipelined
+
             paragraphs = [p.strip() for p in self.text.split('\n') if p.strip()]
             total = len(paragraphs)
-            
-            self.progress.emit(f"📊 Bắt đầu xử lý {total} đoạn văn...")
-            self.progress.emit(f"🔧 Pipeline: BartPho → ProtonX (chunk {self.MAX_WORDS_PER_CHUNK} từ)")
-            
-            results = []
-            
-            for i, original in enumerate(paragraphs):
-                if self._is_cancelled:
-                    self.progress.emit("⏹️ Đã hủy xử lý")
-                    return
-                
-                self.progress.emit(f"\n🔷 Đoạn [{i+1}/{total}]")
-                
-                # Bước 1: BartPho sửa chính tả (model chuyên biệt, nhanh)
-                self.progress.emit("  📝 Bước 1: BartPho sửa chính tả...")
-                bartpho_fixed = bartpho_correct(original)
-                
-                # Tạo explanation từ sự khác biệt
-                explanation = self._generate_explanation(original, bartpho_fixed)
-                
-                # Bước 2: ProtonX refine (với chunking nếu text dài)
-                self.progress.emit("  🔧 Bước 2: ProtonX refine...")
-                word_count = len(bartpho_fixed.split())
-                
-                if word_count > self.MAX_WORDS_PER_CHUNK:
-                    self.progress.emit(f"    📦 Text dài ({word_count} từ), chia chunks...")
-                    final_text = refine_text_chunked(bartpho_fixed, self.MAX_WORDS_PER_CHUNK)
-                else:
-                    final_text = refine_text_chunked(bartpho_fixed, self.MAX_WORDS_PER_CHUNK)
-                
-                # Bước 3: Tạo ghi chú thay đổi
-                note = generate_change_note(original, final_text)
-                
-                # Emit kết quả của đoạn này
-                self.paragraph_done.emit(i, original, bartpho_fixed, final_text, note or "", explanation)
-                
-                results.append(final_text)
-            
+            keys = [paragraph_key(p, "bartpho_protonx") for p in paragraphs]
+            done, missing = split_cached(paragraphs, keys, self.cache)
+
+            self.progress.emit(f"📊 Bắt đầu xử lý {total} đoạn văn ({total - len(missing)} đoạn dùng lại kết quả cũ)...")
+            self.progress.emit(f"🔧 Pipeline: BartPho → ProtonX (lô {self.BATCH_SIZE} đoạn, 2 stage song song)")
+
+            # Emit paragraph_done theo đúng thứ tự đoạn: đoạn đã có kết quả được
+            # emit ngay, đoạn phải sửa được emit khi lô của nó xong
+            next_index = 0
+
+            def emit_ready():
+                nonlocal next_index
+                while next_index < total and keys[next_index] in done:
+                    original = paragraphs[next_index]
+                    bartpho_fixed, final_text, explanation = done[keys[next_index]]
+                    note = generate_change_note(original, final_text)
+                    self.paragraph_done.emit(next_index, original, bartpho_fixed, final_text, note or "", explanation)
+                    next_index += 1
+
+            def on_result(index, original, bartpho_fixed, final_text, explanation):
+                key = missing[index][0]
+                done[key] = (bartpho_fixed, final_text, explanation)
+                self.cache.put(key, done[key])
+                self.progress.emit(f"🔷 Đoạn [{index + 1}/{len(missing)}] xong")
+                emit_ready()
+
+            emit_ready()
+            if missing:
+                correct_paragraphs_pipelined(
+                    [text for _, text in missing], batch_size=self.BATCH_SIZE, on_result=on_result, cancel=self._cancel
+                )
+
+            if next_index < total:
+                self.progress.emit("⏹️ Đã hủy xử lý")
+                return
+
             # Hoàn thành
-            full_result = '\n\n'.join(results)
+            full_result = '\n\n'.join(done[key][1] for key in keys)
             self.finished.emit(full_result)
-            
+
         except Exception as e:
             import traceback
             self.error.emit(f"❌ Lỗi: {str(e)}\n{traceback.format_exc()}")
-    
-    def _generate_explanation(self, original: str, corrected: str) -> str:
-        """Tạo giải thích ngắn gọn về các thay đổi"""
-        if original.strip() == corrected.strip():
-            return "Không có thay đổi."
-        
-        original_words = set(original.lower().split())
-        corrected_words = set(corrected.lower().split())
-        
-        added = corrected_words - original_words
-        removed = original_words - corrected_words
-        
-        explanations = []
-        if removed:
-            explanations.append(f"Sửa: {', '.join(list(removed)[:5])}")
-        if added:
-            explanations.append(f"Thành: {', '.join(list(added)[:5])}")
-        
-        return " → ".join(explanations) if explanations else "Đã sửa dấu và định dạng."
-    
+
     def cancel(self):
-        self._is_cancelled = True
+        self._cancel.set()
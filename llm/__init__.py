@@ -1 +1,6 @@
-from .qwen_model import correct_text
+def __getattr__(name):
+    # Import lazy: tránh load model Qwen khi chỉ cần BartPho/Ollama (vd: worker process)
+    if name == "correct_text":
+        from .qwen_model import correct_text
+        return correct_text
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -5,132 +5,108 @@ Model được fine-tune đặc biệt cho sửa lỗi chính tả tiếng Việ
 """
 
 import torch
+from functools import lru_cache, partial
 from transformers import AutoTokenizer, MBartForConditionalGeneration
+from config import (
+    SEQ2SEQ_BATCH_SIZE, SEQ2SEQ_BACKENDS, BARTPHO_MAX_INPUT_TOKENS, BARTPHO_MAX_NEW_TOKENS,
+    BARTPHO_CHUNK_TOKENS, TOKEN_COUNT_CACHE_SIZE
+)
+from processor.segmenter import correct_in_chunks
+from processor.overflow import generate_with_overflow_retry
+from llm.loading import load_seq2seq, local_model_path
+from llm.decoding import generate as decode, resolve_policy
+from processor import metrics
+from processor.log import get_logger, kv, preview
+
+log = get_logger("bartpho")
 
 MODEL_NAME = "bmd1905/vietnamese-correction-v2"
 
 # === LOG: Device Info ===
 device = "cuda" if torch.cuda.is_available() else "cpu"
-print(f"🖥️  [BartPho] Device: {device.upper()}")
-if device == "cuda":
-    print(f"🖥️  [BartPho] GPU: {torch.cuda.get_device_name(0)}")
-print(f"🖥️  [BartPho] Model: {MODEL_NAME}")
-print("=" * 50)
+log.info("🖥️  [BartPho] Device", extra=kv(
+    device=device.upper(),
+    gpu=torch.cuda.get_device_name(0) if device == "cuda" else None,
+    model=MODEL_NAME
+))
 
 # Load tokenizer và model
-tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
-model = MBartForConditionalGeneration.from_pretrained(
-    MODEL_NAME,
-    torch_dtype=torch.float16 if device == "cuda" else torch.float32
-)
-model = model.to(device)
-model.eval()
+tokenizer = AutoTokenizer.from_pretrained(local_model_path(MODEL_NAME))
+model = load_seq2seq(MODEL_NAME, MBartForConditionalGeneration, device, backend=SEQ2SEQ_BACKENDS.get("bartpho", "eager"))
+
+
+def _generate_batch(texts: list, decoding: str = None) -> list:
+    """Generate cho 1 batch văn bản (không chia chunk) theo chính sách decode"""
+    with metrics.timer("seq2seq_tokenize_seconds", model="BartPho"):
+        inputs = tokenizer(
+            texts,
+            return_tensors="pt",
+            truncation=True,
+            max_length=BARTPHO_MAX_INPUT_TOKENS,
+            padding=True
+        ).to(device)
 
+    outputs = decode(
+        model, inputs, resolve_policy(decoding), tokenizer.pad_token_id, "BartPho",
+        max_new_tokens=BARTPHO_MAX_NEW_TOKENS,
+        no_repeat_ngram_size=3
+    )
 
-def correct_text(text: str) -> str:
+    return tokenizer.batch_decode(outputs, skip_special_tokens=True)
+
+
+def _generate_checked(texts: list, decoding: str = None) -> list:
+    """Generate cho 1 batch, tự động tách lại các chunk bị cắt cụt (overflow)"""
+    return generate_with_overflow_retry(
+        texts, partial(_generate_batch, decoding=decoding), count_tokens,
+        BARTPHO_MAX_INPUT_TOKENS, BARTPHO_MAX_NEW_TOKENS, model_name="BartPho"
+    )
+
+
+def correct_text(text: str, decoding: str = None) -> str:
     """
     Sửa lỗi chính tả tiếng Việt bằng BartPho.
     Trả về văn bản đã sửa.
     """
-    # === LOG: BartPho Input ===
-    print("\n" + "=" * 50)
-    print("📥 [BartPho] INPUT:")
-    print("-" * 50)
-    print(text[:200] + "..." if len(text) > 200 else text)
-    print("-" * 50)
-
-    # Tokenize
-    inputs = tokenizer(
-        text,
-        return_tensors="pt",
-        truncation=True,
-        max_length=512,
-        padding=True
-    ).to(device)
-
-    # Generate
-    with torch.no_grad():
-        outputs = model.generate(
-            **inputs,
-            max_new_tokens=512,
-            num_beams=4,
-            early_stopping=True,
-            no_repeat_ngram_size=3
-        )
-
-    # Decode
-    result = tokenizer.decode(outputs[0], skip_special_tokens=True)
-
-    # === LOG: BartPho Output ===
-    print("📤 [BartPho] OUTPUT:")
-    print("-" * 50)
-    print(result[:200] + "..." if len(result) > 200 else result)
-    print("=" * 50)
+    log.debug("📥 [BartPho] INPUT: %s", preview(text))
+    result = _generate_checked([text], decoding)[0]
+    log.debug("📤 [BartPho] OUTPUT: %s", preview(result), extra=kv(chars=len(text), changed=result != text))
 
     return result
 
 
-def correct_text_chunked(text: str, max_words_per_chunk: int = 100) -> str:
+@lru_cache(maxsize=TOKEN_COUNT_CACHE_SIZE)
+def count_tokens(text: str) -> int:
+    """Đếm số token của văn bản theo tokenizer BartPho (có cache)"""
+    return len(tokenizer(text, add_special_tokens=False)["input_ids"])
+
+
+@metrics.register_collector
+def _collect_cache_metrics():
+    """Hit / miss của cache đếm token (cập nhật khi render /metrics)"""
+    info = count_tokens.cache_info()
+    metrics.set_gauge("token_count_cache_hits", info.hits, model="BartPho")
+    metrics.set_gauge("token_count_cache_misses", info.misses, model="BartPho")
+
+
+def correct_batch(texts: list, batch_size: int = SEQ2SEQ_BATCH_SIZE, max_tokens: int = BARTPHO_CHUNK_TOKENS, decoding: str = None) -> list:
+    """
+    Sửa lỗi nhiều văn bản cùng lúc.
+    Mỗi văn bản được chia chunk theo token, các chunk được generate theo batch
+    rồi ghép lại. Trả về list kết quả theo đúng thứ tự đầu vào.
+    """
+    log.info("📦 [BartPho] Sửa batch", extra=kv(sample=True, texts=len(texts), batch=batch_size, max_tokens=max_tokens))
+    generate_batch = partial(_generate_checked, decoding=decoding)
+    return correct_in_chunks(texts, generate_batch, count_tokens, max_tokens, batch_size)
+
+
+def correct_text_chunked(text: str, max_tokens: int = BARTPHO_CHUNK_TOKENS, decoding: str = None) -> str:
     """
     Sửa lỗi văn bản dài bằng cách chia thành chunks theo CÂU.
-    Đảm bảo không cắt giữa câu.
+    Các câu được gom vào chunk theo số token (tokenizer BartPho), câu quá dài
+    được tách theo mệnh đề nên không chunk nào bị cắt cụt.
     """
-    import re
-    
-    words = text.split()
-    
-    if len(words) <= max_words_per_chunk:
-        return correct_text(text)
-    
-    # Chia theo câu (dấu . ! ? kết thúc)
-    sentences = re.split(r'(?<=[.!?])\s+', text)
-    
-    # Gom câu thành chunks, mỗi chunk không quá max_words_per_chunk từ
-    chunks = []
-    current_chunk = []
-    current_word_count = 0
-    
-    for sentence in sentences:
-        sentence = sentence.strip()
-        if not sentence:
-            continue
-            
-        sentence_word_count = len(sentence.split())
-        
-        # Nếu 1 câu đã quá dài → xử lý riêng
-        if sentence_word_count > max_words_per_chunk:
-            # Lưu chunk hiện tại trước
-            if current_chunk:
-                chunks.append(" ".join(current_chunk))
-                current_chunk = []
-                current_word_count = 0
-            # Thêm câu dài như 1 chunk riêng
-            chunks.append(sentence)
-        # Nếu thêm câu này vẫn trong giới hạn
-        elif current_word_count + sentence_word_count <= max_words_per_chunk:
-            current_chunk.append(sentence)
-            current_word_count += sentence_word_count
-        # Nếu thêm câu này vượt giới hạn → tạo chunk mới
-        else:
-            if current_chunk:
-                chunks.append(" ".join(current_chunk))
-            current_chunk = [sentence]
-            current_word_count = sentence_word_count
-    
-    # Thêm chunk cuối cùng
-    if current_chunk:
-        chunks.append(" ".join(current_chunk))
-    
-    print(f"📦 [BartPho] Chia thành {len(chunks)} chunks (theo câu, max {max_words_per_chunk} từ/chunk)")
-    
-    # Xử lý từng chunk
-    corrected_chunks = []
-    for idx, chunk in enumerate(chunks, 1):
-        print(f"  🔷 Chunk [{idx}/{len(chunks)}]: {len(chunk.split())} từ")
-        corrected_chunk = correct_text(chunk)
-        corrected_chunks.append(corrected_chunk)
-    
-    # Ghép lại
-    result = " ".join(corrected_chunks)
-    
-    return result
+    if count_tokens(text) <= max_tokens:
+        return correct_text(text, decoding)
+
+    return correct_batch([text], max_tokens=max_tokens, decoding=decoding)[0]
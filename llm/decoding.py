@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""
+Chính sách decode cho các model seq2seq (ProtonX, BartPho).
+
+- beam: beam search (num_beams=BEAM_WIDTH) cho mọi input
+- greedy: chỉ greedy (nhanh nhất)
+- adaptive: greedy trước; câu nào có token với xác suất thấp hơn
+  ADAPTIVE_MIN_TOKEN_PROB thì chạy lại bằng beam search
+
+Với câu ngắn / ít lỗi, greedy thường cho kết quả giống beam search nên
+adaptive tiết kiệm phần lớn chi phí decode. Bước greedy dùng input-copy
+decoding (llm/input_copy.py) nếu INPUT_COPY_DECODING được bật.
+"""
+
+import time
+
+import torch
+
+from config import (
+    DECODING_POLICIES, DEFAULT_DECODING_POLICY, PIPELINE_DECODING_POLICY,
+    BEAM_WIDTH, ADAPTIVE_MIN_TOKEN_PROB, INPUT_COPY_DECODING
+)
+from llm import input_copy
+from processor import metrics
+from processor.log import get_logger, kv
+
+log = get_logger("decoding")
+
+
+def resolve_policy(policy: str = None, pipeline: str = None) -> str:
+    """Chính sách decode: theo request → theo pipeline → mặc định"""
+    if policy in DECODING_POLICIES:
+        return policy
+    return PIPELINE_DECODING_POLICY.get(pipeline, DEFAULT_DECODING_POLICY)
+
+
+def _min_token_probs(model, outputs, pad_token_id: int) -> list:
+    """Xác suất nhỏ nhất của các token được sinh ra trong từng câu (greedy)"""
+    scores = model.compute_transition_scores(outputs.sequences, outputs.scores, normalize_logits=True)
+    generated = outputs.sequences[:, -scores.shape[1]:]
+    scores = scores.masked_fill(generated == pad_token_id, 0.0)
+    return scores.min(dim=1).values.exp().tolist()
+
+
+def _greedy_input_copy(model, inputs: dict, model_name: str, **generate_kwargs) -> tuple:
+    """Greedy decoding có input-copy, từng câu một (kết quả giống hệt greedy thường)"""
+    config = model.config
+    special_ids = {config.pad_token_id, config.bos_token_id, config.eos_token_id, config.decoder_start_token_id}
+
+    results, confidence = [], []
+    drafted_total = accepted_total = 0
+    for input_ids, attention_mask in zip(inputs["input_ids"], inputs["attention_mask"]):
+        length = int(attention_mask.sum())
+        input_ids = input_ids[:length].unsqueeze(0)
+        source_ids = [t for t in input_ids[0].tolist() if t not in special_ids]
+
+        sequence, min_prob, drafted, accepted = input_copy.generate_seq2seq(
+            model, input_ids, attention_mask[:length].unsqueeze(0), source_ids,
+            max_new_tokens=generate_kwargs["max_new_tokens"],
+            no_repeat_ngram_size=generate_kwargs.get("no_repeat_ngram_size", 0)
+        )
+        results.append(sequence)
+        confidence.append(min_prob)
+        drafted_total += drafted
+        accepted_total += accepted
+
+    metrics.increment("input_copy_draft_tokens_total", drafted_total, model=model_name)
+    metrics.increment("input_copy_accepted_tokens_total", accepted_total, model=model_name)
+    return results, confidence
+
+
+def _greedy(model, inputs: dict, pad_token_id: int, model_name: str, **generate_kwargs) -> tuple:
+    """Greedy decoding (input-copy nếu được bật). Returns: (token ids, xác suất token nhỏ nhất)"""
+    if INPUT_COPY_DECODING and input_copy.supports_seq2seq(model):
+        try:
+            return _greedy_input_copy(model, inputs, model_name, **generate_kwargs)
+        except Exception as e:
+            log.warning(f"⚠️ [{model_name}] Input-copy decoding lỗi, dùng greedy thường", extra=kv(error=str(e)))
+
+    outputs = model.generate(
+        **inputs, num_beams=1, do_sample=False,
+        output_scores=True, return_dict_in_generate=True, **generate_kwargs
+    )
+    return outputs.sequences.tolist(), _min_token_probs(model, outputs, pad_token_id)
+
+
+def _count_generated(results: list, pad_token_id: int) -> int:
+    """Số token được sinh ra (bỏ decoder_start và padding)"""
+    return sum(1 for seq in results for token in seq[1:] if token != pad_token_id)
+
+
+def generate(model, inputs: dict, policy: str, pad_token_id: int, model_name: str, **generate_kwargs) -> list:
+    """
+    Generate theo chính sách decode.
+
+    Args:
+        model: Model seq2seq (PyTorch hoặc ONNX Runtime)
+        inputs: Output của tokenizer (input_ids, attention_mask)
+        policy: "beam", "greedy" hoặc "adaptive"
+        pad_token_id: Token pad của tokenizer
+        model_name: Tên model (label cho metrics)
+        generate_kwargs: Tham số generate còn lại (max_new_tokens...)
+
+    Returns:
+        List token ids của từng câu (theo đúng thứ tự đầu vào)
+    """
+    batch_size = inputs["input_ids"].shape[0]
+    metrics.increment("seq2seq_input_tokens_total", int(inputs["attention_mask"].sum()), model=model_name)
+
+    with torch.no_grad(), metrics.timer("seq2seq_generate_seconds", model=model_name, policy=policy):
+        if policy == "beam":
+            outputs = model.generate(**inputs, num_beams=BEAM_WIDTH, early_stopping=True, **generate_kwargs).tolist()
+            metrics.increment("seq2seq_decode_total", batch_size, model=model_name, mode="beam")
+            metrics.increment("seq2seq_generated_tokens_total", _count_generated(outputs, pad_token_id), model=model_name)
+            return outputs
+
+        results, confidence = _greedy(model, inputs, pad_token_id, model_name, **generate_kwargs)
+
+        if policy == "greedy":
+            metrics.increment("seq2seq_decode_total", batch_size, model=model_name, mode="greedy")
+            metrics.increment("seq2seq_generated_tokens_total", _count_generated(results, pad_token_id), model=model_name)
+            return results
+
+        # adaptive: câu có token kém tự tin → chạy lại bằng beam search
+        retry = [i for i, prob in enumerate(confidence) if prob < ADAPTIVE_MIN_TOKEN_PROB]
+
+        if retry:
+            beam = model.generate(
+                **{k: v[retry] for k, v in inputs.items()},
+                num_beams=BEAM_WIDTH, early_stopping=True, **generate_kwargs
+            )
+            for row, idx in enumerate(retry):
+                results[idx] = beam[row].tolist()
+
+    metrics.increment("seq2seq_decode_total", batch_size - len(retry), model=model_name, mode="greedy")
+    metrics.increment("seq2seq_decode_total", len(retry), model=model_name, mode="beam")
+    metrics.increment("seq2seq_generated_tokens_total", _count_generated(results, pad_token_id), model=model_name)
+    if retry:
+        log.info(f"🔁 [{model_name}] Câu kém tự tin → beam search", extra=kv(sample=True, retry=len(retry), batch=batch_size))
+    return results
+
+
+class ForwardCounter:
+    """
+    Đếm số lần forward của model trong khi generate (context manager).
+    Dùng để tính tỉ lệ token được chấp nhận khi assisted/speculative decoding:
+    mỗi lần forward của model chính sinh ra đúng 1 token của chính nó, phần còn
+    lại là token đề xuất (draft) được chấp nhận.
+
+    Lượt forward đầu tiên xử lý toàn bộ prompt, nên thời điểm nó kết thúc chia
+    thời gian generate thành prefill và decode.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.calls = 0
+        self.prefill_seconds = 0.0
+        self.decode_seconds = 0.0
+        self._handle = None
+        self._start = self._first = None
+
+    def _hook(self, module, args, output):
+        if self.calls == 0:
+            self._first = time.perf_counter()
+        self.calls += 1
+
+    def __enter__(self):
+        self._handle = self.model.register_forward_hook(self._hook)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        self._handle.remove()
+        first = self._first or end
+        self.prefill_seconds = first - self._start
+        self.decode_seconds = end - first
+        return False
+
+    def acceptance(self, new_tokens: int) -> tuple:
+        """(số token draft được chấp nhận, tỉ lệ trên tổng token sinh ra)"""
+        accepted = max(new_tokens - self.calls, 0)
+        return accepted, accepted / new_tokens if new_tokens else 0.0
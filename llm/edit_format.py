@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+Chế độ output "edits": LLM chỉ trả về danh sách lỗi cần sửa thay vì viết lại
+toàn bộ đoạn văn.
+
+Format mỗi dòng:  "từ sai" => "từ đúng"
+Không có lỗi:     KHÔNG CÓ LỖI
+
+Các edit được áp dụng vào văn bản gốc một cách tất định (theo thứ tự xuất
+hiện) và được kiểm tra: span gốc phải có trong văn bản (trọn từ, không khớp vào
+giữa 1 từ dài hơn), không chồng lấn, không thay đổi quá nhiều. Nếu không hợp lệ → trả về None để caller fallback sang
+chế độ viết lại toàn bộ (rewrite).
+"""
+
+import re
+
+from config import OUTPUT_MODES, DEFAULT_OUTPUT_MODE, PIPELINE_OUTPUT_MODE, EDIT_MAX_CHANGED_RATIO
+from processor.diacritics import strip_diacritics
+
+NO_ERRORS_MARKER = "KHÔNG CÓ LỖI"
+
+_EDIT_LINE_RE = re.compile(r'^\s*(?:[-*•]|\d+[.)])?\s*["“](.+?)["”]\s*(?:=>|->|→)\s*["“](.*?)["”]\s*$')
+
+
+def resolve_output_mode(mode: str = None, pipeline: str = None) -> str:
+    """Chế độ output: theo request → theo pipeline → mặc định"""
+    if mode in OUTPUT_MODES:
+        return mode
+    return PIPELINE_OUTPUT_MODE.get(pipeline, DEFAULT_OUTPUT_MODE)
+
+
+def build_edit_request(text: str) -> str:
+    """Phần yêu cầu (sau system prompt) cho chế độ edits"""
+    return f"""Đoạn văn gốc:
+{text}
+
+KHÔNG viết lại đoạn văn. CHỈ liệt kê các lỗi cần sửa, mỗi lỗi 1 dòng theo format:
+"cụm từ sai trong đoạn gốc" => "cụm từ đã sửa"
+
+- Cụm từ sai phải được chép NGUYÊN VĂN từ đoạn gốc (đủ dài để không bị nhầm vị trí)
+- Liệt kê theo thứ tự xuất hiện trong đoạn văn
+- Nếu đoạn văn không có lỗi, chỉ trả lời: {NO_ERRORS_MARKER}
+
+[SỬA LỖI]
+"""
+
+
+def parse_edits(output: str):
+    """
+    Parse output của LLM thành list (span gốc, thay thế).
+    Returns: list edit ([] nếu không có lỗi) hoặc None nếu output sai format.
+    """
+    output = output.strip().strip("`").strip()
+    if not output or output.upper().startswith(NO_ERRORS_MARKER):
+        return [] if output else None
+
+    edits = []
+    for line in output.splitlines():
+        if not line.strip():
+            continue
+        match = _EDIT_LINE_RE.match(line)
+        if match is None:
+            if edits:
+                break  # Phần thừa sau danh sách edit (giải thích, lặp lại...)
+            return None
+        edits.append((match.group(1), match.group(2)))
+    return edits
+
+
+def _span_pattern(old: str):
+    """Regex tìm span gốc như 1 cụm trọn từ ("di" không khớp vào giữa "diễn")"""
+    start = r"(?<!\w)" if re.match(r"\w", old) else ""
+    end = r"(?!\w)" if re.search(r"\w$", old) else ""
+    return re.compile(start + re.escape(old) + end)
+
+
+def apply_edits(text: str, edits: list):
+    """
+    Áp dụng edits vào văn bản gốc theo thứ tự.
+    Returns: văn bản đã sửa, hoặc None nếu edit không hợp lệ.
+    """
+    pieces = []
+    cursor = 0
+    changed = 0
+
+    for old, new in edits:
+        if old == new:
+            continue
+        match = _span_pattern(old).search(text, cursor)
+        if match is None:
+            return None  # Span không có trong văn bản (hoặc không trọn từ / sai thứ tự / chồng lấn)
+        pieces.append(text[cursor:match.start()])
+        pieces.append(new)
+        cursor = match.end()
+        # Chỉ thêm dấu / viết hoa không tính là thay đổi nội dung
+        if strip_diacritics(old).lower() != strip_diacritics(new).lower():
+            changed += max(len(old), len(new))
+
+    if changed > len(text) * EDIT_MAX_CHANGED_RATIO:
+        return None  # Sửa quá nhiều → nghi ngờ LLM viết lại nội dung
+    pieces.append(text[cursor:])
+    return "".join(pieces)
+
+
+def explain_edits(edits: list) -> str:
+    """Giải thích ngắn gọn từ danh sách edit"""
+    return "\n".join(f"- '{old}' → '{new}'" for old, new in edits if old != new)
+
+
+def correct_from_output(text: str, output: str):
+    """
+    Parse + áp dụng output chế độ edits.
+    Returns: (văn bản đã sửa, giải thích) hoặc None nếu cần fallback sang rewrite.
+    """
+    edits = parse_edits(output)
+    if edits is None:
+        return None
+    corrected = apply_edits(text, edits)
+    if corrected is None:
+        return None
+    return corrected, explain_edits(edits)
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+Input-copy decoding (prompt lookup) dùng chung cho mọi model sửa lỗi.
+
+Output sửa lỗi trùng với input đến 90%+, nên thay vì decode từng token, ta
+đề xuất (draft) n token tiếp theo bằng cách tìm hậu tố hiện tại của output
+trong văn bản gốc, rồi kiểm tra cả n token trong 1 lượt forward. Token draft
+chỉ được giữ khi trùng với lựa chọn greedy của model, nên kết quả giống hệt
+greedy decoding thông thường. Không cần model phụ.
+
+- Causal LLM (Qwen, Vistral): văn bản gốc nằm trong prompt, dùng
+  prompt lookup có sẵn của transformers (causal_kwargs)
+- Seq2seq (BartPho, ProtonX): văn bản gốc nằm ở encoder, dùng vòng lặp
+  greedy + kiểm tra draft riêng (generate_seq2seq)
+"""
+
+import math
+
+import torch
+
+from config import PROMPT_LOOKUP_NUM_TOKENS, PROMPT_LOOKUP_MAX_NGRAM
+
+
+def causal_kwargs() -> dict:
+    """Tham số generate bật prompt lookup cho causal LLM"""
+    return {
+        "prompt_lookup_num_tokens": PROMPT_LOOKUP_NUM_TOKENS,
+        "max_matching_ngram_size": PROMPT_LOOKUP_MAX_NGRAM,
+    }
+
+
+def find_draft(output_ids: list, source_ids: list, max_ngram: int = PROMPT_LOOKUP_MAX_NGRAM,
+               num_tokens: int = PROMPT_LOOKUP_NUM_TOKENS) -> list:
+    """
+    Tìm n-gram cuối của output trong source, trả về các token đứng sau nó.
+
+    Ưu tiên n-gram dài nhất; nếu có nhiều vị trí khớp, lấy vị trí gần với độ
+    dài output hiện tại nhất (output sửa lỗi đi gần như song song với input).
+    """
+    for n in range(min(max_ngram, len(output_ids)), 0, -1):
+        suffix = output_ids[-n:]
+        best = None
+        for start in range(len(source_ids) - n):
+            if source_ids[start:start + n] == suffix:
+                if best is None or abs(start + n - len(output_ids)) < abs(best - len(output_ids)):
+                    best = start + n
+        if best is not None:
+            return source_ids[best:best + num_tokens]
+    return []
+
+
+def _banned_tokens(prefix: list, ngram_size: int) -> list:
+    """Token bị cấm bởi no_repeat_ngram_size (giống NoRepeatNGramLogitsProcessor)"""
+    if ngram_size <= 0 or len(prefix) + 1 < ngram_size:
+        return []
+    key = prefix[len(prefix) - ngram_size + 1:]
+    return [
+        prefix[i + ngram_size - 1]
+        for i in range(len(prefix) - ngram_size + 1)
+        if prefix[i:i + ngram_size - 1] == key
+    ]
+
+
+def _crop_cache(past, length: int):
+    """Cắt KV cache của decoder về length token (bỏ các token draft bị loại)"""
+    if hasattr(past, "crop"):
+        past.crop(length)
+        return past
+    return tuple((k[:, :, :length], v[:, :, :length], *rest) for k, v, *rest in past)
+
+
+# Tham số generation_config mà generate_seq2seq không mô phỏng → dùng generate() thường
+_UNSUPPORTED_GENERATION_PARAMS = {
+    "forced_bos_token_id": None,
+    "repetition_penalty": 1.0,
+    "min_length": 0,
+    "min_new_tokens": None,
+    "bad_words_ids": None,
+    "suppress_tokens": None,
+    "begin_suppress_tokens": None,
+    "encoder_no_repeat_ngram_size": 0,
+}
+
+
+def supports_seq2seq(model) -> bool:
+    """
+    Model PyTorch encoder-decoder mà input-copy cho kết quả giống hệt greedy
+    (ONNX Runtime không hỗ trợ cắt KV cache; một số logits processor không được mô phỏng).
+    """
+    if not (isinstance(model, torch.nn.Module) and hasattr(model, "get_encoder")):
+        return False
+    generation_config = model.generation_config
+    return all(
+        getattr(generation_config, name, default) in (default, None)
+        for name, default in _UNSUPPORTED_GENERATION_PARAMS.items()
+    )
+
+
+def generate_seq2seq(model, input_ids: torch.Tensor, attention_mask: torch.Tensor, source_ids: list,
+                     max_new_tokens: int, no_repeat_ngram_size: int = 0,
+                     num_tokens: int = PROMPT_LOOKUP_NUM_TOKENS) -> tuple:
+    """
+    Greedy decoding có input-copy cho 1 câu (batch 1) của model seq2seq.
+
+    Args:
+        model: Model encoder-decoder PyTorch
+        input_ids, attention_mask: Input của encoder (shape [1, L])
+        source_ids: Token của văn bản gốc (không gồm special token) để tìm draft
+        max_new_tokens: Số token tối đa sinh ra
+        no_repeat_ngram_size: Giống tham số cùng tên của generate()
+        num_tokens: Số token draft mỗi bước
+
+    Returns:
+        (token ids gồm decoder_start, xác suất token nhỏ nhất, số token draft, số token draft được chấp nhận)
+    """
+    config = model.config
+    eos_token_id = config.eos_token_id
+    forced_eos = model.generation_config.forced_eos_token_id
+    no_repeat_ngram_size = max(no_repeat_ngram_size, model.generation_config.no_repeat_ngram_size or 0)
+    sequence = [config.decoder_start_token_id]
+    min_log_prob = 0.0
+    drafted = accepted = 0
+
+    with torch.no_grad():
+        encoder_outputs = model.get_encoder()(input_ids=input_ids, attention_mask=attention_mask)
+        past = None
+        pending = [sequence[-1]]  # Token chưa có trong KV cache
+
+        while len(sequence) - 1 < max_new_tokens:
+            draft = find_draft(sequence[1:], source_ids, num_tokens=num_tokens)
+            draft = draft[:max_new_tokens - len(sequence)]
+            drafted += len(draft)
+
+            outputs = model(
+                encoder_outputs=encoder_outputs,
+                attention_mask=attention_mask,
+                decoder_input_ids=torch.tensor([pending + draft], device=input_ids.device),
+                past_key_values=past,
+                use_cache=True
+            )
+            past = outputs.past_key_values
+            logits = outputs.logits[0, len(pending) - 1:]
+
+            # Kiểm tra draft: giữ token đến khi khác lựa chọn greedy của model
+            new_tokens = []
+            for pos in range(len(draft) + 1):
+                step_logits = logits[pos].float()
+                banned = _banned_tokens(sequence + new_tokens, no_repeat_ngram_size)
+                if banned:
+                    step_logits[banned] = float("-inf")
+                if forced_eos is not None and len(sequence) + len(new_tokens) == max_new_tokens:
+                    # Giống ForcedEOSTokenLogitsProcessor: token cuối cùng bắt buộc là EOS
+                    step_logits[:] = float("-inf")
+                    step_logits[forced_eos] = 0.0
+                log_probs = torch.log_softmax(step_logits, dim=-1)
+                token = int(log_probs.argmax())
+                min_log_prob = min(min_log_prob, float(log_probs[token]))
+                new_tokens.append(token)
+                if token == eos_token_id or pos == len(draft) or token != draft[pos]:
+                    break
+
+            accepted += len(new_tokens) - 1
+            sequence.extend(new_tokens)
+            if sequence[-1] == eos_token_id:
+                break
+
+            # KV cache giữ các token đã chấp nhận, token cuối được đưa vào ở bước sau
+            past = _crop_cache(past, len(sequence) - 1)
+            pending = [sequence[-1]]
+
+    return sequence, math.exp(min_log_prob), drafted, accepted
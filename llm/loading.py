@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+Load model seq2seq (ProtonX, BartPho) dùng chung.
+
+Trên CPU, weight được đọc trực tiếp từ file safetensors bằng mmap
+(MAP_PRIVATE) và gán thẳng vào model (load_state_dict(assign=True)), không
+copy sang RAM riêng. Nhờ đó N worker process chạy cùng model dùng chung
+1 bản weight trong page cache của hệ điều hành.
+
+Với LOCAL_MODEL_CACHE, lần load đầu tiên lưu model (safetensors) + tokenizer
+vào MODEL_CACHE_DIR; các lần sau load từ thư mục này (local_model_path).
+
+Backend (chọn theo từng model trong SEQ2SEQ_BACKENDS, chỉ áp dụng trên CPU):
+- eager: PyTorch float32 (mặc định)
+- int8: quantize động các lớp Linear sang int8 (torch.ao.quantization)
+- onnx: export encoder-decoder sang ONNX (có KV cache) và chạy bằng
+  onnxruntime qua optimum; cần cài thêm `optimum[onnxruntime]`
+"""
+
+import os
+import shutil
+
+import torch
+from transformers import AutoConfig, AutoTokenizer
+
+from config import MMAP_SHARED_WEIGHTS, ONNX_CACHE_DIR, LOCAL_MODEL_CACHE, MODEL_CACHE_DIR
+from processor.log import get_logger
+
+log = get_logger("loading")
+
+BACKENDS = ["eager", "int8", "onnx"]
+
+
+def _cache_dir(model_name: str) -> str:
+    return os.path.join(MODEL_CACHE_DIR, model_name.replace("/", "__"))
+
+
+def local_model_path(model_name: str) -> str:
+    """Thư mục cache local của model nếu đã có, ngược lại tên model trên HuggingFace"""
+    path = _cache_dir(model_name)
+    if LOCAL_MODEL_CACHE and os.path.isfile(os.path.join(path, "model.safetensors")):
+        return path
+    return model_name
+
+
+def _save_local(model_name: str, model):
+    """Lưu model (safetensors) + tokenizer vào cache local (ghi vào thư mục tạm rồi đổi tên)"""
+    path = _cache_dir(model_name)
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    try:
+        model.save_pretrained(tmp_path, safe_serialization=True)
+        AutoTokenizer.from_pretrained(model_name).save_pretrained(tmp_path)
+        os.replace(tmp_path, path)
+        log.info(f"💾 [{model_name}] Đã lưu cache local: {path}")
+    except Exception as e:
+        log.warning(f"⚠️ [{model_name}] Không lưu được cache local: {e}")
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+
+def _find_safetensors(model_name: str):
+    """Đường dẫn file model.safetensors (cache local hoặc cache HuggingFace), None nếu không có"""
+    if os.path.isdir(model_name):
+        path = os.path.join(model_name, "model.safetensors")
+        return path if os.path.isfile(path) else None
+    try:
+        from huggingface_hub import hf_hub_download
+        return hf_hub_download(model_name, "model.safetensors")
+    except Exception:
+        return None
+
+
+def _load_mmap(model_name: str, model_cls):
+    """
+    Tạo model trên meta device rồi gán weight mmap từ safetensors.
+    Trả về None nếu không thể (không có safetensors, thiếu weight...).
+    """
+    path = _find_safetensors(model_name)
+    if path is None:
+        return None
+
+    from safetensors.torch import load_file
+
+    config = AutoConfig.from_pretrained(model_name)
+    with torch.device("meta"):
+        if hasattr(model_cls, "from_config"):
+            model = model_cls.from_config(config)
+        else:
+            model = model_cls(config)
+
+    state_dict = load_file(path, device="cpu")
+    model.load_state_dict(state_dict, strict=False, assign=True)
+    model.tie_weights()
+
+    # Còn tensor trên meta (weight thiếu / buffer không lưu trong file) → không dùng được
+    if any(t.is_meta for t in list(model.parameters()) + list(model.buffers())):
+        return None
+    return model
+
+
+def _quantize_int8(model):
+    """Quantize động các lớp Linear sang int8 (weight int8, activation float)"""
+    from torch.ao.quantization import quantize_dynamic
+    return quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def _load_onnx(model_name: str):
+    """
+    Load model ONNX (encoder + decoder có KV cache) bằng onnxruntime.
+    Lần đầu export từ checkpoint PyTorch rồi lưu vào ONNX_CACHE_DIR.
+    """
+    from optimum.onnxruntime import ORTModelForSeq2SeqLM
+
+    export_dir = os.path.join(ONNX_CACHE_DIR, model_name.replace("/", "__"))
+    if os.path.isdir(export_dir):
+        return ORTModelForSeq2SeqLM.from_pretrained(export_dir, use_cache=True)
+
+    log.info(f"🔧 [{model_name}] Export sang ONNX (chỉ chạy lần đầu)...")
+    model = ORTModelForSeq2SeqLM.from_pretrained(model_name, export=True, use_cache=True)
+    model.save_pretrained(export_dir)
+    return model
+
+
+def load_seq2seq(model_name: str, model_cls, device: str, backend: str = "eager"):
+    """
+    Load model seq2seq lên device.
+
+    Args:
+        model_name: Tên model trên HuggingFace
+        model_cls: Class model (AutoModelForSeq2SeqLM, MBartForConditionalGeneration...)
+        device: "cuda" hoặc "cpu"
+        backend: "eager", "int8" hoặc "onnx" (int8/onnx chỉ dùng trên CPU)
+    """
+    source = local_model_path(model_name)
+    if backend not in BACKENDS:
+        log.warning(f"⚠️ [{model_name}] Backend '{backend}' không hợp lệ, dùng eager")
+        backend = "eager"
+    if backend != "eager" and device != "cpu":
+        log.warning(f"⚠️ [{model_name}] Backend '{backend}' chỉ hỗ trợ CPU, dùng eager trên {device.upper()}")
+        backend = "eager"
+
+    if backend == "onnx":
+        try:
+            model = _load_onnx(model_name)
+            log.info(f"⚡ [{model_name}] Backend: ONNX Runtime")
+            return model
+        except ImportError:
+            log.warning(f"⚠️ [{model_name}] Chưa cài optimum[onnxruntime], dùng eager")
+        except Exception as e:
+            log.warning(f"⚠️ [{model_name}] Không load được ONNX, dùng eager: {e}")
+
+    model = _load_eager(source, model_cls, device)
+    if LOCAL_MODEL_CACHE and source == model_name and device == "cpu":
+        _save_local(model_name, model)
+
+    if backend == "int8":
+        model = _quantize_int8(model)
+        log.info(f"⚡ [{model_name}] Backend: int8 (dynamic quantization)")
+    return model
+
+
+def _load_eager(model_name: str, model_cls, device: str):
+    """Load model PyTorch (mmap weight trên CPU nếu được bật)"""
+    if device == "cpu" and MMAP_SHARED_WEIGHTS:
+        try:
+            model = _load_mmap(model_name, model_cls)
+            if model is not None:
+                log.info(f"📦 [{model_name}] Weight được mmap từ safetensors (dùng chung giữa các process)")
+                model.eval()
+                return model
+        except Exception as e:
+            log.warning(f"⚠️ [{model_name}] Không mmap được weight, load bình thường: {e}")
+
+    model = model_cls.from_pretrained(
+        model_name,
+        torch_dtype=torch.float16 if device == "cuda" else torch.float32
+    )
+    model = model.to(device)
+    model.eval()
+    return model
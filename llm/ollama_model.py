@@ -5,13 +5,20 @@ Calls external Ollama API service for text correction
 Models are fetched dynamically from the API
 """
 
+import json
+
 import requests
-import re
-from config import OLLAMA_API_URL, DEFAULT_OLLAMA_MODEL, MAX_NEW_TOKENS, TEMPERATURE
-from llm.prompts import SYSTEM_PROMPT
+from config import OLLAMA_API_URL, DEFAULT_OLLAMA_MODEL, MAX_NEW_TOKENS, TEMPERATURE, EDIT_MAX_NEW_TOKENS
+from llm.prompts import SYSTEM_PROMPT, EDIT_SYSTEM_PROMPT, NO_EXPLAIN_STOP_STRINGS, build_correction_request
+from llm.edit_format import build_edit_request, correct_from_output, resolve_output_mode
+from llm.packing import build_packed_request, parse_packed
+from llm.output_parser import StreamParser
+from llm import sampling as llm_sampling
+from processor import metrics
+from processor.log import get_logger, kv, preview
 
-print(f"🌐 [Ollama] API URL: {OLLAMA_API_URL}")
-print("=" * 50)
+log = get_logger("ollama")
+log.info("🌐 [Ollama] API", extra=kv(url=OLLAMA_API_URL))
 
 # Cache for available models
 _cached_models = None
@@ -36,11 +43,11 @@ def fetch_available_models() -> list:
                 models.append(name)
         
         _cached_models = models
-        print(f"🌐 [Ollama] Fetched {len(models)} models: {models}")
+        log.info("🌐 [Ollama] Fetched models", extra=kv(count=len(models), models=",".join(models)))
         return models
         
     except requests.exceptions.RequestException as e:
-        print(f"⚠️ [Ollama] Cannot fetch models: {e}")
+        log.warning("⚠️ [Ollama] Cannot fetch models", extra=kv(error=str(e)))
         return _cached_models or []
 
 
@@ -51,14 +58,111 @@ def get_available_models() -> list:
     return _cached_models
 
 
-def correct_text(text: str, model_key: str = None) -> tuple[str, str]:
+def _chat_payload(model_name: str, system_prompt: str, user_prompt: str, num_predict: int, stop: list = None, stream: bool = False, sampling: str = None) -> dict:
+    """Request body cho Ollama chat API"""
+    return {
+        "model": model_name,
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ],
+        "stream": stream,
+        "options": {
+            **llm_sampling.ollama_options(llm_sampling.resolve_sampling(sampling), TEMPERATURE),
+            "num_predict": num_predict,
+            **({"stop": stop} if stop else {})
+        }
+    }
+
+
+def _record_usage(data: dict):
+    """Ghi metrics từ thống kê Ollama trả về ở response cuối (thời gian tính bằng ns)"""
+    metrics.increment("llm_prompt_tokens_total", data.get("prompt_eval_count", 0), model="ollama")
+    if "prompt_eval_duration" in data:
+        metrics.observe("llm_prefill_seconds", data["prompt_eval_duration"] / 1e9, model="ollama")
+    if "eval_duration" in data:
+        metrics.observe("llm_decode_seconds", data["eval_duration"] / 1e9, model="ollama")
+
+
+def _chat(model_name: str, system_prompt: str, user_prompt: str, num_predict: int, stop: list = None, sampling: str = None) -> str:
+    """Gọi Ollama chat API, trả về nội dung phản hồi (raise RequestException nếu lỗi)"""
+    response = requests.post(
+        f"{OLLAMA_API_URL}/api/chat",
+        json=_chat_payload(model_name, system_prompt, user_prompt, num_predict, stop, sampling=sampling),
+        timeout=120  # 2 minute timeout
+    )
+    
+    response.raise_for_status()
+    data = response.json()
+    metrics.increment("llm_generated_tokens_total", data.get("eval_count", 0), model="ollama")
+    _record_usage(data)
+    
+    # Extract result from response
+    return data.get("message", {}).get("content", "")
+
+
+def _chat_stream(model_name: str, system_prompt: str, user_prompt: str, num_predict: int, parser: StreamParser, stop: list = None, sampling: str = None) -> str:
+    """
+    Gọi Ollama chat API ở chế độ stream, đưa từng phần vào parser.
+    Không cần giải thích → ngắt stream ngay khi văn bản đã sửa kết thúc.
+    Returns: toàn bộ output đã nhận (raise RequestException nếu lỗi)
+    """
+    with requests.post(
+        f"{OLLAMA_API_URL}/api/chat",
+        json=_chat_payload(model_name, system_prompt, user_prompt, num_predict, stop, stream=True, sampling=sampling),
+        timeout=120,
+        stream=True
+    ) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if not line:
+                continue
+            data = json.loads(line)
+            parser.feed(data.get("message", {}).get("content", ""))
+            if data.get("done"):
+                _record_usage(data)
+            else:
+                metrics.increment("llm_generated_tokens_total", 1, model="ollama")  # Mỗi chunk stream ~ 1 token
+            if data.get("done") or (parser.corrected_done and not parser.explain):
+                break
+    return parser.output
+
+
+def _correct_edits(text: str, model_name: str, sampling: str = None):
+    """
+    Chế độ edits: LLM chỉ liệt kê lỗi, áp dụng vào văn bản gốc.
+    Returns: (văn_bản_đã_sửa, giải_thích) hoặc None nếu cần fallback sang rewrite.
+    """
+    try:
+        generated = _chat(model_name, EDIT_SYSTEM_PROMPT, build_edit_request(text), EDIT_MAX_NEW_TOKENS, sampling=sampling)
+    except requests.exceptions.RequestException as e:
+        log.error("❌ [Ollama] API Error", extra=kv(model=model_name, error=str(e)))
+        return None
+
+    parsed = correct_from_output(text, generated)
+    if parsed is None:
+        metrics.record_event("edit_format_fallback", model="ollama", output_chars=len(generated))
+        log.warning("⚠️ [Ollama] Edit không hợp lệ, chuyển sang viết lại toàn bộ", extra=kv(output_chars=len(generated)))
+        log.debug("Output edits: %s", preview(generated))
+    return parsed
+
+
+class OllamaAPIError(RuntimeError):
+    """Ollama API lỗi kết nối / không phản hồi (không có kết quả sửa lỗi)"""
+
+
+def correct_text(text: str, model_key: str = None, output_mode: str = None, explain: bool = True, sampling: str = None) -> tuple[str, str]:
     """
     Sửa lỗi văn bản bằng Ollama API.
     Returns: (văn_bản_đã_sửa, giải_thích)
+    Raises: OllamaAPIError nếu API lỗi / không phản hồi (caller quyết định giữ nguyên văn bản)
     
     Args:
         text: Văn bản cần sửa
         model_key: Tên model (có thể là tên đầy đủ từ API)
+        output_mode: "rewrite" hoặc "edits" (mặc định: DEFAULT_OUTPUT_MODE)
+        explain: False → không yêu cầu phần [GIẢI THÍCH], dừng ngay sau văn bản đã sửa
+        sampling: greedy, seeded, sample (mặc định: DEFAULT_LLM_SAMPLING)
     """
     # Get model name - use directly if provided, otherwise use default
     if model_key is None:
@@ -67,99 +171,61 @@ def correct_text(text: str, model_key: str = None) -> tuple[str, str]:
     # Model name is used directly (fetched from API)
     model_name = model_key
     
+    if resolve_output_mode(output_mode) == "edits":
+        log.debug("📥 [Ollama] INPUT (edits): %s", preview(text), extra=kv(model=model_name))
+        parsed = _correct_edits(text, model_name, sampling)
+        if parsed is not None:
+            log.debug("📤 [Ollama] OUTPUT (edits): %s", preview(parsed[0]), extra=kv(model=model_name))
+            return parsed
+    
     # Build prompt
-    user_prompt = f"""Đoạn văn gốc:
-{text}
-
-Trả lời theo format (CHỈ 1 LẦN, KHÔNG lặp lại):
-[VĂN BẢN ĐÃ SỬA]
-(viết đoạn văn đã sửa ở đây)
-
-[GIẢI THÍCH]
-(liệt kê các thay đổi ở đây một cách ngắn gọn nhất)
-
-Bắt đầu:
-[VĂN BẢN ĐÃ SỬA]
-"""
+    user_prompt = build_correction_request(text, explain)
     
-    # === LOG: Ollama Input ===
-    print("\n" + "=" * 50)
-    print(f"📥 [Ollama - {model_name}] INPUT:")
-    print("-" * 50)
-    print(text[:200] + "..." if len(text) > 200 else text)
-    print("-" * 50)
+    log.debug("📥 [Ollama] INPUT: %s", preview(text), extra=kv(model=model_name))
     
+    parser = StreamParser(text, explain)
     try:
-        # Call Ollama API
-        response = requests.post(
-            f"{OLLAMA_API_URL}/api/chat",
-            json={
-                "model": model_name,
-                "messages": [
-                    {"role": "system", "content": SYSTEM_PROMPT},
-                    {"role": "user", "content": user_prompt}
-                ],
-                "stream": False,
-                "options": {
-                    "temperature": TEMPERATURE,
-                    "num_predict": MAX_NEW_TOKENS
-                }
-            },
-            timeout=120  # 2 minute timeout
-        )
-        
-        response.raise_for_status()
-        data = response.json()
-        
-        # Extract result from response
-        result = data.get("message", {}).get("content", "")
+        result = _chat_stream(model_name, SYSTEM_PROMPT, user_prompt, MAX_NEW_TOKENS, parser,
+                              stop=None if explain else NO_EXPLAIN_STOP_STRINGS, sampling=sampling)
         
         if not result:
-            print("⚠️ [Ollama] Empty response from API")
-            return text, "Không nhận được phản hồi từ Ollama API"
+            log.warning("⚠️ [Ollama] Empty response from API", extra=kv(model=model_name))
+            raise OllamaAPIError("Không nhận được phản hồi từ Ollama API")
         
-    except requests.exceptions.RequestException as e:
-        print(f"❌ [Ollama] API Error: {e}")
-        return text, f"Lỗi kết nối Ollama API: {str(e)}"
+    except (requests.exceptions.RequestException, ValueError) as e:
+        log.error("❌ [Ollama] API Error", extra=kv(model=model_name, error=str(e)))
+        raise OllamaAPIError(f"Lỗi kết nối Ollama API: {str(e)}") from e
     
-    # Parse kết quả để tách văn bản và giải thích
-    corrected_text = ""
-    explanation = ""
+    corrected_text, explanation = parser.result()
     
-    # Tìm TẤT CẢ các phần [VĂN BẢN ĐÃ SỬA] và lấy phần CUỐI CÙNG
-    all_matches = list(re.finditer(
-        r'\[VĂN BẢN ĐÃ SỬA\]\s*(.*?)(?=\[GIẢI TH[IÍỊ][ÊẾỆ]?[CT]H?\]|\[VĂN BẢN|```|$)', 
-        result, re.DOTALL | re.IGNORECASE
-    ))
-    if all_matches:
-        corrected_text = all_matches[-1].group(1).strip()
-    else:
-        parts = result.split("Đoạn văn đã sửa:")
-        if len(parts) > 1:
-            corrected_text = parts[-1].strip()
-        else:
-            corrected_text = text  # Giữ nguyên nếu không parse được
-    
-    # Tìm phần [GIẢI THÍCH]
-    explain_match = re.search(r'\[GIẢI TH[IÍỊ][ÊẾỆ]?[CT]H?\]\s*(.*?)$', result, re.DOTALL | re.IGNORECASE)
-    if explain_match:
-        explanation = explain_match.group(1).strip()
-    
-    # Làm sạch văn bản
-    corrected_text = re.sub(r'```.*?```', '', corrected_text, flags=re.DOTALL)
-    corrected_text = re.sub(r'\[GIẢI TH.*', '', corrected_text, flags=re.DOTALL | re.IGNORECASE)
-    corrected_text = corrected_text.strip('` \n\t')
-    
-    # === LOG: Ollama Output ===
-    print(f"📤 [Ollama - {model_name}] OUTPUT:")
-    print("-" * 50)
-    print(f"Văn bản: {corrected_text[:100]}...")
-    print(f"Giải thích: {explanation[:100]}..." if explanation else "Không có giải thích")
-    print("=" * 50)
+    log.debug("📤 [Ollama] OUTPUT: %s", preview(corrected_text), extra=kv(model=model_name, explanation=explanation or None))
+    log.info("✅ [Ollama] Đã sửa", extra=kv(sample=True, model=model_name, chars=len(text), changed=corrected_text != text))
 
     return corrected_text, explanation
 
 
+def correct_packed(texts: list, model_key: str = None, sampling: str = None):
+    """
+    Sửa nhiều đoạn ngắn trong 1 lần gọi API (xem llm/packing.py).
+    Returns: list đoạn đã sửa (cùng thứ tự) hoặc None nếu cần sửa từng đoạn.
+    """
+    model_name = model_key or DEFAULT_OLLAMA_MODEL
+    log.info("📦 [Ollama] Gộp đoạn ngắn vào 1 prompt", extra=kv(sample=True, model=model_name, paragraphs=len(texts)))
+
+    try:
+        generated = _chat(model_name, SYSTEM_PROMPT, build_packed_request(texts), MAX_NEW_TOKENS, sampling=sampling)
+    except requests.exceptions.RequestException as e:
+        log.error("❌ [Ollama] API Error", extra=kv(model=model_name, error=str(e)))
+        return None
+
+    corrected = parse_packed(generated, texts)
+    if corrected is None:
+        metrics.record_event("packing_fallback", model="ollama", paragraphs=len(texts))
+        log.warning("⚠️ [Ollama] Output gộp không hợp lệ, sửa từng đoạn", extra=kv(model=model_name, paragraphs=len(texts)))
+        log.debug("Output gộp: %s", preview(generated))
+    return corrected
+
+
 def check_ollama_health() -> bool:
     """Check if Ollama API is reachable"""
     try:
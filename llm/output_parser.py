@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+Parse output chế độ viết lại (rewrite) của LLM, dùng chung cho Qwen,
+Vistral và Ollama.
+
+Output chỉ gồm phần mới sinh ra (không gồm prompt). Prompt kết thúc bằng
+"[VĂN BẢN ĐÃ SỬA]" nên model thường viết thẳng văn bản đã sửa, rồi tới
+"[GIẢI THÍCH]"; một số model lặp lại tiêu đề → lấy phần CUỐI CÙNG.
+
+Pattern được compile 1 lần khi import. StreamParser nhận output theo từng
+phần (streaming) và báo khi phần văn bản đã sửa kết thúc.
+"""
+
+import re
+
+_CORRECTED_HEADER_RE = re.compile(r'\[VĂN BẢN ĐÃ SỬA\]', re.IGNORECASE)
+_EXPLANATION_HEADER_RE = re.compile(r'\[GIẢI TH[IÍỊ][ÊẾỆ]?[CT]H?\]', re.IGNORECASE)
+# Kết thúc phần văn bản đã sửa: giải thích, tiêu đề lặp lại, code block,
+# hoặc stop string "[GIẢI" còn sót lại khi explain=False
+_CORRECTED_END_RE = re.compile(r'\[GIẢI|\[VĂN BẢN|```', re.IGNORECASE)
+_CODE_BLOCK_RE = re.compile(r'```.*?```', re.DOTALL)
+_PARTIAL_MARKER_RE = re.compile(r'\[[^\]\n]{0,16}$')
+_LEGACY_HEADER = "Đoạn văn đã sửa:"
+
+
+def _corrected_section(output: str) -> str:
+    """Phần văn bản đã sửa (sau tiêu đề cuối cùng, trước phần giải thích)"""
+    headers = list(_CORRECTED_HEADER_RE.finditer(output))
+    if headers:
+        output = output[headers[-1].end():]
+    elif _LEGACY_HEADER in output:
+        output = output.split(_LEGACY_HEADER)[-1]
+
+    end = _CORRECTED_END_RE.search(output)
+    return output[:end.start()] if end else output
+
+
+def clean_corrected(text: str) -> str:
+    """Bỏ code block, stop string còn sót và ký tự thừa ở 2 đầu"""
+    text = _CODE_BLOCK_RE.sub('', text)
+    end = _CORRECTED_END_RE.search(text)
+    if end:
+        text = text[:end.start()]
+    return text.strip('` \n\t')
+
+
+def parse_correction(output: str, original: str, explain: bool = True) -> tuple[str, str]:
+    """
+    Tách output (chỉ phần mới sinh ra) thành (văn bản đã sửa, giải thích).
+    Không parse được văn bản đã sửa → giữ nguyên original.
+    """
+    corrected = clean_corrected(_corrected_section(output)) or original
+
+    explanation = ""
+    if explain:
+        match = _EXPLANATION_HEADER_RE.search(output)
+        if match:
+            explanation = output[match.end():].strip()
+    return corrected, explanation
+
+
+class StreamParser:
+    """
+    Parse output theo từng phần khi streaming.
+
+    feed() nhận thêm text, `corrected` là văn bản đã sửa tới thời điểm hiện
+    tại, `corrected_done` = True khi đã gặp phần kết thúc (giải thích, tiêu đề
+    lặp lại...) → có thể dừng stream nếu không cần giải thích.
+    """
+
+    def __init__(self, original: str, explain: bool = True):
+        self.original = original
+        self.explain = explain
+        self.output = ""
+        self.corrected_done = False
+
+    def feed(self, chunk: str) -> str:
+        """Thêm 1 phần output, trả về văn bản đã sửa hiện tại"""
+        self.output += chunk
+        if not self.corrected_done:
+            # Chỉ kết thúc khi đã có nội dung (bỏ qua tiêu đề lặp lại ở đầu output)
+            section = self.output
+            headers = list(_CORRECTED_HEADER_RE.finditer(section))
+            if headers:
+                section = section[headers[-1].end():]
+            end = _CORRECTED_END_RE.search(section)
+            self.corrected_done = end is not None and bool(section[:end.start()].strip())
+        return self.corrected
+
+    @property
+    def corrected(self) -> str:
+        section = _corrected_section(self.output)
+        if not self.corrected_done:
+            section = _PARTIAL_MARKER_RE.sub('', section)  # Tiêu đề đang sinh dở, vd "[GI"
+        return clean_corrected(section)
+
+    def result(self) -> tuple[str, str]:
+        """(văn bản đã sửa, giải thích) từ toàn bộ output đã nhận"""
+        return parse_correction(self.output, self.original, self.explain)
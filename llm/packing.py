@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+Gộp nhiều đoạn văn ngắn vào 1 prompt LLM (packing).
+
+Tiêu đề, mục liệt kê, ô bảng... thường chỉ vài từ nhưng mỗi đoạn vẫn phải
+trả chi phí prefill system prompt và 1 lượt generate. Các đoạn ngắn liên tiếp
+được gộp thành 1 prompt có đánh số:
+
+    [1] đoạn 1
+    [2] đoạn 2
+
+LLM trả về đúng format đó; output được tách lại theo số thứ tự và kiểm tra
+(đủ số đoạn, đúng thứ tự, độ dài hợp lý). Không hợp lệ → trả về None để
+caller fallback sang sửa từng đoạn.
+"""
+
+import re
+
+from config import PACK_MAX_PARAGRAPH_CHARS, PACK_MAX_PARAGRAPHS, PACK_MAX_CHARS, PACK_MAX_LENGTH_CHANGE
+
+_PACKED_LINE_RE = re.compile(r'^\s*\[(\d+)\]\s?(.*)$')
+
+
+def is_packable(text: str) -> bool:
+    """Đoạn đủ ngắn (1 dòng) để gộp chung prompt với các đoạn khác"""
+    return len(text) <= PACK_MAX_PARAGRAPH_CHARS and "\n" not in text and not _PACKED_LINE_RE.match(text)
+
+
+def group_paragraphs(paragraphs: list, packable: list) -> list:
+    """
+    Chia danh sách đoạn thành các nhóm (list index) theo thứ tự.
+    Đoạn packable liên tiếp được gộp (tối đa PACK_MAX_PARAGRAPHS đoạn /
+    PACK_MAX_CHARS ký tự), các đoạn còn lại đứng riêng.
+    """
+    groups = []
+    current, current_chars = [], 0
+
+    for i, text in enumerate(paragraphs):
+        if not packable[i]:
+            if current:
+                groups.append(current)
+                current, current_chars = [], 0
+            groups.append([i])
+            continue
+        if current and (len(current) >= PACK_MAX_PARAGRAPHS or current_chars + len(text) > PACK_MAX_CHARS):
+            groups.append(current)
+            current, current_chars = [], 0
+        current.append(i)
+        current_chars += len(text)
+
+    if current:
+        groups.append(current)
+    return groups
+
+
+def build_packed_request(texts: list) -> str:
+    """Phần yêu cầu (sau system prompt) cho nhiều đoạn ngắn"""
+    numbered = "\n".join(f"[{i}] {text}" for i, text in enumerate(texts, 1))
+    return f"""Dưới đây là {len(texts)} đoạn văn ngắn ĐỘC LẬP, mỗi đoạn 1 dòng bắt đầu bằng số thứ tự:
+{numbered}
+
+Sửa lỗi TỪNG đoạn. KHÔNG gộp, tách hay bỏ đoạn nào, KHÔNG giải thích.
+Trả về đúng {len(texts)} dòng, cùng số thứ tự, theo format:
+[1] đoạn 1 đã sửa
+[2] đoạn 2 đã sửa
+
+[SỬA LỖI]
+"""
+
+
+def parse_packed(output: str, texts: list):
+    """
+    Tách output của LLM thành list đoạn đã sửa (cùng thứ tự với texts).
+    Returns: list hoặc None nếu sai số lượng / sai format / thay đổi quá nhiều.
+    """
+    results = []
+    for line in output.strip().strip("`").splitlines():
+        match = _PACKED_LINE_RE.match(line)
+        if match is None:
+            if results and line.strip():
+                break  # Phần thừa sau danh sách (giải thích, lặp lại...)
+            continue
+        if int(match.group(1)) != len(results) + 1:
+            return None
+        results.append(match.group(2).strip())
+        if len(results) == len(texts):
+            break
+
+    if len(results) != len(texts):
+        return None
+    for original, corrected in zip(texts, results):
+        if not corrected or abs(len(corrected) - len(original)) > max(len(original) * PACK_MAX_LENGTH_CHANGE, 10):
+            return None
+    return results
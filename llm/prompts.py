@@ -21,3 +21,58 @@ VÍ DỤ (trả về TOÀN BỘ câu đã sửa):
 
 CHỈ TRẢ VỀ ĐÚNG 1 LẦN theo format yêu cầu, KHÔNG lặp lại.
 """
+
+# Chế độ "edits": chỉ liệt kê lỗi, không viết lại đoạn văn (xem llm/edit_format.py)
+EDIT_SYSTEM_PROMPT = """
+Bạn là chuyên gia biên tập tiếng Việt.
+
+NHIỆM VỤ:
+- Tìm lỗi chính tả, ngữ pháp, dấu câu trong câu/đoạn văn
+- CHỈ liệt kê các lỗi và cách sửa, KHÔNG viết lại đoạn văn
+
+QUY TẮC QUAN TRỌNG:
+1. Ưu tiên sửa thành từ/cụm từ PHÙ HỢP VỚI NGỮ CẢNH câu
+2. Nhận diện địa danh Việt Nam: chùa Hương, Hồ Gươm, Hạ Long, Sapa, Đà Lạt, Huế, Sài Gòn...
+3. KHÔNG đoán bừa - nếu không chắc chắn thì giữ nguyên từ gốc
+4. KHÔNG thêm nội dung mới, KHÔNG thay đổi ý nghĩa
+5. kiểm tra kỹ các dấu câu trong tiếng việt
+
+VÍ DỤ:
+- Input: "hom qua em di chau Huong"
+  Output:
+  "hom qua em di" => "Hôm qua em đi"
+  "chau Huong" => "chùa Hương"
+- Input: "Anh ấy là bác sĩ."
+  Output: KHÔNG CÓ LỖI
+"""
+
+# Dừng generate ngay sau văn bản đã sửa khi không cần giải thích (explain=False)
+NO_EXPLAIN_STOP_STRINGS = ["[GIẢI"]
+
+
+def build_correction_request(text: str, explain: bool = True) -> str:
+    """Phần yêu cầu (sau system prompt) cho chế độ viết lại toàn bộ (rewrite)"""
+    if not explain:
+        return f"""Đoạn văn gốc:
+{text}
+
+Trả lời theo format (CHỈ 1 LẦN, KHÔNG lặp lại, KHÔNG giải thích):
+[VĂN BẢN ĐÃ SỬA]
+(viết đoạn văn đã sửa ở đây)
+
+Bắt đầu:
+[VĂN BẢN ĐÃ SỬA]
+"""
+    return f"""Đoạn văn gốc:
+{text}
+
+Trả lời theo format (CHỈ 1 LẦN, KHÔNG lặp lại):
+[VĂN BẢN ĐÃ SỬA]
+(viết đoạn văn đã sửa ở đây)
+
+[GIẢI THÍCH]
+(liệt kê các thay đổi ở đây một cách ngắn gọn nhất)
+
+Bắt đầu:
+[VĂN BẢN ĐÃ SỬA]
+"""
@@ -5,25 +5,38 @@ Supports dynamic model selection from config
 """
 
 import torch
-import re
 import threading
 from transformers import AutoTokenizer, AutoModelForCausalLM
-from config import QWEN_MODELS, DEFAULT_QWEN_MODEL, MAX_NEW_TOKENS, TEMPERATURE, TOP_P
-from llm.prompts import SYSTEM_PROMPT
+from config import (
+    QWEN_MODELS, DEFAULT_QWEN_MODEL, MAX_NEW_TOKENS, TEMPERATURE, TOP_P,
+    QWEN_ASSISTED_DECODING, QWEN_DRAFT_MODELS, EDIT_MAX_NEW_TOKENS
+)
+from llm.prompts import SYSTEM_PROMPT, EDIT_SYSTEM_PROMPT, NO_EXPLAIN_STOP_STRINGS, build_correction_request
+from llm import input_copy
+from llm.edit_format import build_edit_request, correct_from_output, resolve_output_mode
+from llm.packing import build_packed_request, parse_packed
+from llm.output_parser import parse_correction
+from llm import sampling as llm_sampling
+from llm.decoding import ForwardCounter
+from processor import metrics
+from processor.log import get_logger, kv, preview
+
+log = get_logger("qwen")
 
 # === Device Info ===
 device = "cuda" if torch.cuda.is_available() else "cpu"
-print(f"🖥️  [Qwen] Device: {device.upper()}")
-if device == "cuda":
-    print(f"🖥️  [Qwen] GPU: {torch.cuda.get_device_name(0)}")
-print(f"🖥️  [Qwen] Available models: {list(QWEN_MODELS.keys())}")
-print("=" * 50)
+log.info("🖥️  [Qwen] Device", extra=kv(
+    device=device.upper(),
+    gpu=torch.cuda.get_device_name(0) if device == "cuda" else None,
+    models=",".join(QWEN_MODELS.keys())
+))
 
 # === Global Model Cache ===
 _loaded_model = None
 _loaded_tokenizer = None
 _loaded_model_key = None
 _model_lock = threading.Lock()  # Thread-safe lock for model access
+_draft_models = {}  # {model_key: draft model} cho assisted decoding
 
 
 def get_model_and_tokenizer(model_key: str = None):
@@ -38,17 +51,19 @@ def get_model_and_tokenizer(model_key: str = None):
     
     # Validate model key
     if model_key not in QWEN_MODELS:
-        print(f"⚠️ Model '{model_key}' không tồn tại, dùng mặc định: {DEFAULT_QWEN_MODEL}")
+        log.warning("⚠️ [Qwen] Model không tồn tại, dùng mặc định", extra=kv(model=model_key, default=DEFAULT_QWEN_MODEL))
         model_key = DEFAULT_QWEN_MODEL
     
     with _model_lock:
         # Return cached if same model
         if _loaded_model is not None and _loaded_model_key == model_key:
+            metrics.increment("model_cache_hits_total", model="qwen")
             return _loaded_model, _loaded_tokenizer
+    metrics.increment("model_cache_misses_total", model="qwen")
     
     # Load new model
     model_name = QWEN_MODELS[model_key]
-    print(f"📦 [Qwen] Loading model: {model_name}...")
+    log.info("📦 [Qwen] Loading model", extra=kv(model=model_name))
     
     tokenizer = AutoTokenizer.from_pretrained(
         model_name, trust_remote_code=True
@@ -58,7 +73,7 @@ def get_model_and_tokenizer(model_key: str = None):
     is_prequantized = any(x in model_name.lower() for x in ['fp8', 'gptq', 'awq', 'gguf'])
     
     if is_prequantized:
-        print(f"📦 [Qwen] Model pre-quantized, loading directly...")
+        log.info("📦 [Qwen] Model pre-quantized, loading directly")
         model = AutoModelForCausalLM.from_pretrained(
             model_name,
             device_map="auto",
@@ -73,108 +88,174 @@ def get_model_and_tokenizer(model_key: str = None):
             trust_remote_code=True
         )
     
-        # Update cache
-        _loaded_model = model
-        _loaded_tokenizer = tokenizer
-        _loaded_model_key = model_key
-        
-        print(f"✅ [Qwen] Model '{model_key}' loaded successfully!")
-        
-        return model, tokenizer
+    # Update cache
+    _loaded_model = model
+    _loaded_tokenizer = tokenizer
+    _loaded_model_key = model_key
+    
+    log.info("✅ [Qwen] Model loaded", extra=kv(model=model_key))
+    
+    return model, tokenizer
+
+
+def get_draft_model(model_key: str):
+    """
+    Load model nháp (draft) cho assisted decoding, dùng chung tokenizer với Qwen.
+    Trả về None nếu model không có draft model trong QWEN_DRAFT_MODELS.
+    """
+    draft_name = QWEN_DRAFT_MODELS.get(model_key)
+    if draft_name is None:
+        return None
+
+    if model_key not in _draft_models:
+        log.info("📦 [Qwen] Loading draft model", extra=kv(model=draft_name))
+        _draft_models[model_key] = AutoModelForCausalLM.from_pretrained(
+            draft_name,
+            device_map="auto",
+            torch_dtype=torch.float16 if device == "cuda" else torch.float32,
+            trust_remote_code=True
+        )
+    return _draft_models[model_key]
+
+
+def _assisted_kwargs(model_key: str) -> dict:
+    """Tham số generate cho chế độ assisted decoding (QWEN_ASSISTED_DECODING)"""
+    if QWEN_ASSISTED_DECODING == "prompt_lookup":
+        return input_copy.causal_kwargs()
+    if QWEN_ASSISTED_DECODING == "draft":
+        draft = get_draft_model(model_key)
+        if draft is not None:
+            return {"assistant_model": draft}
+        log.warning("⚠️ [Qwen] Không có draft model, decode bình thường", extra=kv(model=model_key))
+    return {}
 
 
 # Load default model on import
 model, tokenizer = get_model_and_tokenizer(DEFAULT_QWEN_MODEL)
 
 
-def correct_text(text: str, model_key: str = None) -> tuple[str, str]:
+def build_prompt(text: str, explain: bool = True) -> str:
+    """Prompt sửa lỗi cho Qwen"""
+    return f"{SYSTEM_PROMPT}\n\n{build_correction_request(text, explain)}"
+
+
+def _generate(prompt: str, current_model, current_tokenizer, max_new_tokens: int, stop_strings: list = None, sampling: str = None) -> tuple[str, str]:
+    """
+    Generate cho 1 prompt (thread-safe, có assisted decoding).
+    sampling: greedy, seeded, sample (mặc định: DEFAULT_LLM_SAMPLING)
+    Returns: (toàn bộ output gồm prompt, chỉ phần mới sinh ra)
+    """
+    with metrics.timer("llm_tokenize_seconds", model="qwen"):
+        inputs = current_tokenizer(prompt, return_tensors="pt").to(current_model.device)
+    assisted = _assisted_kwargs(_loaded_model_key)
+    stop = {"stop_strings": stop_strings, "tokenizer": current_tokenizer} if stop_strings else {}
+
+    # Thread-safe inference
+    with _model_lock:
+        with torch.no_grad(), ForwardCounter(current_model) as counter:
+            outputs = current_model.generate(
+                **inputs,
+                max_new_tokens=max_new_tokens,
+                **llm_sampling.hf_kwargs(llm_sampling.resolve_sampling(sampling), TEMPERATURE, TOP_P),
+                **assisted,
+                **stop
+            )
+
+    new_tokens = outputs.shape[1] - inputs["input_ids"].shape[1]
+    metrics.increment("llm_prompt_tokens_total", inputs["input_ids"].shape[1], model="qwen")
+    metrics.increment("llm_generated_tokens_total", new_tokens, model="qwen")
+    metrics.observe("llm_prefill_seconds", counter.prefill_seconds, model="qwen")
+    metrics.observe("llm_decode_seconds", counter.decode_seconds, model="qwen")
+
+    # === Tỉ lệ token draft được chấp nhận (assisted decoding) ===
+    if assisted:
+        accepted, rate = counter.acceptance(new_tokens)
+        metrics.increment("qwen_generated_tokens_total", new_tokens, mode=QWEN_ASSISTED_DECODING)
+        metrics.increment("qwen_accepted_draft_tokens_total", accepted, mode=QWEN_ASSISTED_DECODING)
+        log.info("🚀 [Qwen] Assisted decoding", extra=kv(
+            sample=True, mode=QWEN_ASSISTED_DECODING, accepted=accepted, tokens=new_tokens,
+            rate=round(rate, 2), forwards=counter.calls
+        ))
+
+    input_length = inputs["input_ids"].shape[1]
+    return (
+        current_tokenizer.decode(outputs[0], skip_special_tokens=True),
+        current_tokenizer.decode(outputs[0][input_length:], skip_special_tokens=True)
+    )
+
+
+def _correct_edits(text: str, current_model, current_tokenizer, sampling: str = None):
+    """
+    Chế độ edits: LLM chỉ liệt kê lỗi, áp dụng vào văn bản gốc.
+    Returns: (văn_bản_đã_sửa, giải_thích) hoặc None nếu edit không hợp lệ.
+    """
+    prompt = f"{EDIT_SYSTEM_PROMPT}\n\n{build_edit_request(text)}"
+    _, generated = _generate(prompt, current_model, current_tokenizer, EDIT_MAX_NEW_TOKENS, sampling=sampling)
+
+    parsed = correct_from_output(text, generated)
+    if parsed is None:
+        metrics.record_event("edit_format_fallback", model="qwen", output_chars=len(generated))
+        log.warning("⚠️ [Qwen] Edit không hợp lệ, chuyển sang viết lại toàn bộ", extra=kv(output_chars=len(generated)))
+        log.debug("Output edits: %s", preview(generated))
+    return parsed
+
+
+def correct_text(text: str, model_key: str = None, output_mode: str = None, explain: bool = True, sampling: str = None) -> tuple[str, str]:
     """
     Sửa lỗi văn bản và trả về tuple (văn_bản_đã_sửa, giải_thích).
     
     Args:
         text: Văn bản cần sửa
         model_key: Key của model trong QWEN_MODELS (optional)
+        output_mode: "rewrite" hoặc "edits" (mặc định: DEFAULT_OUTPUT_MODE)
+        explain: False → không yêu cầu phần [GIẢI THÍCH], dừng generate ngay sau văn bản đã sửa
+        sampling: greedy, seeded, sample (mặc định: DEFAULT_LLM_SAMPLING)
     """
-    # Log requested model
-    print(f"\n🔍 [Qwen] Requested model_key: {model_key}")
-    
     # Get model
     current_model, current_tokenizer = get_model_and_tokenizer(model_key)
-    
-    prompt = f"""{SYSTEM_PROMPT}
+    log.debug("📥 [Qwen] INPUT: %s", preview(text), extra=kv(model=_loaded_model_key, requested=model_key))
 
-Đoạn văn gốc:
-{text}
+    if resolve_output_mode(output_mode) == "edits":
+        parsed = _correct_edits(text, current_model, current_tokenizer, sampling)
+        if parsed is not None:
+            corrected_text, explanation = parsed
+            log.debug("📤 [Qwen] OUTPUT (edits): %s", preview(corrected_text), extra=kv(model=_loaded_model_key))
+            return corrected_text, explanation
 
-Trả lời theo format (CHỈ 1 LẦN, KHÔNG lặp lại):
-[VĂN BẢN ĐÃ SỬA]
-(viết đoạn văn đã sửa ở đây)
+    prompt = build_prompt(text, explain)
+    stop_strings = None if explain else NO_EXPLAIN_STOP_STRINGS
+    _, generated = _generate(prompt, current_model, current_tokenizer, MAX_NEW_TOKENS, stop_strings, sampling)
 
-[GIẢI THÍCH]
-(liệt kê các thay đổi ở đây một cách ngắn gọn nhất)
+    # Parse chỉ phần mới sinh ra (không quét lại prompt)
+    corrected_text, explanation = parse_correction(generated, text, explain)
+    
+    log.debug("📤 [Qwen] OUTPUT: %s", preview(corrected_text), extra=kv(
+        model=_loaded_model_key, explanation=explanation or None
+    ))
+    log.info("✅ [Qwen] Đã sửa", extra=kv(
+        sample=True, model=_loaded_model_key, chars=len(text), changed=corrected_text != text
+    ))
 
-Bắt đầu:
-[VĂN BẢN ĐÃ SỬA]
-"""
-    # === LOG: Qwen Input ===
-    print("\n" + "=" * 50)
-    print(f"📥 [Qwen - {_loaded_model_key}] INPUT:")
-    print("-" * 50)
-    print(text)
-    print("-" * 50)
+    return corrected_text, explanation
 
-    inputs = current_tokenizer(prompt, return_tensors="pt").to(current_model.device)
 
-    # Thread-safe inference
-    with _model_lock:
-        with torch.no_grad():
-            outputs = current_model.generate(
-                **inputs,
-                max_new_tokens=MAX_NEW_TOKENS,
-                temperature=TEMPERATURE,
-                top_p=TOP_P,
-                do_sample=True,
-                repetition_penalty=1.2
-            )
+def correct_packed(texts: list, model_key: str = None, sampling: str = None):
+    """
+    Sửa nhiều đoạn ngắn trong 1 lượt generate (xem llm/packing.py).
+    Returns: list đoạn đã sửa (cùng thứ tự) hoặc None nếu cần sửa từng đoạn.
+    """
+    current_model, current_tokenizer = get_model_and_tokenizer(model_key)
+    log.info("📦 [Qwen] Gộp đoạn ngắn vào 1 prompt", extra=kv(sample=True, model=_loaded_model_key, paragraphs=len(texts)))
 
-    result = current_tokenizer.decode(outputs[0], skip_special_tokens=True)
-    
-    # Parse kết quả để tách văn bản và giải thích
-    corrected_text = ""
-    explanation = ""
-    
-    # Tìm TẤT CẢ các phần [VĂN BẢN ĐÃ SỬA] và lấy phần CUỐI CÙNG
-    all_matches = list(re.finditer(
-        r'\[VĂN BẢN ĐÃ SỬA\]\s*(.*?)(?=\[GIẢI TH[IÍỊ][ÊẾỆ]?[CT]H?\]|\[VĂN BẢN|```|$)', 
-        result, re.DOTALL | re.IGNORECASE
-    ))
-    if all_matches:
-        corrected_text = all_matches[-1].group(1).strip()
-    else:
-        parts = result.split("Đoạn văn đã sửa:")
-        if len(parts) > 1:
-            corrected_text = parts[-1].strip()
-        else:
-            corrected_text = text  # Giữ nguyên nếu không parse được
-    
-    # Tìm phần [GIẢI THÍCH]
-    explain_match = re.search(r'\[GIẢI TH[IÍỊ][ÊẾỆ]?[CT]H?\]\s*(.*?)$', result, re.DOTALL | re.IGNORECASE)
-    if explain_match:
-        explanation = explain_match.group(1).strip()
-    
-    # Làm sạch văn bản
-    corrected_text = re.sub(r'```.*?```', '', corrected_text, flags=re.DOTALL)
-    corrected_text = re.sub(r'\[GIẢI TH.*', '', corrected_text, flags=re.DOTALL | re.IGNORECASE)
-    corrected_text = corrected_text.strip('` \n\t')
-    
-    # === LOG: Qwen Output ===
-    print(f"📤 [Qwen - {_loaded_model_key}] OUTPUT:")
-    print("-" * 50)
-    print(f"Văn bản: {corrected_text[:100]}...")
-    print(f"Giải thích: {explanation[:100]}..." if explanation else "Không có giải thích")
-    print("=" * 50)
+    prompt = f"{SYSTEM_PROMPT}\n\n{build_packed_request(texts)}"
+    _, generated = _generate(prompt, current_model, current_tokenizer, MAX_NEW_TOKENS, sampling=sampling)
 
-    return corrected_text, explanation
+    corrected = parse_packed(generated, texts)
+    if corrected is None:
+        metrics.record_event("packing_fallback", model="qwen", paragraphs=len(texts))
+        log.warning("⚠️ [Qwen] Output gộp không hợp lệ, sửa từng đoạn", extra=kv(paragraphs=len(texts)))
+        log.debug("Output gộp: %s", preview(generated))
+    return corrected
 
 
 def get_available_models() -> dict:
@@ -185,3 +266,15 @@ def get_available_models() -> dict:
 def get_current_model() -> str:
     """Return currently loaded model key"""
     return _loaded_model_key
+
+
+def get_assisted_stats() -> dict:
+    """Thống kê assisted decoding từ khi khởi động: số token sinh ra, số token draft được chấp nhận"""
+    generated = metrics.get_counter("qwen_generated_tokens_total", mode=QWEN_ASSISTED_DECODING)
+    accepted = metrics.get_counter("qwen_accepted_draft_tokens_total", mode=QWEN_ASSISTED_DECODING)
+    return {
+        "mode": QWEN_ASSISTED_DECODING,
+        "generated_tokens": generated,
+        "accepted_draft_tokens": accepted,
+        "acceptance_rate": accepted / generated if generated else 0.0,
+    }
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""
+Chế độ sampling của LLM (Qwen, Vistral, Ollama).
+
+- greedy: không sampling → output tất định, cache và so sánh benchmark được
+- seeded: sampling với seed cố định trước mỗi lần generate (tái lập được
+  trên cùng máy / cùng phiên bản thư viện)
+- sample: sampling ngẫu nhiên (hành vi cũ)
+"""
+
+from config import LLM_SAMPLING_MODES, DEFAULT_LLM_SAMPLING, LLM_SEED, TEMPERATURE, TOP_P
+
+REPETITION_PENALTY = 1.2
+
+
+def resolve_sampling(mode: str = None) -> str:
+    """Chế độ sampling: theo request → mặc định"""
+    return mode if mode in LLM_SAMPLING_MODES else DEFAULT_LLM_SAMPLING
+
+
+def hf_kwargs(mode: str, temperature: float = TEMPERATURE, top_p: float = TOP_P) -> dict:
+    """
+    Tham số generate (transformers) cho chế độ sampling.
+    Chế độ seeded đặt seed ngay tại đây → gọi ngay trước generate (trong lock).
+    """
+    if mode == "greedy":
+        return {"do_sample": False, "repetition_penalty": REPETITION_PENALTY}
+    if mode == "seeded":
+        import torch
+        torch.manual_seed(LLM_SEED)
+    return {"do_sample": True, "temperature": temperature, "top_p": top_p, "repetition_penalty": REPETITION_PENALTY}
+
+
+def ollama_options(mode: str, temperature: float = TEMPERATURE) -> dict:
+    """Option của Ollama API cho chế độ sampling"""
+    if mode == "greedy":
+        return {"temperature": 0, "seed": LLM_SEED, "repeat_penalty": REPETITION_PENALTY}
+    if mode == "seeded":
+        return {"temperature": temperature, "seed": LLM_SEED, "repeat_penalty": REPETITION_PENALTY}
+    return {"temperature": temperature, "repeat_penalty": REPETITION_PENALTY}
+
+
+def describe(mode: str, temperature: float = TEMPERATURE, top_p: float = TOP_P) -> dict:
+    """Tham số decode để ghi kèm kết quả (tái lập / làm key cache)"""
+    params = {"sampling": mode, "repetition_penalty": REPETITION_PENALTY}
+    if mode != "greedy":
+        params.update(temperature=temperature, top_p=top_p)
+    if mode != "sample":
+        params["seed"] = LLM_SEED
+    return params
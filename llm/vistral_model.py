@@ -9,30 +9,38 @@ Cách 2: Chạy `huggingface-cli login` trong terminal
 """
 
 import torch
-import re
 import os
 from transformers import AutoTokenizer, AutoModelForCausalLM
 from huggingface_hub import login
-from llm.prompts import SYSTEM_PROMPT
+from llm.prompts import SYSTEM_PROMPT, NO_EXPLAIN_STOP_STRINGS, build_correction_request
+from llm import input_copy
+from llm.output_parser import parse_correction
+from llm import sampling as llm_sampling
+from config import INPUT_COPY_DECODING
+from processor import metrics
+from processor.log import get_logger, kv, preview
+
+log = get_logger("vistral")
 
 MODEL_NAME = "Viet-Mistral/Vistral-7B-Chat"
+VISTRAL_TEMPERATURE = 0.7  # Chỉ dùng khi sampling = seeded / sample
 
 # === HuggingFace Login ===
 HF_TOKEN = os.environ.get("HF_TOKEN", None)
 if HF_TOKEN:
-    print("🔑 [Vistral] Đang đăng nhập HuggingFace...")
+    log.info("🔑 [Vistral] Đang đăng nhập HuggingFace...")
     login(token=HF_TOKEN)
-    print("✅ [Vistral] Đăng nhập thành công!")
+    log.info("✅ [Vistral] Đăng nhập thành công!")
 else:
-    print("⚠️ [Vistral] Không tìm thấy HF_TOKEN. Thử login từ cache...")
+    log.warning("⚠️ [Vistral] Không tìm thấy HF_TOKEN. Thử login từ cache...")
 
 # === LOG: Device Info ===
 device = "cuda" if torch.cuda.is_available() else "cpu"
-print(f"🖥️  [Vistral] Device: {device.upper()}")
-if device == "cuda":
-    print(f"🖥️  [Vistral] GPU: {torch.cuda.get_device_name(0)}")
-print(f"🖥️  [Vistral] Model: {MODEL_NAME}")
-print("=" * 50)
+log.info("🖥️  [Vistral] Device", extra=kv(
+    device=device.upper(),
+    gpu=torch.cuda.get_device_name(0) if device == "cuda" else None,
+    model=MODEL_NAME
+))
 
 # Load tokenizer và model
 tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME, trust_remote_code=True, token=HF_TOKEN)
@@ -47,34 +55,22 @@ model = AutoModelForCausalLM.from_pretrained(
 )
 
 
-def correct_text(text: str) -> tuple[str, str]:
+def build_prompt(text: str, explain: bool = True) -> str:
+    """Prompt sửa lỗi theo Mistral chat template"""
+    return f"<s>[INST] {SYSTEM_PROMPT}\n\n{build_correction_request(text, explain)}[/INST]"
+
+
+def correct_text(text: str, explain: bool = True, sampling: str = None) -> tuple[str, str]:
     """
     Sửa lỗi văn bản tiếng Việt bằng Vistral.
     Trả về tuple (văn_bản_đã_sửa, giải_thích).
+    explain=False: không yêu cầu phần [GIẢI THÍCH], dừng ngay sau văn bản đã sửa.
+    sampling: greedy, seeded, sample (mặc định: DEFAULT_LLM_SAMPLING).
     """
-    # Format theo Mistral chat template
-    prompt = f"""<s>[INST] {SYSTEM_PROMPT}
-
-Đoạn văn gốc:
-{text}
-
-Trả lời theo format (CHỈ 1 LẦN, KHÔNG lặp lại):
-[VĂN BẢN ĐÃ SỬA]
-(viết đoạn văn đã sửa ở đây)
-
-[GIẢI THÍCH]
-(liệt kê các thay đổi ở đây một cách ngắn gọn nhất)
+    prompt = build_prompt(text, explain)
+    stop = {} if explain else {"stop_strings": NO_EXPLAIN_STOP_STRINGS, "tokenizer": tokenizer}
 
-Bắt đầu:
-[VĂN BẢN ĐÃ SỬA]
-[/INST]"""
-
-    # === LOG: Vistral Input ===
-    print("\n" + "=" * 50)
-    print("📥 [Vistral] INPUT:")
-    print("-" * 50)
-    print(text[:200] + "..." if len(text) > 200 else text)
-    print("-" * 50)
+    log.debug("📥 [Vistral] INPUT: %s", preview(text))
 
     inputs = tokenizer(prompt, return_tensors="pt").to(model.device)
 
@@ -82,49 +78,19 @@ Bắt đầu:
         outputs = model.generate(
             **inputs,
             max_new_tokens=512,
-            temperature=0.7,
-            top_p=0.9,
-            do_sample=True,
-            repetition_penalty=1.2,
-            pad_token_id=tokenizer.eos_token_id
+            **llm_sampling.hf_kwargs(llm_sampling.resolve_sampling(sampling), temperature=VISTRAL_TEMPERATURE, top_p=0.9),
+            pad_token_id=tokenizer.eos_token_id,
+            **(input_copy.causal_kwargs() if INPUT_COPY_DECODING else {}),
+            **stop
         )
 
-    result = tokenizer.decode(outputs[0], skip_special_tokens=True)
-    
-    # Parse kết quả để tách văn bản và giải thích
-    corrected_text = ""
-    explanation = ""
-    
-    # Tìm TẤT CẢ các phần [VĂN BẢN ĐÃ SỬA] và lấy phần CUỐI CÙNG
-    all_matches = list(re.finditer(
-        r'\[VĂN BẢN ĐÃ SỬA\]\s*(.*?)(?=\[GIẢI TH[IÍỊ][ÊẾỆ]?[CT]H?\]|\[VĂN BẢN|```|$)', 
-        result, re.DOTALL | re.IGNORECASE
-    ))
-    if all_matches:
-        corrected_text = all_matches[-1].group(1).strip()
-    else:
-        # Fallback: lấy phần sau [/INST]
-        parts = result.split("[/INST]")
-        if len(parts) > 1:
-            corrected_text = parts[-1].strip()
-        else:
-            corrected_text = text  # Giữ nguyên nếu không parse được
-    
-    # Tìm phần [GIẢI THÍCH]
-    explain_match = re.search(r'\[GIẢI TH[IÍỊ][ÊẾỆ]?[CT]H?\]\s*(.*?)$', result, re.DOTALL | re.IGNORECASE)
-    if explain_match:
-        explanation = explain_match.group(1).strip()
-    
-    # Làm sạch văn bản
-    corrected_text = re.sub(r'```.*?```', '', corrected_text, flags=re.DOTALL)
-    corrected_text = re.sub(r'\[GIẢI TH.*', '', corrected_text, flags=re.DOTALL | re.IGNORECASE)
-    corrected_text = corrected_text.strip('` \n\t')
+    # Chỉ decode phần mới sinh ra (bỏ token của prompt)
+    new_ids = outputs[0][inputs["input_ids"].shape[1]:]
+    metrics.increment("llm_generated_tokens_total", len(new_ids), model="vistral")
+    generated = tokenizer.decode(new_ids, skip_special_tokens=True)
+    corrected_text, explanation = parse_correction(generated, text, explain)
     
-    # === LOG: Vistral Output ===
-    print("📤 [Vistral] OUTPUT:")
-    print("-" * 50)
-    print(f"Văn bản: {corrected_text[:100]}..." if len(corrected_text) > 100 else f"Văn bản: {corrected_text}")
-    print(f"Giải thích: {explanation[:100]}..." if explanation and len(explanation) > 100 else f"Giải thích: {explanation}" if explanation else "Không có giải thích")
-    print("=" * 50)
+    log.debug("📤 [Vistral] OUTPUT: %s", preview(corrected_text), extra=kv(explanation=explanation or None))
+    log.info("✅ [Vistral] Đã sửa", extra=kv(sample=True, chars=len(text), tokens=len(new_ids), changed=corrected_text != text))
 
     return corrected_text, explanation
@@ -1 +1,6 @@
-from .docx_processor import process_docx
+def __getattr__(name):
+    # Import lazy: tránh load model Qwen khi chỉ cần các tiện ích xử lý văn bản
+    if name == "process_docx":
+        from .docx_processor import process_docx
+        return process_docx
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+"""
+Nhận diện văn bản tiếng Việt không dấu và khôi phục dấu.
+
+Engine khôi phục dấu là mô hình bigram trên âm tiết + thuật toán Viterbi,
+huấn luyện từ corpus local (DIACRITIC_CORPUS_PATH). Chạy trên CPU trong vài
+mili-giây nên các đoạn văn chỉ thiếu dấu không cần gửi đến LLM.
+"""
+
+import math
+import os
+import re
+import threading
+import unicodedata
+from collections import Counter, defaultdict
+
+from config import (
+    DIACRITIC_CORPUS_PATH, UNACCENTED_MAX_RATIO, DIACRITIC_MIN_COVERAGE
+)
+from processor.log import get_logger, kv
+
+log = get_logger("diacritics")
+
+# Âm tiết = chuỗi chữ cái liên tiếp (không gồm chữ số và "_")
+_SYLLABLE_RE = re.compile(r"[^\W\d_]+", re.UNICODE)
+
+# Trọng số nội suy giữa xác suất bigram và unigram
+_BIGRAM_WEIGHT = 0.8
+_BOS = "<s>"
+
+
+def strip_diacritics(text: str) -> str:
+    """Bỏ toàn bộ dấu thanh, dấu mũ và chuyển đ/Đ thành d/D."""
+    text = text.replace("đ", "d").replace("Đ", "D")
+    decomposed = unicodedata.normalize("NFD", text)
+    stripped = "".join(ch for ch in decomposed if unicodedata.category(ch) != "Mn")
+    return unicodedata.normalize("NFC", stripped)
+
+
+def has_diacritics(word: str) -> bool:
+    """Từ có chứa ít nhất 1 ký tự có dấu (hoặc đ) hay không."""
+    return strip_diacritics(word) != word
+
+
+def is_unaccented(text: str, min_words: int = 3, max_accented_ratio: float = UNACCENTED_MAX_RATIO) -> bool:
+    """
+    Kiểm tra đoạn văn có phải tiếng Việt bị mất dấu hay không.
+
+    Args:
+        text: Văn bản cần kiểm tra
+        min_words: Số âm tiết tối thiểu để đưa ra kết luận
+        max_accented_ratio: Tỉ lệ âm tiết có dấu tối đa (cho phép vài từ lẻ có dấu)
+
+    Returns:
+        True nếu phần lớn âm tiết không có dấu
+    """
+    if not text or not text.strip():
+        return False
+
+    syllables = _SYLLABLE_RE.findall(text)
+    if len(syllables) < min_words:
+        return False
+
+    accented = sum(1 for s in syllables if has_diacritics(s))
+    return accented / len(syllables) <= max_accented_ratio
+
+
+def _apply_case(template: str, word: str) -> str:
+    """Áp dụng kiểu chữ hoa/thường của âm tiết gốc lên âm tiết đã khôi phục."""
+    if len(template) > 1 and template.isupper():
+        return word.upper()
+    if template[:1].isupper():
+        return word[:1].upper() + word[1:]
+    return word
+
+
+class DiacriticRestorer:
+    """
+    Khôi phục dấu bằng bigram âm tiết + Viterbi.
+
+    Mỗi âm tiết không dấu (vd: "huong") có tập ứng viên lấy từ corpus
+    (vd: "hương", "hướng", "hưởng"...). Viterbi chọn chuỗi ứng viên có
+    xác suất bigram lớn nhất trong từng đoạn giữa các dấu câu.
+    """
+
+    def __init__(self):
+        self.unigrams = Counter()
+        self.bigrams = Counter()
+        self.candidates = defaultdict(set)
+        self.total = 0
+
+    def train(self, lines) -> "DiacriticRestorer":
+        """Học thống kê từ các dòng văn bản có dấu."""
+        for line in lines:
+            for segment in self._segments(line):
+                prev = _BOS
+                for _, _, syllable in segment:
+                    word = syllable.lower()
+                    self.unigrams[word] += 1
+                    self.bigrams[(prev, word)] += 1
+                    self.candidates[strip_diacritics(word)].add(word)
+                    prev = word
+                self.unigrams[_BOS] += 1
+        self.total = sum(self.unigrams.values())
+        return self
+
+    @staticmethod
+    def _segments(text: str):
+        """
+        Chia văn bản thành các đoạn âm tiết liên tiếp.
+        Dấu câu / chữ số giữa 2 âm tiết sẽ ngắt ngữ cảnh bigram.
+        Mỗi phần tử là (start, end, syllable).
+        """
+        segment = []
+        last_end = 0
+        for match in _SYLLABLE_RE.finditer(text):
+            gap = text[last_end:match.start()]
+            if segment and gap.strip():
+                yield segment
+                segment = []
+            segment.append((match.start(), match.end(), match.group()))
+            last_end = match.end()
+        if segment:
+            yield segment
+
+    def _log_prob(self, prev: str, word: str) -> float:
+        unigram = (self.unigrams[word] + 1) / (self.total + len(self.unigrams) + 1)
+        prev_count = self.unigrams[prev]
+        bigram = self.bigrams[(prev, word)] / prev_count if prev_count else 0.0
+        return math.log(_BIGRAM_WEIGHT * bigram + (1 - _BIGRAM_WEIGHT) * unigram)
+
+    def _viterbi(self, words: list) -> list:
+        # best[cand] = (log_prob, path)
+        best = {_BOS: (0.0, [])}
+        for word in words:
+            options = self.candidates.get(strip_diacritics(word), None) or {word}
+            step = {}
+            for cand in options:
+                step[cand] = max(
+                    (score + self._log_prob(prev, cand), path + [cand])
+                    for prev, (score, path) in best.items()
+                )
+            best = step
+        return max(best.values())[1]
+
+    def restore(self, text: str) -> tuple[str, float]:
+        """
+        Khôi phục dấu cho văn bản.
+
+        Returns:
+            (văn_bản_đã_khôi_phục, coverage) với coverage là tỉ lệ âm tiết
+            có trong corpus (âm tiết lạ được giữ nguyên).
+        """
+        pieces = []
+        last_end = 0
+        known = 0
+        count = 0
+
+        for segment in self._segments(text):
+            words = [strip_diacritics(s).lower() for _, _, s in segment]
+            restored = self._viterbi(words)
+            for (start, end, original), word in zip(segment, restored):
+                count += 1
+                if strip_diacritics(original).lower() in self.candidates:
+                    known += 1
+                pieces.append(text[last_end:start])
+                pieces.append(_apply_case(original, word))
+                last_end = end
+
+        pieces.append(text[last_end:])
+        coverage = known / count if count else 0.0
+        return "".join(pieces), coverage
+
+
+# === Global Restorer Cache ===
+_restorer = None
+_restorer_loaded = False
+_restorer_lock = threading.Lock()
+
+
+def get_restorer():
+    """
+    Load restorer từ corpus local (chỉ 1 lần).
+    Trả về None nếu không có corpus.
+    """
+    global _restorer, _restorer_loaded
+
+    with _restorer_lock:
+        if _restorer_loaded:
+            return _restorer
+        _restorer_loaded = True
+
+        if not os.path.exists(DIACRITIC_CORPUS_PATH):
+            log.warning("⚠️ [Diacritics] Không tìm thấy corpus", extra=kv(path=DIACRITIC_CORPUS_PATH))
+            return None
+
+        with open(DIACRITIC_CORPUS_PATH, encoding="utf-8") as f:
+            _restorer = DiacriticRestorer().train(f)
+        log.info("✅ [Diacritics] Đã học âm tiết từ corpus", extra=kv(syllables=len(_restorer.unigrams)))
+        return _restorer
+
+
+def restore_diacritics(text: str, min_coverage: float = DIACRITIC_MIN_COVERAGE):
+    """
+    Khôi phục dấu nếu engine đủ tin cậy.
+
+    Returns:
+        Văn bản đã khôi phục dấu, hoặc None nếu không có corpus hoặc
+        có quá nhiều âm tiết lạ (khi đó nên dùng LLM).
+    """
+    restorer = get_restorer()
+    if restorer is None:
+        return None
+
+    restored, coverage = restorer.restore(text)
+    if coverage < min_coverage:
+        log.info("⏭️ [Diacritics] Coverage thấp, chuyển sang LLM", extra=kv(sample=True, coverage=round(coverage, 2)))
+        return None
+
+    return restored
@@ -26,6 +26,26 @@ def is_meaningful_text(text: str, min_words: int = 3) -> bool:
     return len(words) >= min_words
 
 
+def generate_explanation(original: str, corrected: str) -> str:
+    """Tạo giải thích ngắn gọn về các thay đổi"""
+    if original.strip() == corrected.strip():
+        return "Không có thay đổi."
+    
+    original_words = set(original.lower().split())
+    corrected_words = set(corrected.lower().split())
+    
+    added = corrected_words - original_words
+    removed = original_words - corrected_words
+    
+    explanations = []
+    if removed:
+        explanations.append(f"Sửa: {', '.join(list(removed)[:5])}")
+    if added:
+        explanations.append(f"Thành: {', '.join(list(added)[:5])}")
+    
+    return " → ".join(explanations) if explanations else "Đã sửa dấu và định dạng."
+
+
 def generate_change_note(original: str, corrected: str):
     if original.strip() == corrected.strip():
         return None
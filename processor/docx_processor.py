@@ -1,19 +1,24 @@
 from docx import Document
-from llm.qwen_model import correct_text
-from protonx_layer.protonx_refine import refine_text
 from processor.diff_utils import generate_change_note, is_meaningful_text
+from processor.parallel import correct_paragraphs
 from processor.track_comment import add_comment
-from config import AUTHOR_NAME
+from processor.log import get_logger, kv, preview
+from config import AUTHOR_NAME, DEFAULT_PIPELINE
 
-def process_docx(input_path, output_path):
+log = get_logger("docx")
+
+
+def process_docx(input_path, output_path, pipeline=DEFAULT_PIPELINE):
     doc = Document(input_path)
     new_doc = Document()
 
     total_paragraphs = len([p for p in doc.paragraphs if p.text.strip()])
-    print("\n" + "🚀" * 25)
-    print(f"📄 Bắt đầu xử lý file: {input_path}")
-    print(f"📊 Tổng số đoạn văn cần xử lý: {total_paragraphs}")
-    print("🚀" * 25 + "\n")
+    log.info("📄 Bắt đầu xử lý file", extra=kv(path=input_path, paragraphs=total_paragraphs, pipeline=pipeline))
+
+    # Sửa lỗi các đoạn có ý nghĩa (song song trên process pool nếu được bật).
+    # Comment được sinh từ diff nên không cần LLM viết giải thích.
+    meaningful = [p.text.strip() for p in doc.paragraphs if p.text.strip() and is_meaningful_text(p.text.strip())]
+    corrections = iter(correct_paragraphs(meaningful, pipeline, explain=False))
 
     para_index = 0
     for para in doc.paragraphs:
@@ -25,32 +30,21 @@ def process_docx(input_path, output_path):
         
         # Kiểm tra đoạn văn có ý nghĩa để xử lý hay không
         if not is_meaningful_text(original):
-            print(f"⏭️ Bỏ qua đoạn không có ý nghĩa: '{original[:50]}'")
+            log.debug("⏭️ Bỏ qua đoạn không có ý nghĩa: %s", preview(original))
             new_doc.add_paragraph(original)  # Giữ nguyên đoạn gốc
             continue
 
         para_index += 1
-        print("\n" + "🔷" * 25)
-        print(f"📝 ĐOẠN VĂN [{para_index}/{total_paragraphs}]")
-        print("🔷" * 25)
-        print(f"📄 GỐC: {original[:100]}{'...' if len(original) > 100 else ''}")
 
-        # 1️⃣ Qwen sửa ngữ cảnh
-        qwen_fixed = correct_text(original)
-
-        # 2️⃣ ProtonX correction cuối
-        final_text = refine_text(qwen_fixed)
+        # 1️⃣ Sửa lỗi theo pipeline (Qwen → ProtonX mặc định; đoạn không dấu → khôi phục dấu)
+        final_text, _ = next(corrections)
 
         # === LOG: Đoạn cần sửa ===
-        if original != final_text:
-            print("\n" + "⚠️" * 25)
-            print("🔄 ĐOẠN CẦN SỬA:")
-            print("-" * 50)
-            print(f"❌ GỐC    : {original}")
-            print(f"✅ ĐÃ SỬA : {final_text}")
-            print("⚠️" * 25)
-        else:
-            print("\n✅ Đoạn văn không cần sửa")
+        changed = original != final_text
+        log.info("📝 Đoạn văn", extra=kv(sample=True, index=f"{para_index}/{total_paragraphs}", chars=len(original), changed=changed))
+        if changed:
+            log.debug("❌ GỐC    : %s", preview(original))
+            log.debug("✅ ĐÃ SỬA : %s", preview(final_text))
 
         # 3️⃣ Ghi kết quả
         new_para = new_doc.add_paragraph(final_text)
@@ -58,11 +52,8 @@ def process_docx(input_path, output_path):
         # 4️⃣ Track change
         note = generate_change_note(original, final_text)
         if note:
-            print(f"📌 Ghi chú thay đổi: {note[:50]}{'...' if len(note) > 50 else ''}")
+            log.debug("📌 Ghi chú thay đổi: %s", preview(note))
             add_comment(new_para, note, AUTHOR_NAME)
 
-    print("\n" + "✅" * 25)
-    print(f"💾 Đã lưu kết quả vào: {output_path}")
-    print("✅" * 25 + "\n")
-
     new_doc.save(output_path)
+    log.info("💾 Đã lưu kết quả", extra=kv(path=output_path))
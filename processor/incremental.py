@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+Sửa lại (re-correct) tăng dần: kết quả từng đoạn được cache theo hash của
+nội dung đoạn + tham số pipeline, nên khi người dùng sửa 1 đoạn rồi chạy lại
+cả văn bản, chỉ các đoạn đã thay đổi mới phải chạy model.
+
+- paragraph_key(): key của 1 đoạn (sha1 nội dung + pipeline, decode, model...)
+- ResultCache: cache LRU thread-safe, giá trị tuỳ ý (API: (corrected,
+  explanation); GUI: thêm kết quả BartPho trung gian)
+- correct_paragraphs_incremental(): như parallel.correct_paragraphs nhưng
+  dùng lại kết quả đã có (đoạn trùng nhau trong 1 lần chạy cũng chỉ sửa 1 lần)
+
+Chỉ cache kết quả lặp lại được và hợp lệ: LLM sampling "sample" không dùng cache,
+lần chạy có backend lỗi (vd: Ollama mất kết nối → giữ nguyên văn bản gốc) không
+được lưu, để lần sửa sau chạy lại model.
+"""
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from config import INCREMENTAL_CACHE_SIZE
+from processor import metrics
+
+# Tham số (ngoài pipeline / decode) làm thay đổi kết quả của 1 đoạn
+_KEY_PARAMS = ["model", "qwen_variant", "ollama_model", "targeted", "output_mode", "explain"]
+
+
+def paragraph_key(text: str, pipeline: str, params: dict = None) -> str:
+    """Key cache của 1 đoạn: hash(nội dung, pipeline, tham số decode / model)"""
+    from processor.pipeline import describe_decoding
+
+    params = params or {}
+    config = {
+        "pipeline": pipeline,
+        "decoding": describe_decoding(pipeline, params.get("decoding"), params.get("sampling")),
+        **{name: params.get(name) for name in _KEY_PARAMS},
+    }
+    payload = json.dumps(config, sort_keys=True, ensure_ascii=False) + "\0" + text
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """Cache LRU (thread-safe) kết quả theo key đoạn văn"""
+
+    def __init__(self, max_size: int = INCREMENTAL_CACHE_SIZE):
+        self.max_size = max_size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def put(self, key: str, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def __len__(self):
+        return len(self._items)
+
+
+_default_cache = ResultCache()
+
+
+def is_cacheable(pipeline: str, params: dict = None) -> bool:
+    """Kết quả có lặp lại được không (LLM sampling "sample" → mỗi lần 1 kết quả khác)"""
+    from processor.pipeline import describe_decoding
+
+    params = params or {}
+    llm = describe_decoding(pipeline, params.get("decoding"), params.get("sampling")).get("llm")
+    return llm is None or llm["sampling"] != "sample"
+
+
+def split_cached(paragraphs: list, keys: list, cache: ResultCache) -> tuple:
+    """
+    Tách các đoạn đã có kết quả trong cache.
+    Returns: ({key: kết quả đã cache}, list key cần sửa (không trùng, theo thứ tự xuất hiện))
+    """
+    found, missing = {}, {}
+    for text, key in zip(paragraphs, keys):
+        if key in found or key in missing:
+            continue
+        value = cache.get(key)
+        if value is not None:
+            found[key] = value
+        else:
+            missing[key] = text
+    metrics.increment("incremental_paragraphs_total", len(paragraphs) - len(missing), result="reused")
+    metrics.increment("incremental_paragraphs_total", len(missing), result="corrected")
+    return found, list(missing.items())
+
+
+def correct_paragraphs_incremental(paragraphs: list, pipeline: str, cache: ResultCache = None, stats: dict = None, **kwargs) -> list:
+    """
+    Sửa nhiều đoạn văn, dùng lại kết quả của các đoạn không đổi từ lần chạy trước.
+    Các đoạn cần sửa được chạy chung 1 lần qua parallel.correct_paragraphs
+    (giữ nguyên pool / packing / pipelined).
+
+    kwargs được truyền cho correct_with_pipeline (model, qwen_variant, targeted, decoding...).
+    stats["paragraphs_reused"]: số đoạn không phải chạy lại model.
+    Kết quả không lặp lại được (is_cacheable) → sửa tất cả, không dùng cache;
+    backend lỗi trong lần chạy (stats["backend_errors"]) → không lưu kết quả vào cache.
+    Returns: List (corrected_text, explanation) theo đúng thứ tự đầu vào
+    """
+    from processor.parallel import correct_paragraphs
+
+    if stats is not None:
+        stats.setdefault("paragraphs_reused", 0)
+    if not is_cacheable(pipeline, kwargs):
+        metrics.increment("incremental_paragraphs_total", len(paragraphs), result="bypassed")
+        return correct_paragraphs(paragraphs, pipeline, stats=stats, **kwargs)
+
+    cache = cache if cache is not None else _default_cache
+    keys = [paragraph_key(p, pipeline, kwargs) for p in paragraphs]
+    results, missing = split_cached(paragraphs, keys, cache)
+
+    if missing:
+        run_stats = {}
+        corrected = correct_paragraphs([text for _, text in missing], pipeline, stats=run_stats, **kwargs)
+        # Không biết đoạn nào bị lỗi → không lưu cả lần chạy (lần sau sửa lại)
+        cacheable = not run_stats.get("backend_errors")
+        for (key, _), result in zip(missing, corrected):
+            result = tuple(result)
+            if cacheable:
+                cache.put(key, result)
+            results[key] = result
+        if stats is not None:
+            for name, value in run_stats.items():
+                stats[name] = stats.get(name, 0) + value
+
+    if stats is not None:
+        stats["paragraphs_reused"] = stats.get("paragraphs_reused", 0) + len(paragraphs) - len(missing)
+    return [results[key] for key in keys]
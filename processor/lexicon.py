@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+"""
+Từ điển âm tiết / từ tiếng Việt và chỉ mục kiểm tra chính tả.
+
+File từ điển (LEXICON_PATH) là file UTF-8, mỗi dòng 1 âm tiết hoặc 1 từ
+(nhiều âm tiết cách nhau bởi dấu cách), chữ thường, sắp xếp theo byte.
+File được memory-map và tra cứu bằng tìm kiếm nhị phân nên load gần như
+tức thì và không tốn RAM. Chỉ mục xoá ký tự kiểu SymSpell (để gợi ý từ
+gần đúng) chỉ được dựng khi cần gợi ý lần đầu.
+
+Tạo từ điển từ corpus:
+    python -m processor.lexicon data/vi_corpus.txt data/vi_lexicon.txt
+"""
+
+import mmap
+import os
+import re
+import sys
+import threading
+import unicodedata
+from collections import defaultdict
+
+from config import LEXICON_PATH, LEXICON_MAX_EDIT_DISTANCE
+from processor.log import get_logger, kv
+
+log = get_logger("lexicon")
+
+_SYLLABLE_RE = re.compile(r"[^\W\d_]+", re.UNICODE)
+
+
+def _normalize(word: str) -> str:
+    return unicodedata.normalize("NFC", word).lower()
+
+
+def _deletes(word: str, max_distance: int) -> set:
+    """Tất cả các chuỗi thu được khi xoá tối đa max_distance ký tự."""
+    result = set()
+    frontier = {word}
+    for _ in range(max_distance):
+        next_frontier = set()
+        for w in frontier:
+            for i in range(len(w)):
+                d = w[:i] + w[i + 1:]
+                if d not in result:
+                    result.add(d)
+                    next_frontier.add(d)
+        frontier = next_frontier
+    return result
+
+
+def edit_distance(a: str, b: str) -> int:
+    """Khoảng cách Damerau-Levenshtein (optimal string alignment)."""
+    if a == b:
+        return 0
+    prev_prev = None
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                cur[j] = min(cur[j], prev_prev[j - 2] + 1)
+        prev_prev, prev = prev, cur
+    return prev[-1]
+
+
+class Lexicon:
+    """Từ điển memory-mapped + chỉ mục SymSpell cho âm tiết."""
+
+    def __init__(self, path: str, max_edit_distance: int = LEXICON_MAX_EDIT_DISTANCE):
+        self.path = path
+        self.max_edit_distance = max_edit_distance
+        self._file = open(path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        self._delete_index = None
+        self._index_lock = threading.Lock()
+
+    def __contains__(self, word: str) -> bool:
+        key = _normalize(word).encode("utf-8")
+        mm = self._mm
+        lo, hi = 0, len(mm)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = mm.rfind(b"\n", 0, mid) + 1
+            end = mm.find(b"\n", start)
+            if end == -1:
+                end = len(mm)
+            line = mm[start:end]
+            if line == key:
+                return True
+            if line < key:
+                lo = end + 1
+            else:
+                hi = start
+        return False
+
+    def entries(self):
+        """Duyệt toàn bộ các mục trong từ điển."""
+        for line in bytes(self._mm).split(b"\n"):
+            if line:
+                yield line.decode("utf-8")
+
+    def _get_delete_index(self) -> dict:
+        with self._index_lock:
+            if self._delete_index is None:
+                index = defaultdict(list)
+                for entry in self.entries():
+                    if " " in entry:
+                        continue  # Chỉ gợi ý ở mức âm tiết
+                    index[entry].append(entry)
+                    for d in _deletes(entry, self.max_edit_distance):
+                        index[d].append(entry)
+                self._delete_index = index
+            return self._delete_index
+
+    def suggest(self, word: str, max_suggestions: int = 5) -> list:
+        """
+        Gợi ý các âm tiết gần đúng (SymSpell).
+        Ưu tiên khoảng cách nhỏ, sau đó đến các biến thể chỉ khác dấu.
+        """
+        from processor.diacritics import strip_diacritics
+
+        word = _normalize(word)
+        index = self._get_delete_index()
+
+        candidates = set()
+        for key in {word} | _deletes(word, self.max_edit_distance):
+            candidates.update(index.get(key, ()))
+
+        base = strip_diacritics(word)
+        scored = []
+        for cand in candidates:
+            distance = edit_distance(word, cand)
+            if distance <= self.max_edit_distance:
+                scored.append((distance, strip_diacritics(cand) != base, cand))
+        scored.sort()
+        return [cand for _, _, cand in scored[:max_suggestions]]
+
+    def check(self, text: str, with_suggestions: bool = False) -> list:
+        """
+        Tìm các âm tiết không có trong từ điển.
+
+        Returns:
+            List các span nghi ngờ: {"start", "end", "text", "suggestions"}
+        """
+        spans = []
+        for match in _SYLLABLE_RE.finditer(text):
+            token = match.group()
+            # Bỏ qua từ viết tắt (UBND, TP, HĐND...)
+            if len(token) > 1 and token.isupper():
+                continue
+            if token in self:
+                continue
+            spans.append({
+                "start": match.start(),
+                "end": match.end(),
+                "text": token,
+                "suggestions": self.suggest(token) if with_suggestions else []
+            })
+        return spans
+
+    def close(self):
+        if isinstance(self._mm, mmap.mmap):
+            self._mm.close()
+        self._file.close()
+
+
+def build_lexicon(lines, output_path: str, words=None) -> int:
+    """
+    Tạo file từ điển từ các dòng văn bản có dấu (và list từ ghép nếu có).
+    Trả về số mục đã ghi.
+    """
+    entries = set()
+    for line in lines:
+        for syllable in _SYLLABLE_RE.findall(line):
+            entries.add(_normalize(syllable))
+    for word in words or []:
+        word = " ".join(_normalize(word).split())
+        if word:
+            entries.add(word)
+
+    encoded = sorted(e.encode("utf-8") for e in entries)
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    with open(output_path, "wb") as f:
+        f.write(b"\n".join(encoded))
+    return len(encoded)
+
+
+# === Global Lexicon Cache ===
+_lexicon = None
+_lexicon_loaded = False
+_lexicon_lock = threading.Lock()
+
+
+def get_lexicon():
+    """Load từ điển (chỉ 1 lần). Trả về None nếu chưa có file từ điển."""
+    global _lexicon, _lexicon_loaded
+
+    with _lexicon_lock:
+        if not _lexicon_loaded:
+            _lexicon_loaded = True
+            if os.path.exists(LEXICON_PATH):
+                _lexicon = Lexicon(LEXICON_PATH)
+                log.info("✅ [Lexicon] Đã mở từ điển", extra=kv(path=LEXICON_PATH))
+            else:
+                log.warning("⚠️ [Lexicon] Không tìm thấy từ điển", extra=kv(path=LEXICON_PATH))
+        return _lexicon
+
+
+def check(text: str, with_suggestions: bool = False) -> list:
+    """
+    Kiểm tra chính tả văn bản, trả về list span nghi ngờ.
+
+    Nếu không có từ điển, toàn bộ văn bản được coi là nghi ngờ để các
+    bước sau vẫn gửi văn bản đến model như trước.
+    """
+    lexicon = get_lexicon()
+    if lexicon is None:
+        if not text.strip():
+            return []
+        return [{"start": 0, "end": len(text), "text": text, "suggestions": []}]
+    return lexicon.check(text, with_suggestions=with_suggestions)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python -m processor.lexicon <corpus.txt> <lexicon.txt>")
+        sys.exit(1)
+    with open(sys.argv[1], encoding="utf-8") as f:
+        count = build_lexicon(f, sys.argv[2])
+    print(f"✅ Đã ghi {count} mục vào {sys.argv[2]}")
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+Logging có cấu trúc, theo level, ghi bất đồng bộ cho model / pipeline / API.
+
+- get_logger(name): logger con của "corrector" (tự cấu hình lần đầu gọi)
+- kv(**fields): trường có cấu trúc cho record,
+  vd: log.info("Sửa xong", extra=kv(model="qwen", chars=120))
+- kv(sample=True, ...): record lặp lại theo từng đoạn, chỉ giữ LOG_SAMPLE_RATE
+  (WARNING trở lên luôn được giữ)
+- preview(text): cắt ngắn nội dung văn bản, chỉ dùng trong log DEBUG
+
+Record đi qua QueueHandler → QueueListener (thread riêng) mới được format và
+ghi ra stdout, nên thread xử lý request không bao giờ chờ terminal / pipe chậm.
+Hàng đợi đầy thì bỏ record (đếm vào metrics "log_dropped_total").
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import threading
+from datetime import datetime
+
+from config import LOG_LEVEL, LOG_FORMAT, LOG_MAX_CHARS, LOG_SAMPLE_RATE, LOG_QUEUE_SIZE
+
+ROOT_LOGGER = "corrector"
+
+_setup_lock = threading.Lock()
+_listener = None
+
+
+def preview(text: str, limit: int = LOG_MAX_CHARS) -> str:
+    """Cắt ngắn text để log (kèm số ký tự bị bỏ)"""
+    text = str(text)
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}… (+{len(text) - limit} ký tự)"
+
+
+def kv(sample: bool = False, **fields) -> dict:
+    """extra cho logger: trường có cấu trúc, sample=True → record được lấy mẫu"""
+    return {"fields": fields, "sampled": sample}
+
+
+class _SamplingFilter(logging.Filter):
+    """Giữ lại LOG_SAMPLE_RATE các record được đánh dấu sample (dưới WARNING)"""
+
+    def __init__(self, rate: float = LOG_SAMPLE_RATE):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if getattr(record, "sampled", False) and record.levelno < logging.WARNING:
+            return random.random() < self.rate
+        return True
+
+
+class _StructuredFormatter(logging.Formatter):
+    """Format "text" (message + key=value) hoặc "json" (1 object / dòng)"""
+
+    def __init__(self, fmt: str = LOG_FORMAT):
+        super().__init__()
+        self.json = fmt == "json"
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = {
+            k: preview(v) if isinstance(v, str) else v
+            for k, v in (getattr(record, "fields", None) or {}).items()
+        }
+        message = record.getMessage()
+        timestamp = datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds")
+
+        if self.json:
+            entry = {"ts": timestamp, "level": record.levelname, "logger": record.name, "msg": message, **fields}
+            if record.exc_text:
+                entry["exc"] = record.exc_text
+            return json.dumps(entry, ensure_ascii=False, default=str)
+
+        line = f"{timestamp} {record.levelname:<7} {message}"
+        if fields:
+            line += " | " + " ".join(f"{k}={v}" for k, v in fields.items())
+        if record.exc_text:
+            line += "\n" + record.exc_text
+        return line
+
+
+class _StdoutHandler(logging.Handler):
+    """Ghi ra sys.stdout tại thời điểm ghi (vẫn đúng khi GUI redirect stdout)"""
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            sys.stdout.write(self.format(record) + "\n")
+            sys.stdout.flush()
+        except Exception:
+            self.handleError(record)
+
+
+class _NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Đưa record vào hàng đợi; đầy thì bỏ thay vì chặn thread gọi"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Format exception ngay tại thread gọi (traceback không qua được queue),
+        # phần message / field để listener format
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        record.msg, record.args = record.getMessage(), None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            from processor import metrics
+            metrics.increment("log_dropped_total")
+
+
+def setup_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT):
+    """Cấu hình logger "corrector" (chỉ chạy 1 lần mỗi process)"""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            return
+        root = logging.getLogger(ROOT_LOGGER)
+        root.setLevel(getattr(logging, str(level).upper(), logging.INFO))
+        root.propagate = False
+
+        output = _StdoutHandler()
+        output.setFormatter(_StructuredFormatter(fmt))
+        records = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        handler = _NonBlockingQueueHandler(records)
+        handler.addFilter(_SamplingFilter())
+        root.addHandler(handler)
+
+        _listener = logging.handlers.QueueListener(records, output, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)  # Ghi nốt các record còn trong hàng đợi
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger "corrector.<name>", vd: get_logger("qwen")"""
+    setup_logging()
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
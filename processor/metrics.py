@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""
+Bộ đếm metrics dùng chung (thread-safe) cho toàn bộ pipeline.
+
+- increment(): cộng dồn counter theo tên + labels
+- record_event(): cộng counter và lưu lại sự kiện gần nhất (để tra cứu khi
+  có khiếu nại, vd: chunk bị cắt cụt phải tách lại)
+- observe() / timer() / timed(): histogram thời gian từng stage
+- set_gauge() / register_collector(): giá trị tức thời (độ dài hàng đợi,
+  cache hit...), collector chỉ chạy khi có request /metrics
+- render_prometheus(): xuất toàn bộ theo format text của Prometheus
+
+Mỗi lần ghi chỉ là vài phép cộng trong dict dưới lock, nên chi phí không
+đáng kể khi không có scraper.
+"""
+
+import bisect
+import functools
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+MAX_EVENTS = 500  # Số sự kiện gần nhất được giữ lại
+# Bucket (giây) cho histogram thời gian
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+_lock = threading.Lock()
+_counters = {}  # {(name, ((label, value), ...)): value}
+_histograms = {}  # {key: [count theo bucket, sum, count]}
+_gauges = {}  # {key: value}
+_collectors = []  # Hàm cập nhật gauge, chạy khi render
+_events = deque(maxlen=MAX_EVENTS)
+
+
+def _key(name: str, labels: dict) -> tuple:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def increment(name: str, value: float = 1, **labels):
+    """Cộng value vào counter name (với labels tuỳ chọn)."""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def record_event(name: str, **fields):
+    """
+    Ghi nhận 1 sự kiện: cộng counter "<name>_total" và lưu chi tiết sự kiện.
+    Các field kiểu str ngắn (model, reason...) được dùng làm label của counter.
+    """
+    labels = {k: v for k, v in fields.items() if isinstance(v, str) and len(v) <= 32}
+    increment(f"{name}_total", **labels)
+    with _lock:
+        _events.append({"event": name, "time": time.time(), **fields})
+
+
+def observe(name: str, value: float, **labels):
+    """Ghi 1 giá trị (thường là số giây) vào histogram name."""
+    key = _key(name, labels)
+    index = bisect.bisect_left(DEFAULT_BUCKETS, value)
+    with _lock:
+        entry = _histograms.get(key)
+        if entry is None:
+            entry = _histograms[key] = [[0] * (len(DEFAULT_BUCKETS) + 1), 0.0, 0]
+        entry[0][index] += 1
+        entry[1] += value
+        entry[2] += 1
+
+
+@contextmanager
+def timer(name: str, **labels):
+    """Đo thời gian chạy của khối with, ghi vào histogram name."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+
+def timed(name: str, label_kwargs: dict = None):
+    """
+    Decorator đo thời gian của hàm vào histogram name.
+    label_kwargs: {tên tham số: giá trị mặc định} → dùng làm label (chỉ lấy từ keyword argument).
+    """
+    label_kwargs = label_kwargs or {}
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            labels = {k: kwargs.get(k) or default for k, default in label_kwargs.items()}
+            with timer(name, **labels):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def set_gauge(name: str, value: float, **labels):
+    """Đặt giá trị tức thời của gauge name."""
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def register_collector(func):
+    """Đăng ký hàm (không tham số) cập nhật gauge, chạy mỗi lần render_prometheus()."""
+    with _lock:
+        if func not in _collectors:
+            _collectors.append(func)
+    return func
+
+
+def get_counter(name: str, **labels) -> float:
+    """Giá trị hiện tại của 1 counter."""
+    with _lock:
+        return _counters.get(_key(name, labels), 0)
+
+
+def get_counters() -> dict:
+    """Snapshot toàn bộ counter: {name: [{"labels": {...}, "value": v}, ...]}"""
+    result = {}
+    with _lock:
+        items = list(_counters.items())
+    for (name, labels), value in sorted(items):
+        result.setdefault(name, []).append({"labels": dict(labels), "value": value})
+    return result
+
+
+def get_events(name: str = None) -> list:
+    """Các sự kiện gần nhất (lọc theo tên nếu có)."""
+    with _lock:
+        events = list(_events)
+    if name:
+        events = [e for e in events if e["event"] == name]
+    return events
+
+
+def get_histogram(name: str, **labels) -> dict:
+    """Snapshot 1 histogram: {"count": n, "sum": tổng, "buckets": [số mẫu theo bucket]}"""
+    with _lock:
+        entry = _histograms.get(_key(name, labels))
+        if entry is None:
+            return {"count": 0, "sum": 0.0, "buckets": [0] * (len(DEFAULT_BUCKETS) + 1)}
+        return {"count": entry[2], "sum": entry[1], "buckets": list(entry[0])}
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: tuple, extra: tuple = ()) -> str:
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+
+def render_prometheus() -> str:
+    """Toàn bộ counter / gauge / histogram theo format text của Prometheus."""
+    for collector in list(_collectors):
+        try:
+            collector()
+        except Exception:
+            from processor.log import get_logger
+            get_logger("metrics").warning("⚠️ [Metrics] Collector lỗi", exc_info=True)
+
+    with _lock:
+        counters = sorted(_counters.items())
+        gauges = sorted(_gauges.items())
+        histograms = sorted((key, (list(e[0]), e[1], e[2])) for key, e in _histograms.items())
+
+    lines = []
+    typed = set()
+
+    def declare(name: str, kind: str):
+        if name not in typed:
+            typed.add(name)
+            lines.append(f"# TYPE {name} {kind}")
+
+    for (name, labels), value in counters:
+        declare(name, "counter")
+        lines.append(f"{name}{_format_labels(labels)} {value}")
+    for (name, labels), value in gauges:
+        declare(name, "gauge")
+        lines.append(f"{name}{_format_labels(labels)} {value}")
+    for (name, labels), (buckets, total, count) in histograms:
+        declare(name, "histogram")
+        cumulative = 0
+        for bound, bucket in zip(list(DEFAULT_BUCKETS) + ["+Inf"], buckets):
+            cumulative += bucket
+            lines.append(f"{name}_bucket{_format_labels(labels, (('le', str(bound)),))} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+        lines.append(f"{name}_count{_format_labels(labels)} {count}")
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    """Xoá toàn bộ metrics (dùng cho benchmark/test)."""
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+        _gauges.clear()
+        _events.clear()
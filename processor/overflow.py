@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+Phát hiện chunk bị cắt cụt khi đưa qua model seq2seq và tự động tách lại.
+
+Một chunk bị coi là tràn (overflow) khi:
+- input dài hơn max_input_tokens (tokenizer sẽ cắt mất phần đuôi)
+- output chạm max_new_tokens (generate dừng giữa chừng)
+- output ngắn bất thường so với input (tỉ lệ độ dài < OVERFLOW_MIN_LENGTH_RATIO)
+
+Chunk tràn được tách đôi (theo câu → mệnh đề → từ) và generate lại.
+Mọi lần tách lại đều được ghi vào metrics ("seq2seq_overflow").
+"""
+
+from config import OVERFLOW_MIN_LENGTH_RATIO, OVERFLOW_MAX_RETRY_DEPTH
+from processor import metrics
+from processor.log import get_logger, kv
+from processor.segmenter import split_in_half, splice
+
+log = get_logger("overflow")
+
+# Không áp dụng kiểm tra tỉ lệ độ dài cho chunk quá ngắn
+_MIN_TOKENS_FOR_RATIO_CHECK = 16
+
+
+def detect_overflow(source: str, output: str, count_tokens, max_input_tokens: int, max_new_tokens: int):
+    """
+    Kiểm tra 1 cặp (input, output) có dấu hiệu bị cắt cụt không.
+
+    Returns:
+        Lý do ("input_truncated", "output_limit", "short_output") hoặc None
+    """
+    source_tokens = count_tokens(source)
+    if source_tokens > max_input_tokens:
+        return "input_truncated"
+    if count_tokens(output) >= max_new_tokens - 1:
+        return "output_limit"
+    if source_tokens >= _MIN_TOKENS_FOR_RATIO_CHECK and len(output.strip()) < len(source.strip()) * OVERFLOW_MIN_LENGTH_RATIO:
+        return "short_output"
+    return None
+
+
+def generate_with_overflow_retry(texts: list, generate_batch, count_tokens, max_input_tokens: int,
+                                 max_new_tokens: int, model_name: str, depth: int = 0) -> list:
+    """
+    Generate cho 1 batch, tự động tách đôi và generate lại các chunk bị tràn.
+
+    Args:
+        texts: Các chunk cần generate
+        generate_batch: Hàm generate gốc: list[str] -> list[str]
+        count_tokens: Hàm đếm token theo tokenizer của model
+        max_input_tokens: Giới hạn token input của model
+        max_new_tokens: Giới hạn token output
+        model_name: Tên model (label cho metrics)
+        depth: Độ sâu đệ quy hiện tại
+
+    Returns:
+        List output theo đúng thứ tự đầu vào
+    """
+    outputs = [None] * len(texts)
+    to_generate = []
+
+    # Input quá dài → tách trước khi generate (không lãng phí 1 lượt generate)
+    for idx, text in enumerate(texts):
+        if count_tokens(text) > max_input_tokens and depth < OVERFLOW_MAX_RETRY_DEPTH and len(split_in_half(text)) > 1:
+            outputs[idx] = _retry_split(text, "input_truncated", generate_batch, count_tokens,
+                                        max_input_tokens, max_new_tokens, model_name, depth)
+        else:
+            to_generate.append(idx)
+
+    if to_generate:
+        generated = generate_batch([texts[i] for i in to_generate])
+        for idx, output in zip(to_generate, generated):
+            reason = detect_overflow(texts[idx], output, count_tokens, max_input_tokens, max_new_tokens)
+            if reason and depth < OVERFLOW_MAX_RETRY_DEPTH and len(split_in_half(texts[idx])) > 1:
+                output = _retry_split(texts[idx], reason, generate_batch, count_tokens,
+                                      max_input_tokens, max_new_tokens, model_name, depth)
+            elif reason:
+                metrics.record_event("seq2seq_overflow_unrecovered", model=model_name, reason=reason,
+                                     input_chars=len(texts[idx]), output_chars=len(output))
+                log.warning(f"⚠️ [{model_name}] Chunk vẫn bị tràn sau khi tách", extra=kv(reason=reason, depth=depth))
+            outputs[idx] = output
+
+    return outputs
+
+
+def _retry_split(text: str, reason: str, generate_batch, count_tokens, max_input_tokens: int,
+                 max_new_tokens: int, model_name: str, depth: int) -> str:
+    spans = split_in_half(text)
+    metrics.record_event("seq2seq_overflow", model=model_name, reason=reason, depth=depth,
+                         input_chars=len(text), input_tokens=count_tokens(text))
+    log.info(f"✂️ [{model_name}] Chunk bị tràn, tách và chạy lại", extra=kv(reason=reason, parts=len(spans), depth=depth))
+
+    parts = generate_with_overflow_retry(
+        [text[s:e] for s, e in spans], generate_batch, count_tokens,
+        max_input_tokens, max_new_tokens, model_name, depth + 1
+    )
+    return splice(text, spans, {i: part.strip() or text[s:e] for i, (part, (s, e)) in enumerate(zip(parts, spans))})
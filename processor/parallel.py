@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+Xử lý song song nhiều đoạn văn bằng process pool (cho máy chỉ có CPU).
+
+PyTorch chia thread nội bộ (intra-op) kém hiệu quả với generate seq2seq
+batch 1, nên thay vì 1 process dùng tất cả core, ta chạy N worker process,
+mỗi worker dùng CPU_THREADS_PER_WORKER thread và load model 1 lần khi khởi
+tạo. Các đoạn văn được chia đều cho các worker.
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from config import CPU_POOL_WORKERS, CPU_THREADS_PER_WORKER, CPU_POOL_PIPELINES
+from processor.log import get_logger, kv
+
+log = get_logger("parallel")
+
+_pools = {}  # {pipeline: ProcessPoolExecutor}
+_pools_lock = threading.Lock()
+
+
+def _init_worker(pipeline: str, threads: int):
+    """Khởi tạo worker: giới hạn số thread rồi load model của pipeline"""
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    os.environ["MKL_NUM_THREADS"] = str(threads)
+
+    import torch
+    torch.set_num_threads(threads)
+
+    from processor.pipeline import preload
+    preload([pipeline])
+    log.info("👷 [Worker] Sẵn sàng", extra=kv(pid=os.getpid(), pipeline=pipeline, threads=threads))
+
+
+def _correct_one(args: tuple) -> tuple:
+    text, pipeline, targeted, decoding = args
+    from processor.pipeline import correct_with_pipeline
+
+    stats = {}
+    final_text, explanation = correct_with_pipeline(text, pipeline=pipeline, targeted=targeted, stats=stats, decoding=decoding)
+    return final_text, explanation, stats
+
+
+def is_pool_enabled(pipeline: str) -> bool:
+    """Pipeline có chạy bằng process pool không (theo config)"""
+    return CPU_POOL_WORKERS > 0 and pipeline in CPU_POOL_PIPELINES
+
+
+def get_pool(pipeline: str) -> ProcessPoolExecutor:
+    """Process pool của pipeline (tạo 1 lần, worker giữ model trong suốt vòng đời)"""
+    with _pools_lock:
+        if pipeline not in _pools:
+            log.info("🚀 Khởi tạo process pool", extra=kv(workers=CPU_POOL_WORKERS, threads=CPU_THREADS_PER_WORKER, pipeline=pipeline))
+            _pools[pipeline] = ProcessPoolExecutor(
+                max_workers=CPU_POOL_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(pipeline, CPU_THREADS_PER_WORKER)
+            )
+        return _pools[pipeline]
+
+
+def correct_paragraphs_parallel(paragraphs: list, pipeline: str, targeted: bool = None, stats: dict = None, decoding: str = None) -> list:
+    """
+    Sửa nhiều đoạn văn song song trên process pool.
+
+    Args:
+        paragraphs: List đoạn văn
+        pipeline: Pipeline (nên thuộc CPU_POOL_PIPELINES)
+        targeted: Chế độ span-targeted (xem correct_with_pipeline)
+        stats: Dict (optional) để cộng dồn thống kê từ các worker
+        decoding: Chính sách decode (xem correct_with_pipeline)
+
+    Returns:
+        List (corrected_text, explanation) theo đúng thứ tự đầu vào
+    """
+    pool = get_pool(pipeline)
+    start = time.time()
+
+    results = []
+    for final_text, explanation, worker_stats in pool.map(
+        _correct_one, [(p, pipeline, targeted, decoding) for p in paragraphs]
+    ):
+        results.append((final_text, explanation))
+        if stats is not None:
+            for key, value in worker_stats.items():
+                stats[key] = stats.get(key, 0) + value
+
+    elapsed = time.time() - start
+    words = sum(len(p.split()) for p in paragraphs)
+    log.info("⚡ [Pool] Xong", extra=kv(
+        paragraphs=len(paragraphs), words=words, seconds=round(elapsed, 2),
+        words_per_sec=round(words / elapsed) if elapsed else 0, workers=CPU_POOL_WORKERS
+    ))
+    return results
+
+
+def correct_paragraphs(paragraphs: list, pipeline: str, stats: dict = None, **kwargs) -> list:
+    """
+    Sửa nhiều đoạn văn: dùng process pool nếu được bật cho pipeline,
+    ngược lại xử lý trong process hiện tại (pipeline LLM: gộp các đoạn ngắn
+    liên tiếp vào 1 prompt, xem correct_paragraphs_packed; bartpho_protonx:
+    2 stage chạy gối nhau theo lô, xem correct_paragraphs_pipelined).
+
+    kwargs được truyền cho correct_with_pipeline (model, qwen_variant, targeted, decoding...).
+    Returns: List (corrected_text, explanation)
+    """
+    if is_pool_enabled(pipeline) and len(paragraphs) > 1:
+        return correct_paragraphs_parallel(paragraphs, pipeline, targeted=kwargs.get("targeted"), stats=stats,
+                                           decoding=kwargs.get("decoding"))
+
+    from processor.pipeline import (
+        correct_with_pipeline, correct_paragraphs_packed, is_packing_enabled,
+        correct_paragraphs_pipelined, is_pipelining_enabled
+    )
+    if is_packing_enabled(pipeline, kwargs.get("explain"), kwargs.get("output_mode")) and len(paragraphs) > 1:
+        return correct_paragraphs_packed(paragraphs, pipeline, stats=stats, **kwargs)
+    if is_pipelining_enabled(pipeline) and len(paragraphs) > 1:
+        return correct_paragraphs_pipelined(paragraphs, stats=stats, decoding=kwargs.get("decoding"),
+                                            targeted=kwargs.get("targeted"))
+    return [correct_with_pipeline(p, pipeline=pipeline, stats=stats, **kwargs) for p in paragraphs]
@@ -0,0 +1,502 @@
+# -*- coding: utf-8 -*-
+"""
+Pipeline sửa lỗi dùng chung cho API, xử lý DOCX và các worker process.
+
+Pipeline strategies:
+- qwen_protonx: Qwen (local) + ProtonX
+- qwen_only: Qwen only (local)
+- protonx_only: ProtonX only
+- bartpho_protonx: BartPho + ProtonX
+- ollama_protonx: Ollama (online) + ProtonX
+- ollama_only: Ollama only (online)
+
+Model chỉ được load khi pipeline cần đến, nên 1 worker process chạy
+bartpho_protonx sẽ không phải load Qwen.
+"""
+
+import queue
+import threading
+from functools import partial
+
+from config import (
+    DEFAULT_PIPELINE, DIACRITIC_RESTORE_ENABLED, SPAN_TARGETED_MODE, LLM_EXPLAIN_DEFAULT, PACK_SHORT_PARAGRAPHS,
+    PIPELINED_SEQ2SEQ, PIPELINE_BATCH_PARAGRAPHS, PIPELINE_QUEUE_DEPTH
+)
+from llm.decoding import resolve_policy
+from llm.edit_format import resolve_output_mode
+from llm.packing import is_packable, group_paragraphs
+from llm import sampling as llm_sampling
+from processor import metrics
+from processor.log import get_logger, kv
+from processor.diacritics import is_unaccented, restore_diacritics
+from processor.diff_utils import generate_explanation
+from processor.span_targeting import correct_suspect_spans
+
+DEFAULT_MODEL = "qwen"
+STAGE_SECONDS = "pipeline_stage_seconds"  # Histogram thời gian từng stage (label: stage)
+
+log = get_logger("pipeline")
+
+# Model cần cho từng pipeline
+PIPELINE_BACKENDS = {
+    "qwen_protonx": ["qwen", "protonx"],
+    "qwen_only": ["qwen"],
+    "protonx_only": ["protonx"],
+    "bartpho_protonx": ["bartpho", "protonx"],
+    "ollama_protonx": ["ollama", "protonx"],
+    "ollama_only": ["ollama"],
+}
+
+# === Lazy backends ===
+_backend_lock = threading.Lock()
+_ollama_checked = False
+_ollama_module = None
+_vistral_checked = False
+_vistral_module = None
+
+
+def get_qwen():
+    from llm import qwen_model
+    return qwen_model
+
+
+def get_bartpho():
+    from llm import bartpho_model
+    return bartpho_model
+
+
+def get_protonx():
+    from protonx_layer import protonx_refine
+    return protonx_refine
+
+
+def get_ollama():
+    """Module Ollama nếu API khả dụng, ngược lại None (chỉ kiểm tra 1 lần)"""
+    global _ollama_checked, _ollama_module
+
+    with _backend_lock:
+        if not _ollama_checked:
+            _ollama_checked = True
+            try:
+                from llm import ollama_model
+                if ollama_model.check_ollama_health():
+                    log.info("✅ Ollama API is reachable")
+                    _ollama_module = ollama_model
+                else:
+                    log.warning("⚠️ Ollama API không khả dụng")
+            except Exception as e:
+                log.warning("⚠️ Ollama module error", extra=kv(error=str(e)))
+        return _ollama_module
+
+
+def get_vistral():
+    """Module Vistral nếu load được (gated model, cần HF_TOKEN), ngược lại None"""
+    global _vistral_checked, _vistral_module
+
+    with _backend_lock:
+        if not _vistral_checked:
+            _vistral_checked = True
+            try:
+                from llm import vistral_model
+                _vistral_module = vistral_model
+                log.info("✅ Vistral model loaded successfully")
+            except Exception as e:
+                log.warning("⚠️ Vistral model không khả dụng", extra=kv(error=str(e)))
+        return _vistral_module
+
+
+_BACKEND_LOADERS = {
+    "qwen": get_qwen,
+    "bartpho": get_bartpho,
+    "protonx": get_protonx,
+    "ollama": get_ollama,
+    "vistral": get_vistral,
+}
+
+
+def preload(pipelines=None, extra_backends=None):
+    """Load trước các model cần cho danh sách pipeline (mặc định: tất cả)"""
+    if pipelines is None:
+        pipelines = list(PIPELINE_BACKENDS.keys())
+
+    backends = []
+    for pipeline in pipelines:
+        backends.extend(PIPELINE_BACKENDS.get(pipeline, []))
+    backends.extend(extra_backends or [])
+
+    for backend in dict.fromkeys(backends):
+        _BACKEND_LOADERS[backend]()
+
+
+# === Stages ===
+
+def bartpho_stage(text: str, targeted: bool = False, stats: dict = None, decoding: str = None) -> str:
+    """BartPho sửa chính tả: toàn đoạn (chia chunk theo token) hoặc chỉ các câu nghi ngờ"""
+    bartpho = get_bartpho()
+    with metrics.timer(STAGE_SECONDS, stage="bartpho"):
+        if targeted:
+            batch_func = partial(bartpho.correct_batch, decoding=decoding)
+            return correct_suspect_spans(text, batch_func, count_tokens=bartpho.count_tokens, stats=stats)
+        return bartpho.correct_text_chunked(text, decoding=decoding)
+
+
+def refine_stage(text: str, targeted: bool = False, stats: dict = None, decoding: str = None) -> str:
+    """ProtonX refine: toàn đoạn (chia chunk theo token) hoặc chỉ các câu nghi ngờ"""
+    protonx = get_protonx()
+    with metrics.timer(STAGE_SECONDS, stage="protonx"):
+        if targeted:
+            batch_func = partial(protonx.refine_batch, decoding=decoding)
+            return correct_suspect_spans(text, batch_func, count_tokens=protonx.count_tokens, stats=stats)
+        return protonx.refine_text_chunked(text, decoding=decoding)
+
+
+def qwen_stage(text: str, qwen_variant: str = None, output_mode: str = None, explain: bool = True, sampling: str = None) -> tuple:
+    """Qwen (local) sửa lỗi. Returns: (corrected_text, explanation)"""
+    qwen = get_qwen()
+    with metrics.timer(STAGE_SECONDS, stage="qwen"):
+        return qwen.correct_text(text, model_key=qwen_variant, output_mode=output_mode, explain=explain, sampling=sampling)
+
+
+def _ollama_or_qwen(text: str, ollama_model: str = None, qwen_variant: str = None, output_mode: str = None, explain: bool = True, sampling: str = None, stats: dict = None) -> tuple:
+    """
+    Gọi Ollama (online), fallback sang Qwen local nếu Ollama không khả dụng.
+    API lỗi giữa chừng → giữ nguyên văn bản, lỗi ghi trong giải thích và đếm vào
+    stats["backend_errors"] (kết quả không hợp lệ, vd: không được cache).
+    """
+    ollama = get_ollama()
+    if ollama is not None:
+        with metrics.timer(STAGE_SECONDS, stage="ollama"):
+            try:
+                return ollama.correct_text(text, model_key=ollama_model, output_mode=output_mode, explain=explain, sampling=sampling)
+            except ollama.OllamaAPIError as e:
+                metrics.increment("backend_errors_total", backend="ollama")
+                if stats is not None:
+                    stats["backend_errors"] = stats.get("backend_errors", 0) + 1
+                return text, str(e)
+
+    log.warning("⚠️ Ollama không khả dụng, dùng Qwen thay thế")
+    corrected, _ = qwen_stage(text, qwen_variant, output_mode, explain, sampling)
+    return corrected, "⚠️ Ollama API không khả dụng. Đã dùng Qwen local."
+
+
+def correct_with_model(text: str, model: str = DEFAULT_MODEL, qwen_variant: str = None) -> tuple:
+    """
+    Sửa lỗi văn bản với model được chọn.
+    Returns: (corrected_text, explanation)
+
+    Args:
+        text: Văn bản cần sửa
+        model: Model chính (bartpho, qwen, vistral, hoặc qwen-<variant>)
+        qwen_variant: Variant của Qwen model (qwen2.5-7b, qwen3-8b)
+    """
+    # Handle qwen-<variant> format
+    if model.startswith("qwen-"):
+        qwen_variant = model.replace("qwen-", "")
+        model = "qwen"
+
+    if model == "qwen":
+        # Qwen trả về tuple (text, explanation)
+        corrected, explanation = get_qwen().correct_text(text, model_key=qwen_variant)
+        return corrected, explanation
+    elif model == "vistral":
+        # Vistral model
+        vistral = get_vistral()
+        if vistral is not None:
+            corrected, explanation = vistral.correct_text(text)
+            return corrected, explanation
+        else:
+            # Fallback to Qwen nếu Vistral không available
+            log.warning("⚠️ Vistral không khả dụng, dùng Qwen thay thế")
+            corrected, explanation = get_qwen().correct_text(text)
+            explanation = "⚠️ Vistral không khả dụng (cần HF_TOKEN). Đã dùng Qwen."
+            return corrected, explanation
+    else:
+        # BartPho (default)
+        corrected = bartpho_stage(text)
+        explanation = generate_explanation(text, corrected)
+        return corrected, explanation
+
+
+@metrics.timed("pipeline_seconds", {"pipeline": DEFAULT_PIPELINE})
+def correct_with_pipeline(text: str, model: str = DEFAULT_MODEL, pipeline: str = DEFAULT_PIPELINE, qwen_variant: str = None, ollama_model: str = None, targeted: bool = None, stats: dict = None, decoding: str = None, output_mode: str = None, explain: bool = None, sampling: str = None) -> tuple:
+    """
+    Sửa lỗi văn bản với pipeline được chọn.
+    Returns: (corrected_text, explanation)
+
+    Pipeline strategies:
+    - qwen_protonx: Qwen → ProtonX refine
+    - qwen_only: Chỉ Qwen
+    - protonx_only: Chỉ ProtonX
+    - bartpho_protonx: BartPho → ProtonX refine
+    - ollama_protonx: Ollama → ProtonX refine (online)
+    - ollama_only: Chỉ Ollama (online)
+
+    Đoạn văn không dấu được khôi phục dấu bằng engine n-gram (không qua LLM).
+
+    Args:
+        targeted: Chỉ gửi các câu nghi ngờ đến BartPho/ProtonX (mặc định: SPAN_TARGETED_MODE)
+        stats: Dict (optional) để nhận thống kê, vd: tokens_avoided, backend_errors
+            (số lần backend lỗi, kết quả giữ nguyên văn bản gốc)
+        decoding: Chính sách decode BartPho/ProtonX: beam, greedy, adaptive
+            (mặc định: theo PIPELINE_DECODING_POLICY / DEFAULT_DECODING_POLICY)
+        output_mode: Chế độ output của LLM: rewrite, edits
+            (mặc định: theo PIPELINE_OUTPUT_MODE / DEFAULT_OUTPUT_MODE)
+        explain: LLM có viết phần giải thích không (mặc định: LLM_EXPLAIN_DEFAULT).
+            False → generate ngắn hơn, giải thích được sinh từ diff
+        sampling: Chế độ sampling của LLM: greedy, seeded, sample (mặc định: DEFAULT_LLM_SAMPLING)
+    """
+    if targeted is None:
+        targeted = SPAN_TARGETED_MODE
+    if explain is None:
+        explain = LLM_EXPLAIN_DEFAULT
+    sampling = llm_sampling.resolve_sampling(sampling)
+    decoding = resolve_policy(decoding, pipeline)
+    output_mode = resolve_output_mode(output_mode, pipeline)
+
+    # Đoạn văn chỉ thiếu dấu → khôi phục dấu bằng engine nhẹ, bỏ qua LLM
+    if DIACRITIC_RESTORE_ENABLED and pipeline != "protonx_only" and is_unaccented(text):
+        with metrics.timer(STAGE_SECONDS, stage="diacritics"):
+            restored = restore_diacritics(text)
+        if restored is not None:
+            log.info("⚡ Đoạn văn không dấu → khôi phục dấu bằng n-gram (bỏ qua LLM)", extra=kv(sample=True, chars=len(text)))
+            if pipeline in ["qwen_only", "ollama_only"]:
+                return restored, generate_explanation(text, restored)
+            final_text = refine_stage(restored, targeted, stats, decoding)
+            return final_text, generate_explanation(text, final_text)
+
+    if pipeline == "qwen_only":
+        # Chỉ dùng Qwen, không ProtonX
+        corrected, explanation = qwen_stage(text, qwen_variant, output_mode, explain, sampling)
+        return corrected, explanation or generate_explanation(text, corrected)
+
+    elif pipeline == "protonx_only":
+        # Chỉ dùng ProtonX
+        corrected = refine_stage(text, targeted, stats, decoding)
+        explanation = "Đã refine với ProtonX (không qua LLM)"
+        return corrected, explanation
+
+    elif pipeline == "bartpho_protonx":
+        # BartPho + ProtonX
+        model_fixed = bartpho_stage(text, targeted, stats, decoding)
+        # ProtonX refine
+        final_text = refine_stage(model_fixed, targeted, stats, decoding)
+        explanation = generate_explanation(text, final_text)
+        return final_text, explanation
+
+    elif pipeline == "ollama_only":
+        # Chỉ dùng Ollama (online), không ProtonX
+        corrected, explanation = _ollama_or_qwen(text, ollama_model, qwen_variant, output_mode, explain, sampling, stats)
+        return corrected, explanation or generate_explanation(text, corrected)
+
+    elif pipeline == "ollama_protonx":
+        # Ollama (online) + ProtonX
+        model_fixed, explanation = _ollama_or_qwen(text, ollama_model, qwen_variant, output_mode, explain, sampling, stats)
+        # ProtonX refine
+        final_text = refine_stage(model_fixed, targeted, stats, decoding)
+        return final_text, explanation or generate_explanation(text, final_text)
+
+    else:  # qwen_protonx (default)
+        # Qwen + ProtonX
+        model_fixed, explanation = qwen_stage(text, qwen_variant, output_mode, explain, sampling)
+        # ProtonX refine
+        final_text = refine_stage(model_fixed, targeted, stats, decoding)
+        return final_text, explanation or generate_explanation(text, final_text)
+
+
+# === Packing (nhiều đoạn ngắn / 1 prompt LLM) ===
+
+PACKABLE_PIPELINES = ["qwen_protonx", "qwen_only", "ollama_protonx", "ollama_only"]
+
+
+def is_packing_enabled(pipeline: str, explain: bool = None, output_mode: str = None) -> bool:
+    """
+    Có gộp các đoạn ngắn vào 1 prompt LLM không (theo config và request).
+    Prompt gộp chỉ viết lại (rewrite), giải thích được sinh từ diff → không gộp
+    khi request yêu cầu LLM giải thích (explain=True) hoặc chế độ output "edits".
+    """
+    if explain is True or resolve_output_mode(output_mode, pipeline) == "edits":
+        return False
+    return PACK_SHORT_PARAGRAPHS and pipeline in PACKABLE_PIPELINES
+
+
+def _llm_packed(texts: list, pipeline: str, qwen_variant: str = None, ollama_model: str = None, sampling: str = None):
+    """Sửa nhiều đoạn ngắn bằng LLM của pipeline. Returns: list hoặc None nếu cần sửa từng đoạn"""
+    if pipeline.startswith("ollama_"):
+        ollama = get_ollama()
+        if ollama is not None:
+            return ollama.correct_packed(texts, model_key=ollama_model, sampling=sampling)
+        log.warning("⚠️ Ollama không khả dụng, dùng Qwen thay thế")
+    return get_qwen().correct_packed(texts, model_key=qwen_variant, sampling=sampling)
+
+
+def correct_paragraphs_packed(paragraphs: list, pipeline: str = DEFAULT_PIPELINE, stats: dict = None, **kwargs) -> list:
+    """
+    Sửa nhiều đoạn văn, gộp các đoạn ngắn liên tiếp vào 1 prompt LLM (chế độ
+    rewrite, giải thích sinh từ diff; xem is_packing_enabled). Nhóm nào LLM trả
+    về không hợp lệ (sai số đoạn / sai format) được sửa lại từng đoạn bằng
+    correct_with_pipeline; đoạn dài / không dấu luôn sửa riêng.
+
+    kwargs được truyền cho correct_with_pipeline (qwen_variant, ollama_model, targeted, decoding...).
+    Returns: List (corrected_text, explanation) theo đúng thứ tự đầu vào
+    """
+    targeted = kwargs.get("targeted")
+    if targeted is None:
+        targeted = SPAN_TARGETED_MODE
+    decoding = resolve_policy(kwargs.get("decoding"), pipeline)
+
+    # Đoạn không dấu đi đường khôi phục dấu bằng n-gram → không gộp
+    packable = [
+        is_packable(p) and not (DIACRITIC_RESTORE_ENABLED and is_unaccented(p))
+        for p in paragraphs
+    ]
+
+    results = [None] * len(paragraphs)
+    for group in group_paragraphs(paragraphs, packable):
+        texts = [paragraphs[i] for i in group]
+        corrected = None
+        if len(group) > 1:
+            with metrics.timer(STAGE_SECONDS, stage="llm_packed"):
+                corrected = _llm_packed(texts, pipeline, kwargs.get("qwen_variant"), kwargs.get("ollama_model"),
+                                        llm_sampling.resolve_sampling(kwargs.get("sampling")))
+
+        if corrected is None:
+            for i in group:
+                results[i] = correct_with_pipeline(paragraphs[i], pipeline=pipeline, stats=stats, **kwargs)
+            continue
+
+        metrics.increment("llm_packed_paragraphs_total", len(group), pipeline=pipeline)
+        metrics.increment("llm_packed_calls_total", 1, pipeline=pipeline)
+        for i, text, model_fixed in zip(group, texts, corrected):
+            final_text = model_fixed
+            if pipeline.endswith("_protonx"):
+                final_text = refine_stage(model_fixed, targeted, stats, decoding)
+            results[i] = (final_text, generate_explanation(text, final_text))
+
+    return results
+
+
+# === Pipelined BartPho → ProtonX (nhiều đoạn) ===
+
+def is_pipelining_enabled(pipeline: str) -> bool:
+    """Pipeline có chạy 2 stage BartPho / ProtonX gối nhau theo lô không (theo config)"""
+    return PIPELINED_SEQ2SEQ and pipeline == "bartpho_protonx"
+
+
+def _merge_stats(stats: dict, stage_stats: dict):
+    for key, value in stage_stats.items():
+        stats[key] = stats.get(key, 0) + value
+
+
+def _bartpho_lot(texts: list, targeted: bool, stats: dict, decoding: str) -> list:
+    """Stage 1 cho 1 lô: khôi phục dấu (đoạn không dấu) hoặc BartPho (batch)"""
+    outputs = [None] * len(texts)
+    for i, text in enumerate(texts):
+        if DIACRITIC_RESTORE_ENABLED and is_unaccented(text):
+            with metrics.timer(STAGE_SECONDS, stage="diacritics"):
+                outputs[i] = restore_diacritics(text)
+
+    pending = [i for i, output in enumerate(outputs) if output is None]
+    if targeted:
+        for i in pending:
+            outputs[i] = bartpho_stage(texts[i], targeted, stats, decoding)
+    elif pending:
+        with metrics.timer(STAGE_SECONDS, stage="bartpho"):
+            fixed = get_bartpho().correct_batch([texts[i] for i in pending], decoding=decoding)
+        for i, output in zip(pending, fixed):
+            outputs[i] = output
+    return outputs
+
+
+def _refine_lot(texts: list, targeted: bool, stats: dict, decoding: str) -> list:
+    """Stage 2 cho 1 lô: ProtonX refine (batch)"""
+    if targeted:
+        return [refine_stage(text, targeted, stats, decoding) for text in texts]
+    with metrics.timer(STAGE_SECONDS, stage="protonx"):
+        return get_protonx().refine_batch(texts, decoding=decoding)
+
+
+def correct_paragraphs_pipelined(paragraphs: list, stats: dict = None, decoding: str = None, targeted: bool = None,
+                                 batch_size: int = PIPELINE_BATCH_PARAGRAPHS, on_result=None, cancel: threading.Event = None) -> list:
+    """
+    Sửa nhiều đoạn văn bằng bartpho_protonx, 2 stage chạy gối nhau theo lô:
+    1 thread chạy BartPho cho lô k+1 trong khi thread gọi refine lô k bằng
+    ProtonX (torch nhả GIL khi tính toán nên 2 stage dùng được nhiều core).
+    Kết quả giống correct_with_pipeline(pipeline="bartpho_protonx") từng đoạn.
+
+    Args:
+        stats, decoding, targeted: Như correct_with_pipeline
+        batch_size: Số đoạn mỗi lô
+        on_result: Hàm (index, original, bartpho_text, final_text, explanation), gọi
+            theo đúng thứ tự đoạn ngay khi lô chứa đoạn đó xong (vd: cập nhật GUI)
+        cancel: Event, được set → dừng sau lô hiện tại
+
+    Returns:
+        List (corrected_text, explanation) theo thứ tự đầu vào (ngắn hơn nếu bị huỷ)
+    """
+    if targeted is None:
+        targeted = SPAN_TARGETED_MODE
+    decoding = resolve_policy(decoding, "bartpho_protonx")
+    lots = [list(range(i, min(i + batch_size, len(paragraphs)))) for i in range(0, len(paragraphs), batch_size)]
+    stage_stats = ({}, {})  # Mỗi stage 1 dict riêng (2 thread), cộng vào stats khi xong
+    cancel = cancel or threading.Event()
+    stop = threading.Event()  # Dừng producer khi consumer thoát (xong / lỗi / huỷ)
+    handoff = queue.Queue(maxsize=PIPELINE_QUEUE_DEPTH)
+
+    def produce():
+        try:
+            for lot in lots:
+                if cancel.is_set() or stop.is_set():
+                    break
+                handoff.put((lot, _bartpho_lot([paragraphs[i] for i in lot], targeted, stage_stats[0], decoding)))
+        except Exception as e:
+            handoff.put(e)
+            return
+        handoff.put(None)
+
+    producer = threading.Thread(target=produce, name="bartpho-stage", daemon=True)
+    producer.start()
+
+    results = []
+    try:
+        while True:
+            item = handoff.get()
+            if item is None:
+                break
+            if isinstance(item, Exception):
+                raise item
+            lot, model_fixed = item
+            finals = _refine_lot(model_fixed, targeted, stage_stats[1], decoding)
+            for i, fixed, final_text in zip(lot, model_fixed, finals):
+                explanation = generate_explanation(paragraphs[i], final_text)
+                results.append((final_text, explanation))
+                if on_result is not None:
+                    on_result(i, paragraphs[i], fixed, final_text, explanation)
+            if cancel.is_set():
+                break
+    finally:
+        stop.set()
+        while producer.is_alive():
+            try:
+                handoff.get(timeout=0.1)  # Giải phóng producer đang chờ put
+            except queue.Empty:
+                pass
+        if stats is not None:
+            for stage in stage_stats:
+                _merge_stats(stats, stage)
+
+    log.info("🔀 [Pipelined] BartPho → ProtonX", extra=kv(paragraphs=len(results), lots=len(lots), batch=batch_size))
+    return results
+
+
+def describe_decoding(pipeline: str, decoding: str = None, sampling: str = None) -> dict:
+    """
+    Tham số decode thực tế của pipeline (ghi kèm kết quả để tái lập / làm key cache).
+    Returns: {"seq2seq": chính sách decode, "llm": tham số sampling} (chỉ gồm stage pipeline có dùng)
+    """
+    backends = PIPELINE_BACKENDS.get(pipeline, [])
+    params = {}
+    if "protonx" in backends or "bartpho" in backends:
+        params["seq2seq"] = resolve_policy(decoding, pipeline)
+    if "qwen" in backends or "ollama" in backends:
+        params["llm"] = llm_sampling.describe(llm_sampling.resolve_sampling(sampling))
+    return params
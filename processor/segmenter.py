@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+"""
+Tách câu và chia chunk theo token cho văn bản tiếng Việt.
+
+- Tách câu giữ nguyên vị trí (offset) của từng câu để có thể ghép kết quả
+  lại mà không làm thay đổi khoảng trắng gốc.
+- Không tách sau chữ viết tắt (TP., ThS., PGS.), số thứ tự đầu câu (1., 1.2.,
+  II., a., Điều 5.) và chữ cái viết tắt (Nguyễn V. A., Q. 1, P. Bến Nghé) —
+  chữ cái đơn chỉ được coi là viết tắt khi nằm trong tên riêng hoặc theo sau
+  là số / tên riêng, không phải ở mọi cuối câu.
+- Gom câu thành chunk theo số token đo bằng tokenizer của model đích,
+  câu quá dài được tách tiếp theo mệnh đề rồi theo từ, nên không chunk
+  nào bị cắt cụt khi đưa vào model.
+"""
+
+import re
+
+# Ranh giới câu: sau dấu . ! ? … (kèm dấu đóng ngoặc/nháy nếu có) và khoảng trắng
+_BOUNDARY_RE = re.compile(r'(?<=[.!?…])["”’)\]]*\s+')
+_CLAUSE_RE = re.compile(r'(?<=[,;:])\s+')
+_WORD_RE = re.compile(r'\S+')
+
+# Chữ viết tắt thường gặp (chữ thường, không có dấu chấm cuối). Không gồm từ tiếng
+# Việt có nghĩa ("no") và chữ cái đơn (q, p, x, h), xem _is_letter_abbreviation
+_ABBREVIATIONS = {
+    "tp", "tt", "tx", "tr", "st", "nxb", "vd",
+    "gs", "pgs", "ts", "ths", "th.s", "gs.ts", "pgs.ts", "ts.bs", "bs", "ks", "cn", "ls", "ncs",
+    "mr", "mrs", "ms", "dr", "đ/c",
+}
+# Số thứ tự: 1 | 1.2 | II | a
+_NUMBERING_RE = re.compile(r'^(\d+(\.\d+)*|[ivxlc]+|[a-zđ])$')
+_NUMBERING_PREFIXES = {"điều", "chương", "mục", "khoản", "phần", "bước", "điểm"}
+
+
+def _is_capitalized(word: str) -> bool:
+    return word[:1].isupper()
+
+
+def _is_letter_abbreviation(words: list, rest: str) -> bool:
+    """
+    Chữ cái đơn words[-1] + "." là viết tắt (không kết thúc câu) khi:
+    - nằm trong tên riêng: "Nguyễn V. A." (chữ hoa, từ trước viết hoa)
+    - theo sau là số: "Q. 1", "P. 5"
+    - theo sau là tên riêng (≥ 2 từ viết hoa liên tiếp): "P. Bến Nghé", "Q. Hoàn Kiếm"
+    """
+    following = rest.split()[:2]
+    if following and following[0][0].isdigit():
+        return True
+    if words[-1].isupper() and len(words) >= 2 and _is_capitalized(words[-2]):
+        return True
+    return len(following) == 2 and all(_is_capitalized(w) for w in following)
+
+
+def _is_sentence_end(text: str, start: int, pos: int) -> bool:
+    """Dấu câu ngay trước vị trí pos có thực sự kết thúc câu bắt đầu tại start không."""
+    if text[pos - 1] != ".":
+        return True
+
+    words = text[start:pos - 1].split()
+    if not words:
+        return False
+
+    last = words[-1].lower()
+    if last in _ABBREVIATIONS:
+        return False
+    # Số thứ tự đầu câu: "1.", "II.", "a.", "Điều 5."
+    if _NUMBERING_RE.match(last) and (
+        len(words) == 1 or (len(words) == 2 and words[0].lower() in _NUMBERING_PREFIXES)
+    ):
+        return False
+    # Chữ cái viết tắt: "Nguyễn V. A.", "Q. 1", "P. Bến Nghé"
+    if len(last) == 1 and last.isalpha():
+        return not _is_letter_abbreviation(words, text[pos:])
+    return True
+
+
+def split_sentence_spans(text: str) -> list:
+    """
+    Tách văn bản thành các câu.
+
+    Returns:
+        List (start, end) của từng câu trong text (không gồm khoảng trắng
+        hai đầu). text[end:next_start] là phần khoảng trắng giữa 2 câu.
+    """
+    spans = []
+    start = 0
+    for match in _BOUNDARY_RE.finditer(text):
+        if not _is_sentence_end(text, start, match.start()):
+            continue
+        end = match.start() + len(match.group().rstrip())
+        _append_span(text, start, end, spans)
+        start = match.end()
+    _append_span(text, start, len(text), spans)
+    return spans
+
+
+def _append_span(text: str, start: int, end: int, spans: list):
+    segment = text[start:end]
+    if not segment.strip():
+        return
+    left = len(segment) - len(segment.lstrip())
+    right = len(segment.rstrip())
+    spans.append((start + left, start + right))
+
+
+def split_sentences(text: str) -> list:
+    """Tách văn bản thành list câu (đã strip)."""
+    return [text[s:e] for s, e in split_sentence_spans(text)]
+
+
+def splice(text: str, spans: list, replacements: dict) -> str:
+    """
+    Thay nội dung các đoạn theo index, giữ nguyên phần còn lại của text.
+
+    Args:
+        text: Văn bản gốc
+        spans: List (start, end) không chồng nhau, theo thứ tự
+        replacements: {index_span: nội_dung_mới}
+    """
+    pieces = []
+    last_end = 0
+    for idx, (start, end) in enumerate(spans):
+        pieces.append(text[last_end:start])
+        pieces.append(replacements.get(idx, text[start:end]))
+        last_end = end
+    pieces.append(text[last_end:])
+    return "".join(pieces)
+
+
+def _sub_spans(text: str, start: int, end: int, pattern) -> list:
+    spans = []
+    last = start
+    for match in pattern.finditer(text, start, end):
+        spans.append((last, match.start()))
+        last = match.end()
+    spans.append((last, end))
+    return [(s, e) for s, e in spans if e > s]
+
+
+def _atomic_spans(text: str, start: int, end: int, count_tokens, max_tokens: int) -> list:
+    """Tách 1 câu quá dài thành các đoạn ≤ max_tokens: theo mệnh đề, rồi theo từ."""
+    if count_tokens(text[start:end]) <= max_tokens:
+        return [(start, end)]
+
+    clauses = _sub_spans(text, start, end, _CLAUSE_RE)
+    if len(clauses) > 1:
+        result = []
+        for s, e in clauses:
+            result.extend(_atomic_spans(text, s, e, count_tokens, max_tokens))
+        return result
+
+    # Không còn mệnh đề → tách theo từ (1 từ quá dài vẫn được giữ nguyên)
+    return [m.span() for m in _WORD_RE.finditer(text, start, end)]
+
+
+def split_in_half(text: str) -> list:
+    """
+    Tách văn bản thành 2 phần gần bằng nhau tại ranh giới câu, mệnh đề hoặc từ.
+    Returns: list (start, end); chỉ 1 phần tử nếu không thể tách.
+    """
+    for spans in (
+        split_sentence_spans(text),
+        _sub_spans(text, 0, len(text), _CLAUSE_RE),
+        [m.span() for m in _WORD_RE.finditer(text)],
+    ):
+        if len(spans) > 1:
+            middle = len(text) / 2
+            cut = min(range(1, len(spans)), key=lambda i: abs(spans[i][0] - middle))
+            return [(spans[0][0], spans[cut - 1][1]), (spans[cut][0], spans[-1][1])]
+    return [(0, len(text))]
+
+
+def chunk_spans(text: str, count_tokens, max_tokens: int) -> list:
+    """
+    Gom câu liên tiếp thành chunk không vượt quá max_tokens token.
+
+    Args:
+        text: Văn bản cần chia
+        count_tokens: Hàm đếm token theo tokenizer của model đích (nên có cache)
+        max_tokens: Số token tối đa mỗi chunk
+
+    Returns:
+        List (start, end) của các chunk trong text
+    """
+    atoms = []
+    for start, end in split_sentence_spans(text):
+        atoms.extend(_atomic_spans(text, start, end, count_tokens, max_tokens))
+
+    chunks = []
+    cur_start = cur_end = None
+    cur_tokens = 0
+    for start, end in atoms:
+        tokens = count_tokens(text[start:end])
+        if cur_start is not None and cur_tokens + tokens <= max_tokens:
+            cur_end = end
+            cur_tokens += tokens
+            continue
+        if cur_start is not None:
+            chunks.append((cur_start, cur_end))
+        cur_start, cur_end, cur_tokens = start, end, tokens
+    if cur_start is not None:
+        chunks.append((cur_start, cur_end))
+    return chunks
+
+
+def correct_in_chunks(texts: list, generate_batch, count_tokens, max_tokens: int, batch_size: int) -> list:
+    """
+    Sửa nhiều văn bản: chia mỗi văn bản thành chunk theo token, sinh theo
+    batch (các chunk dài gần nhau được xếp cùng batch để giảm padding),
+    rồi ghép kết quả về đúng vị trí trong văn bản gốc.
+
+    Args:
+        texts: List văn bản
+        generate_batch: Hàm sinh cho 1 batch: list[str] -> list[str]
+        count_tokens: Hàm đếm token (nên có cache)
+        max_tokens: Token budget mỗi chunk
+        batch_size: Số chunk mỗi batch
+
+    Returns:
+        List văn bản đã sửa theo đúng thứ tự đầu vào
+    """
+    plans = []
+    flat = []
+    for text in texts:
+        spans = chunk_spans(text, count_tokens, max_tokens)
+        plans.append((text, spans))
+        flat.extend(text[s:e] for s, e in spans)
+
+    order = sorted(range(len(flat)), key=lambda i: count_tokens(flat[i]))
+    outputs = [None] * len(flat)
+    for i in range(0, len(order), batch_size):
+        batch_idx = order[i:i + batch_size]
+        for idx, output in zip(batch_idx, generate_batch([flat[j] for j in batch_idx])):
+            outputs[idx] = output.strip() or flat[idx]
+
+    results = []
+    pos = 0
+    for text, spans in plans:
+        chunk_outputs = outputs[pos:pos + len(spans)]
+        pos += len(spans)
+        results.append(splice(text, spans, dict(enumerate(chunk_outputs))))
+    return results
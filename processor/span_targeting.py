@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+Sửa lỗi có chọn lọc (span-targeted): chỉ gửi các câu nghi ngờ có lỗi
+đến model, các câu sạch được giữ nguyên.
+
+Chi phí sinh văn bản tỉ lệ với độ dài output, nên việc viết lại các câu
+đã đúng là lãng phí. Các câu nghi ngờ được sửa theo batch rồi ghép lại
+vào đoạn văn gốc, giữ nguyên khoảng trắng.
+"""
+
+from processor import lexicon
+from processor.log import get_logger, kv
+from processor.diacritics import is_unaccented
+from processor.segmenter import split_sentence_spans, splice
+
+log = get_logger("span")
+
+
+def is_suspect_sentence(sentence: str) -> bool:
+    """Câu có dấu hiệu cần sửa: thiếu dấu, âm tiết lạ, hoặc không viết hoa đầu câu."""
+    first_letter = next((ch for ch in sentence if ch.isalpha()), "")
+    if first_letter and not first_letter.isupper():
+        return True
+    if is_unaccented(sentence, min_words=2):
+        return True
+    return bool(lexicon.check(sentence))
+
+
+def correct_suspect_spans(text: str, batch_func, count_tokens=None, stats: dict = None) -> str:
+    """
+    Sửa các câu nghi ngờ trong đoạn văn và ghép lại.
+
+    Args:
+        text: Đoạn văn cần sửa
+        batch_func: Hàm sửa theo batch: list[str] -> list[str]
+        count_tokens: Hàm đếm token (mặc định: đếm từ) để thống kê token tiết kiệm
+        stats: Dict (optional) để cộng dồn thống kê: sentences_total,
+               sentences_corrected, tokens_avoided
+
+    Returns:
+        Đoạn văn đã sửa
+    """
+    if count_tokens is None:
+        count_tokens = lambda s: len(s.split())
+
+    spans = split_sentence_spans(text)
+    sentences = [text[s:e] for s, e in spans]
+    suspect_idx = [i for i, sentence in enumerate(sentences) if is_suspect_sentence(sentence)]
+    suspect_set = set(suspect_idx)
+
+    tokens_avoided = sum(
+        count_tokens(sentence)
+        for i, sentence in enumerate(sentences) if i not in suspect_set
+    )
+
+    if stats is not None:
+        stats["sentences_total"] = stats.get("sentences_total", 0) + len(sentences)
+        stats["sentences_corrected"] = stats.get("sentences_corrected", 0) + len(suspect_idx)
+        stats["tokens_avoided"] = stats.get("tokens_avoided", 0) + tokens_avoided
+
+    log.info("🎯 [Span] Câu nghi ngờ", extra=kv(sample=True, suspect=len(suspect_idx), sentences=len(sentences), tokens_avoided=tokens_avoided))
+
+    if not suspect_idx:
+        return text
+
+    corrected = batch_func([sentences[i] for i in suspect_idx])
+    replacements = {i: fixed.strip() or sentences[i] for i, fixed in zip(suspect_idx, corrected)}
+
+    return splice(text, spans, replacements)
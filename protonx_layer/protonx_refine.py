@@ -1,123 +1,99 @@
 import torch
+from functools import lru_cache, partial
 from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
+from config import (
+    SEQ2SEQ_BATCH_SIZE, SEQ2SEQ_BACKENDS, PROTONX_MAX_INPUT_TOKENS, PROTONX_MAX_NEW_TOKENS,
+    PROTONX_CHUNK_TOKENS, TOKEN_COUNT_CACHE_SIZE
+)
+from processor.segmenter import correct_in_chunks
+from processor.overflow import generate_with_overflow_retry
+from llm.loading import load_seq2seq, local_model_path
+from llm.decoding import generate as decode, resolve_policy
+from processor import metrics
+from processor.log import get_logger, kv, preview
+
+log = get_logger("protonx")
 
 MODEL_NAME = "protonx-models/protonx-legal-tc"
 
 # === Device Info ===
 device = "cuda" if torch.cuda.is_available() else "cpu"
-print(f"🖥️  [ProtonX] Device: {device.upper()}")
-if device == "cuda":
-    print(f"🖥️  [ProtonX] GPU: {torch.cuda.get_device_name(0)}")
-print(f"🖥️  [ProtonX] Model: {MODEL_NAME}")
-print("=" * 50)
-
-tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
-model = AutoModelForSeq2SeqLM.from_pretrained(
-    MODEL_NAME,
-    torch_dtype=torch.float16 if device == "cuda" else torch.float32
-)
-model = model.to(device)
-model.eval()
-
-def refine_text(text: str) -> str:
-    # === LOG: ProtonX Input ===
-    print("\n" + "=" * 50)
-    print("📥 [ProtonX] INPUT:")
-    print("-" * 50)
-    print(text)
-    print("-" * 50)
-
-    inputs = tokenizer(
-        text,
-        return_tensors="pt",
-        truncation=True,
-        max_length=512
-    ).to(device)
-
-    with torch.no_grad():
-        outputs = model.generate(
-            **inputs,
-            max_new_tokens=256,
-            num_beams=4,
-            early_stopping=True
-        )
-
-    result = tokenizer.decode(
-        outputs[0],
-        skip_special_tokens=True
+log.info("🖥️  [ProtonX] Device", extra=kv(
+    device=device.upper(),
+    gpu=torch.cuda.get_device_name(0) if device == "cuda" else None,
+    model=MODEL_NAME
+))
+
+tokenizer = AutoTokenizer.from_pretrained(local_model_path(MODEL_NAME))
+model = load_seq2seq(MODEL_NAME, AutoModelForSeq2SeqLM, device, backend=SEQ2SEQ_BACKENDS.get("protonx", "eager"))
+
+def _generate_batch(texts: list, decoding: str = None) -> list:
+    """Generate cho 1 batch văn bản (không chia chunk) theo chính sách decode"""
+    with metrics.timer("seq2seq_tokenize_seconds", model="ProtonX"):
+        inputs = tokenizer(
+            texts,
+            return_tensors="pt",
+            truncation=True,
+            max_length=PROTONX_MAX_INPUT_TOKENS,
+            padding=True
+        ).to(device)
+
+    outputs = decode(
+        model, inputs, resolve_policy(decoding), tokenizer.pad_token_id, "ProtonX",
+        max_new_tokens=PROTONX_MAX_NEW_TOKENS
+    )
+
+    return tokenizer.batch_decode(outputs, skip_special_tokens=True)
+
+
+def _generate_checked(texts: list, decoding: str = None) -> list:
+    """Generate cho 1 batch, tự động tách lại các chunk bị cắt cụt (overflow)"""
+    return generate_with_overflow_retry(
+        texts, partial(_generate_batch, decoding=decoding), count_tokens,
+        PROTONX_MAX_INPUT_TOKENS, PROTONX_MAX_NEW_TOKENS, model_name="ProtonX"
     )
 
-    # === LOG: ProtonX Output ===
-    print("📤 [ProtonX] OUTPUT:")
-    print("-" * 50)
-    print(result)
-    print("=" * 50)
+
+def refine_text(text: str, decoding: str = None) -> str:
+    log.debug("📥 [ProtonX] INPUT: %s", preview(text))
+    result = _generate_checked([text], decoding)[0]
+    log.debug("📤 [ProtonX] OUTPUT: %s", preview(result), extra=kv(chars=len(text), changed=result != text))
 
     return result
 
 
-def refine_text_chunked(text: str, max_words_per_chunk: int = 100) -> str:
+@lru_cache(maxsize=TOKEN_COUNT_CACHE_SIZE)
+def count_tokens(text: str) -> int:
+    """Đếm số token của văn bản theo tokenizer ProtonX (có cache)"""
+    return len(tokenizer(text, add_special_tokens=False)["input_ids"])
+
+
+@metrics.register_collector
+def _collect_cache_metrics():
+    """Hit / miss của cache đếm token (cập nhật khi render /metrics)"""
+    info = count_tokens.cache_info()
+    metrics.set_gauge("token_count_cache_hits", info.hits, model="ProtonX")
+    metrics.set_gauge("token_count_cache_misses", info.misses, model="ProtonX")
+
+
+def refine_batch(texts: list, batch_size: int = SEQ2SEQ_BATCH_SIZE, max_tokens: int = PROTONX_CHUNK_TOKENS, decoding: str = None) -> list:
+    """
+    Refine nhiều văn bản cùng lúc.
+    Mỗi văn bản được chia chunk theo token, các chunk được generate theo batch
+    rồi ghép lại. Trả về list kết quả theo đúng thứ tự đầu vào.
+    """
+    log.info("📦 [ProtonX] Refine batch", extra=kv(sample=True, texts=len(texts), batch=batch_size, max_tokens=max_tokens))
+    generate_batch = partial(_generate_checked, decoding=decoding)
+    return correct_in_chunks(texts, generate_batch, count_tokens, max_tokens, batch_size)
+
+
+def refine_text_chunked(text: str, max_tokens: int = PROTONX_CHUNK_TOKENS, decoding: str = None) -> str:
     """
     Refine văn bản dài bằng cách chia thành chunks theo CÂU.
-    Đảm bảo không cắt giữa câu.
+    Các câu được gom vào chunk theo số token (tokenizer ProtonX), câu quá dài
+    được tách theo mệnh đề nên không chunk nào bị cắt cụt.
     """
-    import re
-    
-    words = text.split()
-    
-    if len(words) <= max_words_per_chunk:
-        return refine_text(text)
-    
-    # Chia theo câu (dấu . ! ? kết thúc)
-    sentences = re.split(r'(?<=[.!?])\s+', text)
-    
-    # Gom câu thành chunks, mỗi chunk không quá max_words_per_chunk từ
-    chunks = []
-    current_chunk = []
-    current_word_count = 0
-    
-    for sentence in sentences:
-        sentence = sentence.strip()
-        if not sentence:
-            continue
-            
-        sentence_word_count = len(sentence.split())
-        
-        # Nếu 1 câu đã quá dài → xử lý riêng
-        if sentence_word_count > max_words_per_chunk:
-            # Lưu chunk hiện tại trước
-            if current_chunk:
-                chunks.append(" ".join(current_chunk))
-                current_chunk = []
-                current_word_count = 0
-            # Thêm câu dài như 1 chunk riêng
-            chunks.append(sentence)
-        # Nếu thêm câu này vẫn trong giới hạn
-        elif current_word_count + sentence_word_count <= max_words_per_chunk:
-            current_chunk.append(sentence)
-            current_word_count += sentence_word_count
-        # Nếu thêm câu này vượt giới hạn → tạo chunk mới
-        else:
-            if current_chunk:
-                chunks.append(" ".join(current_chunk))
-            current_chunk = [sentence]
-            current_word_count = sentence_word_count
-    
-    # Thêm chunk cuối cùng
-    if current_chunk:
-        chunks.append(" ".join(current_chunk))
-    
-    print(f"📦 [ProtonX] Chia thành {len(chunks)} chunks (theo câu, max {max_words_per_chunk} từ/chunk)")
-    
-    # Xử lý từng chunk
-    refined_chunks = []
-    for idx, chunk in enumerate(chunks, 1):
-        print(f"  🔷 ProtonX Chunk [{idx}/{len(chunks)}]: {len(chunk.split())} từ")
-        refined_chunk = refine_text(chunk)
-        refined_chunks.append(refined_chunk)
-    
-    # Ghép lại
-    result = " ".join(refined_chunks)
-    
-    return result
+    if count_tokens(text) <= max_tokens:
+        return refine_text(text, decoding)
 
+    return refine_batch([text], max_tokens=max_tokens, decoding=decoding)[0]
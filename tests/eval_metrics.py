@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+Metric đánh giá độ chính xác sửa lỗi: CER, WER, tỉ lệ lỗi dấu (DER).
+
+Edit distance dùng thuật toán bit-parallel của Myers / Hyyrö: mỗi ký tự
+(hoặc từ) của chuỗi dài chỉ tốn vài phép toán trên số nguyên Python
+(bitmask độ dài bằng chuỗi ngắn), nhanh hơn nhiều so với
+difflib.SequenceMatcher (bậc 2 trong trường hợp xấu) trên các bài văn dài.
+
+- CER: edit distance ký tự / số ký tự expected
+- WER: edit distance theo từ / số từ expected
+- DER: số lỗi từ chỉ do sai dấu / số từ expected (= WER có dấu - WER
+  sau khi bỏ dấu, không phân biệt hoa thường)
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from processor.diacritics import strip_diacritics
+
+
+def edit_distance(a, b) -> int:
+    """Levenshtein distance giữa 2 chuỗi / 2 list token (bit-parallel, Hyyrö 2001)"""
+    if len(a) < len(b):
+        a, b = b, a
+    pattern, text = b, a  # Bitmask theo chuỗi ngắn hơn
+    m = len(pattern)
+    if m == 0:
+        return len(text)
+
+    peq = {}
+    for i, token in enumerate(pattern):
+        peq[token] = peq.get(token, 0) | (1 << i)
+
+    mask = (1 << m) - 1
+    high = 1 << (m - 1)
+    pv, mv, score = mask, 0, m
+    for token in text:
+        eq = peq.get(token, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = (mv | ~(xh | pv)) & mask
+        mh = pv & xh
+        if ph & high:
+            score += 1
+        elif mh & high:
+            score -= 1
+        ph = ((ph << 1) | 1) & mask
+        mh = (mh << 1) & mask
+        pv = (mh | ~(xv | ph)) & mask
+        mv = ph & xv
+    return score
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def similarity_score(a: str, b: str) -> float:
+    """Độ tương đồng ký tự giữa 2 chuỗi (0.0 - 1.0), không phân biệt hoa thường"""
+    a, b = _normalize(a), _normalize(b)
+    if not a and not b:
+        return 1.0
+    return 1.0 - edit_distance(a, b) / max(len(a), len(b))
+
+
+def score(actual: str, expected: str) -> dict:
+    """Số lỗi ký tự / từ / dấu của 1 cặp (actual, expected), để cộng dồn theo corpus"""
+    actual_words, expected_words = actual.split(), expected.split()
+    word_errors = edit_distance(actual_words, expected_words)
+    base_errors = edit_distance(
+        [strip_diacritics(w).lower() for w in actual_words],
+        [strip_diacritics(w).lower() for w in expected_words]
+    )
+    cased_errors = edit_distance([w.lower() for w in actual_words], [w.lower() for w in expected_words])
+    return {
+        "chars": len(expected),
+        "words": len(expected_words),
+        "char_errors": edit_distance(actual, expected),
+        "word_errors": word_errors,
+        "diacritic_errors": max(cased_errors - base_errors, 0),
+    }
+
+
+def rates(counts: dict) -> dict:
+    """CER / WER / DER từ số lỗi (của 1 item hoặc tổng cộng dồn)"""
+    return {
+        "cer": counts["char_errors"] / counts["chars"] if counts["chars"] else 0.0,
+        "wer": counts["word_errors"] / counts["words"] if counts["words"] else 0.0,
+        "der": counts["diacritic_errors"] / counts["words"] if counts["words"] else 0.0,
+    }
+
+
+def _add(total: dict, counts: dict):
+    for key, value in counts.items():
+        total[key] = total.get(key, 0) + value
+
+
+def evaluate(pairs: list) -> dict:
+    """
+    Đánh giá corpus.
+
+    Args:
+        pairs: List dict có "actual", "expected" và (tuỳ chọn) "errors", "category"
+
+    Returns:
+        {"overall": {cer, wer, der, items}, "by_error": {nhãn lỗi: {...}}, "by_category": {...}}
+    """
+    overall, by_error, by_category = {}, {}, {}
+    for pair in pairs:
+        counts = score(pair["actual"], pair["expected"])
+        _add(overall, counts)
+        for label in pair.get("errors") or ["(không nhãn)"]:
+            _add(by_error.setdefault(label, {"items": 0}), {**counts, "items": 1})
+        _add(by_category.setdefault(pair.get("category", "default"), {"items": 0}), {**counts, "items": 1})
+
+    def summary(counts: dict) -> dict:
+        return {**rates(counts), "items": counts.get("items", len(pairs))} if counts else {}
+
+    return {
+        "overall": summary({**overall, "items": len(pairs)}) if pairs else {},
+        "by_error": {label: summary(c) for label, c in by_error.items()},
+        "by_category": {name: summary(c) for name, c in by_category.items()},
+    }
+
+
+def print_report(report: dict):
+    """In bảng CER / WER / DER tổng, theo loại và theo nhãn lỗi"""
+    def row(name, r):
+        print(f"  {name:<26}{r['items']:>6}{r['cer'] * 100:>8.1f}%{r['wer'] * 100:>8.1f}%{r['der'] * 100:>8.1f}%")
+
+    print(f"\n  {'':<26}{'Items':>6}{'CER':>9}{'WER':>9}{'DER':>9}")
+    print("  " + "-" * 59)
+    if report["overall"]:
+        row("TỔNG", report["overall"])
+    for name, r in report["by_category"].items():
+        row(f"[{name}]", r)
+    for label, r in sorted(report["by_error"].items()):
+        row(label, r)
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark tốc độ / chất lượng cho Vietnamese Text Corrector.
+
+So sánh các chính sách decode của BartPho / ProtonX (beam, greedy, adaptive)
+trên bộ test_data: thời gian, số từ/giây, độ chính xác so với expected,
+tỉ lệ output giống hệt beam search và tỉ lệ câu phải chuyển sang beam.
+
+Cách chạy (từ thư mục gốc):
+    python tests/run_benchmark.py                    # pipeline bartpho_protonx
+    python tests/run_benchmark.py protonx_only
+"""
+
+import sys
+import os
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from test_data import SENTENCES, PARAGRAPHS, ESSAYS
+from eval_metrics import similarity_score
+
+DEFAULT_BENCH_PIPELINE = "bartpho_protonx"
+
+
+def _decode_count(mode: str) -> float:
+    from processor import metrics
+    return sum(
+        entry["value"] for entry in metrics.get_counters().get("seq2seq_decode_total", [])
+        if entry["labels"].get("mode") == mode
+    )
+
+
+def run_policy(pipeline: str, policy: str, items: list) -> dict:
+    """Chạy toàn bộ items với 1 chính sách decode"""
+    from processor import metrics
+    from processor.pipeline import correct_with_pipeline
+
+    metrics.reset()
+    outputs = []
+    start = time.time()
+    for item in items:
+        corrected, _ = correct_with_pipeline(item["input"], pipeline=pipeline, decoding=policy)
+        outputs.append(corrected)
+    elapsed = time.time() - start
+
+    words = sum(len(item["input"].split()) for item in items)
+    greedy, beam = _decode_count("greedy"), _decode_count("beam")
+    return {
+        "policy": policy,
+        "outputs": outputs,
+        "seconds": elapsed,
+        "words_per_sec": words / elapsed if elapsed else 0,
+        "accuracy": sum(similarity_score(o, item["expected"]) for o, item in zip(outputs, items)) / len(items),
+        "beam_ratio": beam / (greedy + beam) if greedy + beam else 0,
+    }
+
+
+def run_decoding_tradeoff(pipeline: str = DEFAULT_BENCH_PIPELINE) -> list:
+    """So sánh beam / greedy / adaptive, lấy beam search làm mốc"""
+    from config import DECODING_POLICIES
+
+    items = SENTENCES + PARAGRAPHS + ESSAYS
+
+    print("=" * 60)
+    print(f"⏱️ BENCHMARK CHÍNH SÁCH DECODE ({pipeline}, {len(items)} mẫu)")
+    print("=" * 60)
+
+    # Chạy 1 lần khởi động (load model, warm-up)
+    run_policy(pipeline, "greedy", items[:1])
+
+    reports = [run_policy(pipeline, policy, items) for policy in DECODING_POLICIES]
+    baseline = next(r for r in reports if r["policy"] == "beam")
+
+    print(f"\n  {'Policy':<10}{'Time':>9}{'Words/s':>10}{'Accuracy':>10}{'=Beam':>8}{'Beam%':>8}")
+    print("  " + "-" * 55)
+    for r in reports:
+        same = sum(1 for a, b in zip(r["outputs"], baseline["outputs"]) if a.strip() == b.strip())
+        r["same_as_beam"] = same / len(items)
+        print(f"  {r['policy']:<10}{r['seconds']:>8.1f}s{r['words_per_sec']:>10.1f}"
+              f"{r['accuracy'] * 100:>9.1f}%{r['same_as_beam'] * 100:>7.0f}%{r['beam_ratio'] * 100:>7.0f}%")
+    print("=" * 60)
+
+    return reports
+
+
+if __name__ == "__main__":
+    try:
+        run_decoding_tradeoff(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_BENCH_PIPELINE)
+    except ImportError as e:
+        print(f"❌ Lỗi import: {e}")
+        print("Hãy chạy từ thư mục gốc: python tests/run_benchmark.py")
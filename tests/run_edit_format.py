@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+Kiểm tra parse / áp dụng output chế độ "edits" (llm/edit_format.py), không cần model.
+
+- parse_edits: format hợp lệ, "KHÔNG CÓ LỖI", phần thừa sau danh sách, output sai format
+- apply_edits: span phải khớp trọn từ (không sửa vào giữa 1 từ dài hơn), đúng thứ tự,
+  không chồng lấn, không thay đổi quá nhiều → ngược lại trả về None (fallback rewrite)
+
+Cách chạy (từ thư mục gốc):
+    python tests/run_edit_format.py
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llm.edit_format import parse_edits, apply_edits, correct_from_output
+
+PARSE_CASES = [
+    ('"di" => "đi"', [("di", "đi")]),
+    ('1. "toi" -> "tôi"\n2. "di hoc" → "đi học"', [("toi", "tôi"), ("di hoc", "đi học")]),
+    ("KHÔNG CÓ LỖI", []),
+    ('"di" => "đi"\nGiải thích: sai chính tả', [("di", "đi")]),
+    ("Tôi đi học.", None),
+    ("", None),
+]
+
+APPLY_CASES = [
+    ("Trên diễn đàn, em di học.", [("di", "đi")], "Trên diễn đàn, em đi học."),
+    ("Trên diễn đàn, em học.", [("di", "đi")], None),  # "di" chỉ có trong "diễn"
+    ("Hôm nay toi di học, toi vui.", [("toi", "tôi"), ("di", "đi"), ("toi", "tôi")], "Hôm nay tôi đi học, tôi vui."),
+    ("Tôi đi học.", [("học", "hoc"), ("Tôi", "Toi")], None),  # Sai thứ tự
+    ("Tôi ăn cơm.", [("ăn cơm", "ăn cơm."), ("cơm", "phở")], None),  # Chồng lấn
+    ("Tôi ăn cơm.", [("Tôi ăn cơm", "Hôm qua bạn ấy đã đi chơi xa")], None),  # Thay đổi quá nhiều
+    ("Xin chào , bạn.", [(" , ", ", ")], "Xin chào, bạn."),
+]
+
+
+def check(name: str, actual, expected) -> bool:
+    passed = actual == expected
+    print(f"  {'✅' if passed else '❌'} {name}")
+    if not passed:
+        print(f"     expected: {expected!r}")
+        print(f"     actual:   {actual!r}")
+    return passed
+
+
+def run_checks() -> bool:
+    results = []
+
+    print("🔷 parse_edits")
+    for output, expected in PARSE_CASES:
+        results.append(check(repr(output[:40]), parse_edits(output), expected))
+
+    print("🔷 apply_edits")
+    for text, edits, expected in APPLY_CASES:
+        results.append(check(f"{text!r} {edits}", apply_edits(text, edits), expected))
+
+    print("🔷 correct_from_output")
+    results.append(check(
+        "sửa đúng từ, không sửa vào giữa 'diễn'",
+        correct_from_output("Trên diễn đàn, em di học.", '"di" => "đi"'),
+        ("Trên diễn đàn, em đi học.", "- 'di' → 'đi'"),
+    ))
+
+    print(f"\n📊 {sum(results)}/{len(results)} passed")
+    return all(results)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if run_checks() else 1)
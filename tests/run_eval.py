@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+"""
+Chạy đánh giá độ chính xác song song, có thể resume, cho corpus lớn.
+
+- Items được chia thành batch; mỗi batch gọi processor.parallel.correct_paragraphs
+  (tận dụng packing đoạn ngắn cho LLM / process pool cho CPU)
+- --workers N: chạy N worker process, mỗi worker load model 1 lần
+- --shard i/n: chỉ chạy phần i trong n phần (chia việc cho nhiều máy)
+- Kết quả được ghi ngay vào file JSONL sau mỗi batch; chạy lại cùng --output
+  sẽ bỏ qua các item đã có kết quả (resume sau khi crash)
+
+Corpus: mặc định là tests/test_data.py, hoặc file JSONL (--data), mỗi dòng:
+    {"id": ..., "input": "...", "expected": "...", "category": "...", "errors": [...]}
+
+Cách chạy (từ thư mục gốc):
+    python tests/run_eval.py --pipeline bartpho_protonx --output eval.jsonl
+    python tests/run_eval.py --data corpus.jsonl --workers 4 --batch-size 16 --output eval.jsonl
+    python tests/run_eval.py --data corpus.jsonl --shard 0/2 --output eval_0.jsonl
+"""
+
+import sys
+import os
+import json
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from test_data import SENTENCES, PARAGRAPHS, ESSAYS
+from eval_metrics import similarity_score, score, rates, evaluate, print_report
+
+PASS_THRESHOLD = 0.90  # Giống run_tests: pass nếu >= 90% giống nhau
+
+
+def load_items(data_path: str = None) -> list:
+    """Items cần đánh giá, id dạng "<category>-<id>" để không trùng giữa các loại"""
+    if data_path is None:
+        items = []
+        for category, group in [("sentence", SENTENCES), ("paragraph", PARAGRAPHS), ("essay", ESSAYS)]:
+            items.extend({**item, "id": f"{category}-{item['id']}", "category": category} for item in group)
+        return items
+
+    items = []
+    with open(data_path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            if line.strip():
+                item = json.loads(line)
+                item.setdefault("id", line_no)
+                item["id"] = str(item["id"])
+                item.setdefault("category", "default")
+                items.append(item)
+    return items
+
+
+def read_results(output_path: str) -> list:
+    """Các kết quả hợp lệ trong file output (bỏ qua dòng bị ghi dở khi crash)"""
+    results = []
+    if not os.path.exists(output_path):
+        return results
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                results.append(json.loads(line))
+            except ValueError:
+                continue
+    return results
+
+
+def repair_tail(output_path: str):
+    """Cắt dòng cuối bị ghi dở (crash giữa lúc ghi) để kết quả mới không bị dính vào"""
+    if not os.path.exists(output_path):
+        return
+    with open(output_path, "rb+") as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            f.truncate(data.rfind(b"\n") + 1)
+
+
+def select_shard(items: list, shard: str = None) -> list:
+    """Lấy phần i/n của items (chia theo vị trí, ổn định giữa các lần chạy)"""
+    if not shard:
+        return items
+    index, count = (int(x) for x in shard.split("/"))
+    return items[index::count]
+
+
+# === Worker ===
+
+def _init_worker(pipeline: str):
+    from processor.pipeline import preload
+    preload([pipeline])
+
+
+def correct_batch(batch: list, pipeline: str) -> list:
+    """Sửa 1 batch item, trả về list kết quả (dict) cùng thứ tự ([] nếu batch lỗi)"""
+    from processor.parallel import correct_paragraphs
+
+    start = time.time()
+    try:
+        corrections = correct_paragraphs([item["input"] for item in batch], pipeline)
+    except Exception as e:
+        # Không ghi kết quả → batch được chạy lại ở lần resume sau
+        print(f"  ❌ Batch lỗi ({batch[0]['id']}...): {e}")
+        return []
+    seconds = (time.time() - start) / len(batch)
+
+    results = []
+    for item, (actual, _) in zip(batch, corrections):
+        similarity = similarity_score(actual, item["expected"])
+        results.append({
+            "id": item["id"],
+            "category": item["category"],
+            "input": item["input"],
+            "expected": item["expected"],
+            "actual": actual,
+            "errors": item.get("errors", []),
+            "similarity": round(similarity * 100, 1),
+            "passed": similarity >= PASS_THRESHOLD,
+            **{k: round(v, 4) for k, v in rates(score(actual, item["expected"])).items()},
+            "seconds": round(seconds, 3),
+        })
+    return results
+
+
+# === Runner ===
+
+def run_eval(pipeline: str, output_path: str, data_path: str = None, workers: int = 1,
+             batch_size: int = 8, shard: str = None) -> list:
+    """Chạy đánh giá, ghi từng batch vào output_path (JSONL). Returns: toàn bộ kết quả trong file"""
+    items = select_shard(load_items(data_path), shard)
+    repair_tail(output_path)
+    done = {str(result["id"]) for result in read_results(output_path)}
+    pending = [item for item in items if item["id"] not in done]
+    batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+
+    print("=" * 60)
+    print(f"🧪 ĐÁNH GIÁ {pipeline}: {len(items)} item, đã có {len(items) - len(pending)}, "
+          f"còn {len(pending)} ({len(batches)} batch, {workers} worker)")
+    print("=" * 60)
+
+    start = time.time()
+    finished = 0
+    with open(output_path, "a", encoding="utf-8") as out:
+        def write(results):
+            nonlocal finished
+            for result in results:
+                out.write(json.dumps(result, ensure_ascii=False) + "\n")
+            out.flush()
+            finished += len(results)
+            elapsed = time.time() - start
+            print(f"  ✅ {finished}/{len(pending)} item ({finished / elapsed if elapsed else 0:.1f} item/s)")
+
+        if workers <= 1:
+            _init_worker(pipeline)
+            for batch in batches:
+                write(correct_batch(batch, pipeline))
+        else:
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(pipeline,)
+            ) as pool:
+                futures = [pool.submit(correct_batch, batch, pipeline) for batch in batches]
+                for future in as_completed(futures):
+                    write(future.result())
+
+    return summarize(output_path)
+
+
+def summarize(output_path: str) -> list:
+    """In tổng kết từ file kết quả (gồm cả các lần chạy trước)"""
+    results = read_results(output_path)
+
+    categories = {}
+    for result in results:
+        categories.setdefault(result["category"], []).append(result)
+
+    print("\n" + "=" * 60)
+    print("📊 KẾT QUẢ TỔNG HỢP")
+    print("=" * 60)
+    for category, group in categories.items():
+        passed = sum(1 for r in group if r["passed"])
+        avg = sum(r["similarity"] for r in group) / len(group)
+        print(f"  {category:<12} {passed}/{len(group)} pass, similarity TB {avg:.1f}%")
+    total_passed = sum(1 for r in results if r["passed"])
+    print("-" * 60)
+    print(f"  🎯 TỔNG: {total_passed}/{len(results)} ({total_passed / len(results) * 100 if results else 0:.1f}%)")
+    if all("actual" in r for r in results):
+        print_report(evaluate(results))
+    print("=" * 60)
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+    from config import DEFAULT_PIPELINE
+
+    parser = argparse.ArgumentParser(description="Đánh giá độ chính xác song song, có resume")
+    parser.add_argument("--pipeline", default=DEFAULT_PIPELINE)
+    parser.add_argument("--data", help="Corpus JSONL (mặc định: tests/test_data.py)")
+    parser.add_argument("--output", required=True, help="File kết quả JSONL (chạy lại để resume)")
+    parser.add_argument("--workers", type=int, default=1, help="Số worker process")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--shard", help="Chỉ chạy phần i/n, vd: 0/4")
+    args = parser.parse_args()
+
+    try:
+        run_eval(args.pipeline, args.output, args.data, args.workers, args.batch_size, args.shard)
+    except ImportError as e:
+        print(f"❌ Lỗi import: {e}")
+        print("Hãy chạy từ thư mục gốc: python tests/run_eval.py")
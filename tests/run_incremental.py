@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+Kiểm tra cache của chế độ sửa tăng dần (processor/incremental.py) với backend
+Ollama giả lập (không cần API / model).
+
+- Kết quả hợp lệ (greedy) được dùng lại ở lần sửa sau
+- Backend lỗi (Ollama mất kết nối) → không cache, lần sau sửa lại được
+- Sampling "sample" → không dùng cache (mỗi lần 1 kết quả mới)
+
+Cách chạy (từ thư mục gốc):
+    python tests/run_incremental.py
+"""
+
+import sys
+import os
+import types
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from processor import pipeline
+from processor.incremental import ResultCache, correct_paragraphs_incremental
+
+PIPELINE = "ollama_only"
+TEXT = "Hôm nay tôi di học."
+
+
+class FakeOllama:
+    """Thay cho module llm.ollama_model: lỗi khi offline, mỗi lần gọi trả về 1 kết quả khác"""
+
+    class OllamaAPIError(RuntimeError):
+        pass
+
+    def __init__(self):
+        self.online = True
+        self.calls = 0
+
+    def correct_text(self, text, **kwargs):
+        self.calls += 1
+        if not self.online:
+            raise self.OllamaAPIError("Lỗi kết nối Ollama API: timeout")
+        return text.replace("di", "đi"), f"lần {self.calls}"
+
+
+def correct(cache: ResultCache, **kwargs) -> tuple:
+    """Sửa TEXT (1 đoạn, có LLM giải thích → không gộp prompt). Returns: (kết quả, stats)"""
+    stats = {}
+    result = correct_paragraphs_incremental([TEXT], PIPELINE, cache=cache, stats=stats, explain=True, **kwargs)
+    return result[0], stats
+
+
+def check(name: str, passed: bool) -> bool:
+    print(f"  {'✅' if passed else '❌'} {name}")
+    return passed
+
+
+def run_checks() -> bool:
+    ollama = FakeOllama()
+    pipeline._ollama_checked, pipeline._ollama_module = True, types.SimpleNamespace(
+        correct_text=ollama.correct_text, OllamaAPIError=FakeOllama.OllamaAPIError
+    )
+    results = []
+
+    print("🔷 Greedy: dùng lại kết quả")
+    cache = ResultCache()
+    first, _ = correct(cache)
+    second, stats = correct(cache)
+    results.append(check("lần 2 lấy từ cache", second == first and stats["paragraphs_reused"] == 1))
+
+    print("🔷 Backend lỗi: không cache")
+    cache = ResultCache()
+    ollama.online = False
+    failed, stats = correct(cache)
+    results.append(check("giữ nguyên văn bản, báo lỗi", failed[0] == TEXT and "Lỗi kết nối" in failed[1]))
+    results.append(check("stats backend_errors", stats.get("backend_errors") == 1 and len(cache) == 0))
+    ollama.online = True
+    retried, stats = correct(cache)
+    results.append(check("lần sau sửa lại", retried[0] == "Hôm nay tôi đi học." and stats["paragraphs_reused"] == 0))
+
+    print("🔷 Sampling \"sample\": không dùng cache")
+    cache = ResultCache()
+    first, _ = correct(cache, sampling="sample")
+    second, stats = correct(cache, sampling="sample")
+    results.append(check("mỗi lần chạy model", first != second and stats["paragraphs_reused"] == 0 and len(cache) == 0))
+
+    print(f"\n📊 {sum(results)}/{len(results)} passed")
+    return all(results)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if run_checks() else 1)
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+Kiểm tra parity của input-copy decoding (bật / tắt) trên bộ test_data.
+
+Input-copy chỉ thay đổi cách decode (kiểm tra nhiều token draft trong 1 lượt
+forward), nên output phải giống hệt greedy decoding thông thường. Script so
+sánh output 2 chế độ, thời gian và tỉ lệ token draft được chấp nhận.
+
+Cách chạy (từ thư mục gốc):
+    python tests/run_input_copy_parity.py                 # bartpho, protonx
+    python tests/run_input_copy_parity.py qwen vistral    # causal LLM (greedy)
+"""
+
+import sys
+import os
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from test_data import SENTENCES, PARAGRAPHS
+
+SEQ2SEQ_MODULES = {
+    "bartpho": "llm.bartpho_model",
+    "protonx": "protonx_layer.protonx_refine",
+}
+CAUSAL_MODULES = {
+    "qwen": "llm.qwen_model",
+    "vistral": "llm.vistral_model",
+}
+CAUSAL_MAX_NEW_TOKENS = 256
+
+
+def _run_seq2seq(module, texts: list, enabled: bool) -> tuple:
+    from llm import decoding
+
+    decoding.INPUT_COPY_DECODING = enabled
+    start = time.time()
+    outputs = [module._generate_batch([t], decoding="greedy")[0] for t in texts]
+    return outputs, time.time() - start
+
+
+def _run_causal(module, texts: list, enabled: bool) -> tuple:
+    import torch
+    from llm import input_copy
+
+    outputs = []
+    start = time.time()
+    for text in texts:
+        inputs = module.tokenizer(module.build_prompt(text), return_tensors="pt").to(module.model.device)
+        with torch.no_grad():
+            ids = module.model.generate(
+                **inputs,
+                max_new_tokens=CAUSAL_MAX_NEW_TOKENS,
+                do_sample=False,
+                pad_token_id=module.tokenizer.eos_token_id,
+                **(input_copy.causal_kwargs() if enabled else {})
+            )
+        outputs.append(module.tokenizer.decode(ids[0][inputs["input_ids"].shape[1]:], skip_special_tokens=True))
+    return outputs, time.time() - start
+
+
+def run_parity(name: str) -> dict:
+    import importlib
+    from processor import metrics
+
+    is_seq2seq = name in SEQ2SEQ_MODULES
+    module = importlib.import_module(SEQ2SEQ_MODULES[name] if is_seq2seq else CAUSAL_MODULES[name])
+    run = _run_seq2seq if is_seq2seq else _run_causal
+
+    items = SENTENCES + PARAGRAPHS
+    texts = [item["input"] for item in items]
+
+    print("\n" + "=" * 60)
+    print(f"🧪 INPUT-COPY PARITY: {name} ({len(texts)} mẫu, greedy)")
+    print("=" * 60)
+
+    # Chạy 1 lần khởi động để không tính thời gian warm-up
+    run(module, texts[:1], False)
+
+    off_out, off_time = run(module, texts, False)
+    metrics.reset()
+    on_out, on_time = run(module, texts, True)
+
+    identical = sum(1 for a, b in zip(off_out, on_out) if a.strip() == b.strip())
+    for item, a, b in zip(items, off_out, on_out):
+        if a.strip() != b.strip():
+            print(f"\n  [#{item['id']}] ⚠️ Khác nhau")
+            print(f"    off: {a[:100]}")
+            print(f"    on : {b[:100]}")
+
+    print("\n" + "-" * 60)
+    print(f"  🎯 Giống hệt  : {identical}/{len(texts)}")
+    print(f"  ⏱️ Thời gian  : off {off_time:.1f}s | on {on_time:.1f}s (x{off_time / on_time if on_time else 0:.2f})")
+    if is_seq2seq:
+        counters = metrics.get_counters()
+        drafted = sum(e["value"] for e in counters.get("input_copy_draft_tokens_total", []))
+        accepted = sum(e["value"] for e in counters.get("input_copy_accepted_tokens_total", []))
+        print(f"  ✅ Draft      : {accepted:.0f}/{drafted:.0f} token được chấp nhận "
+              f"({accepted / drafted * 100 if drafted else 0:.0f}%)")
+    print("-" * 60)
+
+    return {"model": name, "identical": identical, "total": len(texts), "speedup": off_time / on_time if on_time else 0}
+
+
+if __name__ == "__main__":
+    names = sys.argv[1:] or list(SEQ2SEQ_MODULES)
+
+    try:
+        results = [run_parity(name) for name in names]
+        if any(r["identical"] < r["total"] for r in results):
+            sys.exit(1)
+    except ImportError as e:
+        print(f"❌ Lỗi import: {e}")
+        print("Hãy chạy từ thư mục gốc: python tests/run_input_copy_parity.py")
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+Kiểm tra độ lệch (parity) giữa backend tối ưu (int8 / onnx) và model eager
+PyTorch cho ProtonX và BartPho trên bộ test_data.
+
+So sánh output của 2 backend trên cùng input: tỉ lệ giống hệt, độ tương
+đồng trung bình, độ chính xác so với expected và tốc độ.
+
+Cách chạy (từ thư mục gốc):
+    python tests/run_parity.py                  # cả 2 model, backend int8
+    python tests/run_parity.py protonx onnx
+"""
+
+import sys
+import os
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from test_data import SENTENCES, PARAGRAPHS
+from eval_metrics import similarity_score
+
+MODELS = {
+    "protonx": ("protonx_layer.protonx_refine", "AutoModelForSeq2SeqLM"),
+    "bartpho": ("llm.bartpho_model", "MBartForConditionalGeneration"),
+}
+
+
+def _run(module, model, texts: list) -> tuple:
+    """Generate toàn bộ texts với model cho trước (dùng đúng hàm generate của module)"""
+    module.model = model
+    start = time.time()
+    outputs = [module._generate_batch([t])[0] for t in texts]
+    return outputs, time.time() - start
+
+
+def run_parity(name: str, backend: str) -> dict:
+    import importlib
+    import transformers
+    from llm.loading import load_seq2seq
+
+    module_path, cls_name = MODELS[name]
+    module = importlib.import_module(module_path)
+    model_cls = getattr(transformers, cls_name)
+
+    print("\n" + "=" * 60)
+    print(f"🧪 PARITY: {name} eager vs {backend}")
+    print("=" * 60)
+
+    items = SENTENCES + PARAGRAPHS
+    texts = [item["input"] for item in items]
+
+    eager = load_seq2seq(module.MODEL_NAME, model_cls, "cpu", backend="eager")
+    optimized = load_seq2seq(module.MODEL_NAME, model_cls, "cpu", backend=backend)
+
+    # Chạy 1 lần khởi động để không tính thời gian warm-up
+    _run(module, eager, texts[:1])
+    _run(module, optimized, texts[:1])
+
+    eager_out, eager_time = _run(module, eager, texts)
+    opt_out, opt_time = _run(module, optimized, texts)
+
+    identical = sum(1 for a, b in zip(eager_out, opt_out) if a.strip() == b.strip())
+    parity = sum(similarity_score(a, b) for a, b in zip(eager_out, opt_out)) / len(texts)
+    eager_acc = sum(similarity_score(o, item["expected"]) for o, item in zip(eager_out, items)) / len(items)
+    opt_acc = sum(similarity_score(o, item["expected"]) for o, item in zip(opt_out, items)) / len(items)
+
+    for item, a, b in zip(items, eager_out, opt_out):
+        if a.strip() != b.strip():
+            print(f"\n  [#{item['id']}] ⚠️ Khác nhau")
+            print(f"    eager : {a[:100]}")
+            print(f"    {backend:6}: {b[:100]}")
+
+    print("\n" + "-" * 60)
+    print(f"  🎯 Giống hệt    : {identical}/{len(texts)}")
+    print(f"  📊 Tương đồng   : {parity * 100:.2f}%")
+    print(f"  ✅ Độ chính xác : eager {eager_acc * 100:.2f}% | {backend} {opt_acc * 100:.2f}% "
+          f"(Δ {(opt_acc - eager_acc) * 100:+.2f}%)")
+    print(f"  ⏱️ Thời gian    : eager {eager_time:.1f}s | {backend} {opt_time:.1f}s "
+          f"(x{eager_time / opt_time if opt_time else 0:.2f})")
+    print("-" * 60)
+
+    return {
+        "model": name,
+        "backend": backend,
+        "identical": identical,
+        "total": len(texts),
+        "parity": parity,
+        "accuracy_delta": opt_acc - eager_acc,
+        "speedup": eager_time / opt_time if opt_time else 0,
+    }
+
+
+if __name__ == "__main__":
+    names = [sys.argv[1]] if len(sys.argv) > 1 else list(MODELS)
+    backend = sys.argv[2] if len(sys.argv) > 2 else "int8"
+
+    try:
+        for name in names:
+            run_parity(name, backend)
+    except ImportError as e:
+        print(f"❌ Lỗi import: {e}")
+        print("Hãy chạy từ thư mục gốc: python tests/run_parity.py")
@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark hiệu năng các pipeline trên bộ test_data (SENTENCES / PARAGRAPHS / ESSAYS).
+
+Với mỗi pipeline trong PIPELINE_STRATEGIES, đo:
+- Thời gian load model
+- Latency p50 / p95 theo từng loại (câu, đoạn văn, bài văn), số từ/giây
+- Số token được sinh ra (theo processor.metrics), độ chính xác so với expected
+- Peak RSS (RAM) và peak VRAM: mỗi pipeline chạy trong 1 process riêng (spawn),
+  nên là peak của riêng pipeline đó (gồm cả model), không lẫn pipeline chạy trước
+
+Kết quả được ghi ra file JSON (kèm commit git và cấu hình decode) để so sánh
+giữa các commit. Chế độ --stub dùng model giả lập (không cần torch / GPU) để
+chạy thử harness trên máy CI bất kỳ.
+
+Cách chạy (từ thư mục gốc):
+    python tests/run_perf_benchmark.py                           # tất cả pipeline
+    python tests/run_perf_benchmark.py bartpho_protonx qwen_only
+    python tests/run_perf_benchmark.py --stub --output bench.json
+"""
+
+import sys
+import os
+import json
+import multiprocessing
+import subprocess
+import time
+from datetime import datetime
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from test_data import SENTENCES, PARAGRAPHS, ESSAYS
+from eval_metrics import similarity_score, evaluate
+
+CATEGORIES = {
+    "sentences": SENTENCES,
+    "paragraphs": PARAGRAPHS,
+    "essays": ESSAYS,
+}
+DEFAULT_OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks")
+STUB_SECONDS_PER_WORD = 0.0005  # Latency giả lập của model stub
+
+
+def percentile(values: list, pct: float) -> float:
+    """Percentile (nội suy tuyến tính) của list giá trị"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    pos = (len(ordered) - 1) * pct / 100
+    low = int(pos)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (pos - low)
+
+
+def peak_rss_mb():
+    """Peak RSS của process (MB), None nếu không đo được trên hệ điều hành này"""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024  # macOS: bytes, Linux: KB
+    except ImportError:
+        pass
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) / 1024 / 1024  # Windows: peak working set
+    except ImportError:
+        return None
+
+
+def _cuda():
+    """Module torch nếu có GPU, ngược lại None"""
+    try:
+        import torch
+        return torch if torch.cuda.is_available() else None
+    except ImportError:
+        return None
+
+
+# Counter tổng số token sinh ra theo loại model (qwen_generated_tokens_total chỉ là
+# thống kê assisted decoding, đã được tính trong llm_generated_tokens_total)
+GENERATED_TOKEN_COUNTERS = ["llm_generated_tokens_total", "seq2seq_generated_tokens_total", "stub_generated_tokens_total"]
+
+
+def generated_tokens() -> float:
+    """Tổng số token được sinh ra (theo GENERATED_TOKEN_COUNTERS)"""
+    from processor import metrics
+    counters = metrics.get_counters()
+    return sum(entry["value"] for name in GENERATED_TOKEN_COUNTERS for entry in counters.get(name, []))
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# === Pipeline runner ===
+
+def _stub_correct(text: str) -> tuple:
+    """Model giả lập: khôi phục dấu bằng n-gram (nếu có corpus), latency tỉ lệ với số từ"""
+    from processor import metrics
+    from processor.diacritics import restore_diacritics
+
+    words = len(text.split())
+    time.sleep(words * STUB_SECONDS_PER_WORD)
+    metrics.increment("stub_generated_tokens_total", words, model="stub")
+    return restore_diacritics(text) or text, ""
+
+
+def load_pipeline(pipeline: str, stub: bool = False) -> tuple:
+    """
+    Load model của pipeline.
+    Returns: (hàm sửa lỗi text → (corrected, explanation), thời gian load tính bằng giây)
+    """
+    if stub:
+        from processor.diacritics import get_restorer
+        start = time.time()
+        get_restorer()
+        return _stub_correct, time.time() - start
+
+    from functools import partial
+    from processor.pipeline import correct_with_pipeline, preload
+
+    start = time.time()
+    preload([pipeline])
+    return partial(correct_with_pipeline, pipeline=pipeline), time.time() - start
+
+
+def run_category(correct_func, items: list) -> dict:
+    """Chạy 1 loại test, trả về latency / throughput / token / độ chính xác"""
+    from processor import metrics
+
+    metrics.reset()
+    latencies, scores, pairs = [], [], []
+    for item in items:
+        start = time.perf_counter()
+        corrected, _ = correct_func(item["input"])
+        latencies.append(time.perf_counter() - start)
+        scores.append(similarity_score(corrected, item["expected"]))
+        pairs.append({"actual": corrected, "expected": item["expected"]})
+    overall = evaluate(pairs)["overall"]
+
+    total = sum(latencies)
+    words = sum(len(item["input"].split()) for item in items)
+    tokens = generated_tokens()
+    return {
+        "items": len(items),
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "total_seconds": total,
+        "words_per_sec": words / total if total else 0,
+        "generated_tokens": tokens,
+        "tokens_per_sec": tokens / total if total else 0,
+        "accuracy": sum(scores) / len(scores) if scores else 0,
+        "cer": overall.get("cer", 0),
+        "wer": overall.get("wer", 0),
+        "der": overall.get("der", 0),
+    }
+
+
+def run_pipeline(pipeline: str, stub: bool = False, warmup: bool = True) -> dict:
+    """Benchmark 1 pipeline trên tất cả các loại test (trong process hiện tại)"""
+    torch = _cuda()
+    if torch is not None:
+        torch.cuda.reset_peak_memory_stats()
+
+    correct_func, load_seconds = load_pipeline(pipeline, stub)
+    if warmup:
+        correct_func(SENTENCES[0]["input"])  # Không tính thời gian warm-up
+
+    report = {
+        "pipeline": pipeline,
+        "load_seconds": load_seconds,
+        "categories": {name: run_category(correct_func, items) for name, items in CATEGORIES.items()},
+        "peak_rss_mb": peak_rss_mb(),
+        "peak_vram_mb": torch.cuda.max_memory_allocated() / 1024 / 1024 if torch is not None else None,
+    }
+    return report
+
+
+def run_pipeline_isolated(pipeline: str, stub: bool = False) -> dict:
+    """Benchmark 1 pipeline trong process con riêng → peak RSS / VRAM chỉ của pipeline này"""
+    with multiprocessing.get_context("spawn").Pool(1) as pool:
+        return pool.apply(run_pipeline, (pipeline, stub))
+
+
+def print_report(report: dict):
+    print(f"\n🔷 {report['pipeline']}  (load {report['load_seconds']:.1f}s)")
+    print(f"  {'Loại':<12}{'p50':>10}{'p95':>10}{'Words/s':>10}{'Tokens':>9}{'Accuracy':>10}")
+    print("  " + "-" * 61)
+    for name, c in report["categories"].items():
+        print(f"  {name:<12}{c['p50_ms']:>8.0f}ms{c['p95_ms']:>8.0f}ms{c['words_per_sec']:>10.1f}"
+              f"{c['generated_tokens']:>9.0f}{c['accuracy'] * 100:>9.1f}%")
+    rss = f"{report['peak_rss_mb']:.0f} MB" if report["peak_rss_mb"] is not None else "n/a"
+    vram = f"{report['peak_vram_mb']:.0f} MB" if report["peak_vram_mb"] is not None else "n/a"
+    print(f"  💾 Peak RSS: {rss} | Peak VRAM: {vram}")
+
+
+def run_benchmark(pipelines: list, stub: bool = False, output: str = None) -> dict:
+    """Benchmark danh sách pipeline, ghi kết quả ra file JSON"""
+    from config import DEFAULT_DECODING_POLICY, DEFAULT_LLM_SAMPLING, DEFAULT_OUTPUT_MODE
+
+    print("=" * 60)
+    print(f"⏱️ BENCHMARK HIỆU NĂNG ({len(pipelines)} pipeline{', stub' if stub else ''})")
+    print("=" * 60)
+
+    reports = []
+    for pipeline in pipelines:
+        report = run_pipeline_isolated(pipeline, stub)
+        print_report(report)
+        reports.append(report)
+
+    result = {
+        "commit": git_commit(),
+        "created_at": datetime.now().isoformat(),
+        "stub": stub,
+        "peak_memory_scope": "process per pipeline",
+        "config": {
+            "decoding": DEFAULT_DECODING_POLICY,
+            "sampling": DEFAULT_LLM_SAMPLING,
+            "output_mode": DEFAULT_OUTPUT_MODE,
+        },
+        "pipelines": reports,
+    }
+
+    if output is None:
+        os.makedirs(DEFAULT_OUTPUT_DIR, exist_ok=True)
+        output = os.path.join(DEFAULT_OUTPUT_DIR, f"bench_{result['commit'] or 'local'}_{int(time.time())}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+
+    print("\n" + "=" * 60)
+    print(f"📁 Đã ghi kết quả: {output}")
+    print("=" * 60)
+    return result
+
+
+if __name__ == "__main__":
+    import argparse
+    from config import PIPELINE_STRATEGIES
+
+    parser = argparse.ArgumentParser(description="Benchmark hiệu năng các pipeline")
+    parser.add_argument("pipelines", nargs="*", help="Pipeline cần đo (mặc định: tất cả)")
+    parser.add_argument("--stub", action="store_true", help="Dùng model giả lập (không cần torch / GPU)")
+    parser.add_argument("--output", help="File JSON kết quả (mặc định: tests/benchmarks/bench_<commit>_<time>.json)")
+    args = parser.parse_args()
+
+    try:
+        run_benchmark(args.pipelines or PIPELINE_STRATEGIES, stub=args.stub, output=args.output)
+    except ImportError as e:
+        print(f"❌ Lỗi import: {e}")
+        print("Hãy chạy từ thư mục gốc: python tests/run_perf_benchmark.py")
@@ -9,12 +9,7 @@ import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from test_data import SENTENCES, PARAGRAPHS, ESSAYS, get_test_summary
-from difflib import SequenceMatcher
-
-
-def similarity_score(a: str, b: str) -> float:
-    """Tính độ tương đồng giữa 2 chuỗi (0.0 - 1.0)"""
-    return SequenceMatcher(None, a.lower().strip(), b.lower().strip()).ratio()
+from eval_metrics import similarity_score
 
 
 def run_single_test(correct_func, item: dict, category: str) -> dict:
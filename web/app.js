@@ -6,6 +6,11 @@
 // API Configuration
 const API_BASE_URL = 'http://localhost:5000';
 
+// Job polling: hỏi lại nhanh khi có đoạn mới xong, giãn dần khi chưa có gì mới
+const POLL_MIN_MS = 250;
+const POLL_MAX_MS = 3000;
+const POLL_BACKOFF = 1.5;
+
 // DOM Elements
 const elements = {
     inputText: document.getElementById('input-text'),
@@ -138,42 +143,97 @@ function populateOllamaModels(models) {
     });
 }
 
-async function correctText(text, model = 'qwen', pipeline = 'qwen_protonx') {
-    const response = await fetch(`${API_BASE_URL}/api/correct-paragraphs`, {
+function sleep(ms) {
+    return new Promise(resolve => setTimeout(resolve, ms));
+}
+
+async function readJson(response) {
+    const data = await response.json().catch(() => ({}));
+    if (!response.ok || data.success === false) {
+        throw new Error(data.error || `HTTP error! status: ${response.status}`);
+    }
+    return data;
+}
+
+// Gửi job sửa từng đoạn vào hàng đợi, API trả về job_id ngay
+async function submitParagraphsJob(text, model = 'qwen', pipeline = 'qwen_protonx') {
+    const response = await fetch(`${API_BASE_URL}/api/submit-job`, {
         method: 'POST',
         headers: {
             'Content-Type': 'application/json'
         },
-        body: JSON.stringify({ text, model, pipeline })
+        body: JSON.stringify({ text, model, pipeline, mode: 'paragraphs' })
     });
 
-    if (!response.ok) {
-        throw new Error(`HTTP error! status: ${response.status}`);
-    }
+    return await readJson(response);
+}
+
+// Gửi job sửa file DOCX vào hàng đợi
+async function submitDocxJob(file, model) {
+    const formData = new FormData();
+    formData.append('file', file);
+    formData.append('model', model);
+
+    const response = await fetch(`${API_BASE_URL}/api/submit-docx`, {
+        method: 'POST',
+        body: formData
+    });
 
-    return await response.json();
+    return await readJson(response);
+}
+
+/**
+ * Theo dõi job đến khi xong (adaptive backoff polling).
+ * onUpdate(status, newResults) được gọi sau mỗi lần hỏi, newResults là các
+ * đoạn mới xong kể từ lần trước (job "paragraphs").
+ */
+async function pollJob(jobId, onUpdate) {
+    let since = 0;
+    let delay = POLL_MIN_MS;
+
+    while (true) {
+        await sleep(delay);
+
+        const response = await fetch(`${API_BASE_URL}/api/job-status/${jobId}?since=${since}`);
+        const status = await readJson(response);
+        const newResults = status.results || [];
+        since = status.next_since ?? since;
+
+        onUpdate(status, newResults);
+
+        if (status.status === 'completed') {
+            return status;
+        }
+        if (status.status === 'failed') {
+            throw new Error(status.error || 'Job failed');
+        }
+
+        delay = newResults.length ? POLL_MIN_MS : Math.min(delay * POLL_BACKOFF, POLL_MAX_MS);
+    }
 }
 
 // ================================================
 // UI Update Functions
 // ================================================
 
-function displayResults(data) {
-    // Store results for later use
-    resultsData = data.results;
-
-    // Update output text
-    elements.outputText.value = data.full_corrected;
-    updateWordCount(elements.outputCount, data.full_corrected);
-
-    // Clear and populate changes table
+function resetResults() {
+    resultsData = [];
+    elements.outputText.value = '';
+    updateWordCount(elements.outputCount, '');
     elements.changesBody.innerHTML = '';
+    elements.changesCount.textContent = '0';
+    elements.emptyState.classList.remove('hidden');
+}
 
-    let changesCount = 0;
+// Thêm các đoạn vừa sửa xong (theo thứ tự) vào bảng thay đổi và ô kết quả
+function appendResults(results) {
+    if (!results.length) return;
+
+    results.forEach(result => {
+        const index = resultsData.length;
+        resultsData.push(result);
 
-    data.results.forEach((result, index) => {
         if (result.has_changes) {
-            changesCount++;
             const row = document.createElement('tr');
             row.dataset.index = index;
 
@@ -198,7 +258,13 @@ function displayResults(data) {
         }
     });
 
+    // Update output text
+    const fullCorrected = resultsData.map(result => result.corrected).join('\n\n');
+    elements.outputText.value = fullCorrected;
+    updateWordCount(elements.outputCount, fullCorrected);
+
     // Update changes count
+    const changesCount = elements.changesBody.children.length;
     elements.changesCount.textContent = changesCount;
 
     // Show/hide empty state
@@ -304,23 +370,30 @@ async function handleProcess() {
     const pipelineName = pipelineNames[selectedPipeline] || selectedPipeline;
 
     setButtonsEnabled(false);
-    setStatus('processing', 'Đang xử lý...');
-    showLoading(true, 'Đang gửi yêu cầu đến API...');
+    setStatus('processing', 'Đang gửi yêu cầu...');
+    resetResults();
 
     addLog(`📊 Bắt đầu xử lý với ${modelName} | Pipeline: ${pipelineName}`, 'info');
 
     try {
-        const paragraphCount = text.split('\n').filter(p => p.trim()).length;
-        showLoading(true, `Đang xử lý ${paragraphCount} đoạn văn với ${modelName}...`);
-
-        const data = await correctText(text, selectedModel, selectedPipeline);
+        // Job bất đồng bộ: các đoạn được hiển thị dần khi API sửa xong từng lô
+        const job = await submitParagraphsJob(text, selectedModel, selectedPipeline);
+        addLog(`📨 Đã gửi job (vị trí trong hàng đợi: ${job.queue_position})`, 'info');
+
+        const status = await pollJob(job.job_id, (status, newResults) => {
+            appendResults(newResults);
+            if (status.status === 'pending') {
+                setStatus('processing', `Đang chờ trong hàng đợi (${status.queue_position})...`);
+            } else if (status.progress) {
+                setStatus('processing', `Đang xử lý ${status.progress.done}/${status.progress.total} đoạn...`);
+            }
+        });
 
-        if (data.success) {
-            displayResults(data);
-            setStatus('ready', 'Hoàn thành');
-            addLog(`✅ Hoàn thành! Model: ${data.model_used}, Pipeline: ${data.pipeline_used}, ${data.total_paragraphs} đoạn văn`, 'success');
-        } else {
-            throw new Error(data.error || 'Unknown error');
+        const data = status.result;
+        setStatus('ready', 'Hoàn thành');
+        addLog(`✅ Hoàn thành! Model: ${data.model_used}, Pipeline: ${data.pipeline_used}, ${data.total_paragraphs} đoạn văn`, 'success');
+        if (data.paragraphs_reused) {
+            addLog(`♻️ ${data.paragraphs_reused} đoạn dùng lại kết quả cũ`, 'info');
         }
 
     } catch (error) {
@@ -329,7 +402,6 @@ async function handleProcess() {
         alert(`Lỗi xử lý: ${error.message}\n\nHãy đảm bảo API đang chạy tại ${API_BASE_URL}`);
     } finally {
         setButtonsEnabled(true);
-        showLoading(false);
     }
 }
 
@@ -489,15 +561,16 @@ async function handleCorrectDocx() {
         addLog(`🤖 Model: ${modelNames[selectedModel] || selectedModel}`, 'info');
 
         try {
-            const formData = new FormData();
-            formData.append('file', file);
-            formData.append('model', selectedModel);
-
-            const response = await fetch(`${API_BASE_URL}/api/correct-docx`, {
-                method: 'POST',
-                body: formData
+            const job = await submitDocxJob(file, selectedModel);
+            const status = await pollJob(job.job_id, status => {
+                if (status.status === 'pending') {
+                    showLoading(true, `Đang chờ trong hàng đợi (${status.queue_position})...`);
+                } else if (status.progress && status.progress.total) {
+                    showLoading(true, `Đang xử lý ${file.name}: ${status.progress.done}/${status.progress.total} đoạn...`);
+                }
             });
 
+            const response = await fetch(`${API_BASE_URL}${status.result.download_url}`);
             if (!response.ok) {
                 const errorData = await response.json();
                 throw new Error(errorData.error || 'Lỗi xử lý file');